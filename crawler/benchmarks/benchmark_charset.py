@@ -0,0 +1,72 @@
+"""
+Benchmark for finding the character encoding of the html pages in tests/assets.
+
+It compares statistical detection over the whole body, which is what requests' apparent_encoding
+does, with the CharsetResolver. With --strip_meta the charset meta tags are removed from the pages,
+so that the resolver has to fall back to detection on the beginning of the page.
+
+Call it like this from the crawler folder:
+
+python -m benchmarks.benchmark_charset --repeat 3
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+from requests.compat import chardet
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from charset import CharsetResolver, normalize_encoding
+
+META_PATTERN = re.compile(rb"<meta[^>]+charset[^>]*>", re.IGNORECASE)
+
+def load_pages(folder, strip_meta):
+    pages = []
+    for root, _, files in os.walk(folder):
+        for file in sorted(files):
+            if file.endswith(".html"):
+                with open(os.path.join(root, file), "rb") as f:
+                    content = f.read()
+                if strip_meta:
+                    content = META_PATTERN.sub(b"", content)
+                # the site folder stands in for the host of a page
+                host = os.path.relpath(root, folder).split(os.sep)[0]
+                pages.append((host, content))
+    return pages
+
+def decode_full_detection(pages):
+    texts = []
+    for _, content in pages:
+        encoding = normalize_encoding(chardet.detect(content)["encoding"])
+        texts.append(str(content, encoding or "utf-8", errors="replace"))
+    return texts
+
+def decode_resolver(pages):
+    resolver = CharsetResolver()
+    return [resolver.decode(content, "text/html", host) for host, content in pages]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the time to find the character encoding of html pages.")
+    parser.add_argument("--folder", default="tests/assets", type=str, help="Folder with the html pages.")
+    parser.add_argument("--repeat", default=3, type=int, help="How often to decode all pages.")
+    parser.add_argument("--strip_meta", action="store_true", help="Remove the charset meta tags from the pages.")
+    args = parser.parse_args()
+
+    pages = load_pages(args.folder, args.strip_meta)
+    n_bytes = sum(len(content) for _, content in pages)
+    print(f"{len(pages)} pages, {n_bytes / 1e6:.1f}MB")
+
+    results = {}
+    print(f"{'method':>16} {'seconds':>8} {'pages per second':>17}")
+    for name, fn in [("full detection", decode_full_detection), ("resolver", decode_resolver)]:
+        start_time = time.time()
+        for _ in range(args.repeat):
+            results[name] = fn(pages)
+        t = (time.time() - start_time) / args.repeat
+        print(f"{name:>16} {t:>8.3f} {len(pages) / t:>17.1f}", flush=True)
+
+    agree = sum(a == b for a, b in zip(results["full detection"], results["resolver"]))
+    print(f"same text for {agree} of {len(pages)} pages")
@@ -0,0 +1,100 @@
+"""
+Benchmark for the thread utilisation of the download engines on a mix of fast and slow hosts.
+
+Every host is a local server on its own port. The pages of the fast hosts take --fast_seconds and
+the pages of the slow hosts take --slow_seconds to respond, e.g. hosts that run into the request
+timeout. In batch mode (--download_engine threads) every batch waits for its slowest url, in stream
+mode (--download_engine stream) a thread starts the next url as soon as it is free.
+
+Call it like this from the crawler folder:
+
+python -m benchmarks.benchmark_download --fast_hosts 16 --slow_hosts 4
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+import logging
+
+from flask import Flask
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from crawler import CrawlerConfig, HTMLStore
+from robochecks import RobotsChecker
+from tests.util import ServerThread
+
+def create_app(fast_seconds, slow_seconds):
+    app = Flask(__name__)
+
+    @app.route("/fast/<page>")
+    def fast(page):
+        time.sleep(fast_seconds)
+        return f"<html><body>{page}</body></html>"
+
+    @app.route("/slow/<page>")
+    def slow(page):
+        time.sleep(slow_seconds)
+        return f"<html><body>{page}</body></html>"
+
+    return app
+
+def benchmark(engine, urls, n_threads, folder):
+    config = CrawlerConfig(
+        output_folder=os.path.join(folder, engine),
+        dont_compress_outputs=True,
+        crawl_delay=0,
+        download_n_threads=n_threads,
+        download_engine=engine)
+    html_store = HTMLStore(config, RobotsChecker(enabled=False))
+    html_store.init_round(os.path.join(config.output_folder, "00001.json"), 1)
+
+    start_time = time.time()
+    html_store.download_urls(urls)
+    t = time.time() - start_time
+    html_store.close()
+    return t, html_store.busy_time / (n_threads * t)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the thread utilisation of the download engines.")
+    parser.add_argument("--fast_hosts", default=16, type=int, help="Number of hosts that respond immediately.")
+    parser.add_argument("--slow_hosts", default=4, type=int, help="Number of hosts that respond after --slow_seconds.")
+    parser.add_argument("--fast_seconds", default=0.05, type=float, help="Response time of the fast hosts.")
+    parser.add_argument("--slow_seconds", default=2.0, type=float, help="Response time of the slow hosts.")
+    parser.add_argument("--fast_pages", default=10, type=int, help="How many pages to download per fast host.")
+    parser.add_argument("--slow_pages", default=1, type=int, help="How many pages to download per slow host.")
+    parser.add_argument("--download_n_threads", default=8, type=int, help="How many threads to parallel download data.")
+    parser.add_argument("--engines", default="threads,stream", type=str, help="Comma separated list of download engines.")
+    parser.add_argument("--folder", default="benchmarks/temp", type=str, help="Where to store the downloaded pages.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    app = create_app(args.fast_seconds, args.slow_seconds)
+    ports = list(range(5100, 5100 + args.fast_hosts + args.slow_hosts))
+    servers = [ServerThread(app, port=port) for port in ports]
+    for server in servers:
+        server.start()
+
+    urls = []
+    for j, port in enumerate(ports):
+        if j < args.slow_hosts:
+            urls += [f"http://localhost:{port}/slow/page{i}" for i in range(args.slow_pages)]
+        else:
+            urls += [f"http://localhost:{port}/fast/page{i}" for i in range(args.fast_pages)]
+
+    try:
+        print(f"{'engine':>8} {'urls':>6} {'seconds':>8} {'urls per second':>16} {'utilisation':>12}")
+        for engine in args.engines.split(","):
+            if os.path.exists(args.folder):
+                shutil.rmtree(args.folder)
+            t, utilisation = benchmark(engine, urls, args.download_n_threads, args.folder)
+            print(f"{engine:>8} {len(urls):>6} {t:>8.2f} {len(urls) / t:>16.1f} {utilisation:>12.0%}", flush=True)
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.join()
+        if os.path.exists(args.folder):
+            shutil.rmtree(args.folder)
@@ -0,0 +1,128 @@
+"""
+Benchmark for the per-round overhead of the url stores.
+
+It fills the urls to download and the downloaded urls with N urls each and then simulates the
+bookkeeping of a crawling round: select the urls of the round with the politeness scheduler, look
+them up in the downloaded urls, move them from the frontier to the history and merge the newly
+extracted urls. Downloading and parsing are not part of the measurement. Writing the changes to disk
+is measured separately. The scheduler builds its heaps of hosts in the first round, which is shown
+separately as well.
+
+Call it like this from the crawler folder:
+
+python -m benchmarks.benchmark_frontier --sizes 1000000,10000000,50000000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from frontier import create_backend, get_host
+from scheduler import HostScheduler
+
+def generate_urls(start, n, hosts=100000):
+    for i in range(start, start + n):
+        yield f"https://host{i % hosts}.example.com/page/{i}"
+
+# the bookkeeping of Crawler.round before the frontier had an index
+class LegacyListStore:
+
+    def __init__(self):
+        self.urls = []
+
+    def add_urls(self, urls):
+        self.urls.extend(urls)
+
+    def round(self, history, round_size, new_urls):
+        downloaded_urls_set = set(history.urls)
+        batch = [url for url in self.urls[0:round_size] if url not in downloaded_urls_set]
+        self.urls = list(filter(lambda x:x not in batch, self.urls))
+        history.urls.extend(batch)
+
+        existing_urls = set(history.urls)
+        urls2download = set(self.urls)
+        for url in new_urls:
+            if url not in existing_urls and url not in urls2download:
+                self.urls.append(url)
+
+# the bookkeeping of Crawler.round, URLs2Download tells the scheduler about the hosts of new urls
+def backend_round(frontier, history, scheduler, round_size, new_urls):
+    batch = scheduler.get_batch(frontier, round_size)
+    downloaded = history.known_urls(batch)
+    batch = [url for url in batch if url not in downloaded]
+    frontier.remove_urls(batch)
+    history.add_urls(batch)
+
+    existing_urls = history.known_urls(new_urls)
+    new_urls = [url for url in new_urls if url not in existing_urls]
+    if frontier.add_urls(new_urls) > 0:
+        scheduler.add_hosts({get_host(url) for url in new_urls})
+
+def benchmark(name, size, hosts, round_size, num_rounds, folder):
+    if name == "legacy":
+        frontier, history = LegacyListStore(), LegacyListStore()
+    else:
+        frontier = create_backend(name, os.path.join(folder, "urls2download.txt"))
+        history = create_backend(name, os.path.join(folder, "downloaded_urls.txt"))
+        scheduler = HostScheduler(crawl_delay=1)
+
+    frontier.add_urls(generate_urls(0, size, hosts))
+    history.add_urls(generate_urls(size, size, hosts))
+    if name != "legacy":
+        frontier.commit()
+        history.commit()
+
+    times = []
+    commit_times = []
+    next_url = 2 * size
+    for _ in range(num_rounds):
+        # half of the extracted urls are new, the other half was downloaded before
+        new_urls = list(generate_urls(next_url, round_size, hosts)) + list(generate_urls(size, round_size, hosts))
+        next_url += round_size
+
+        start_time = time.time()
+        if name == "legacy":
+            frontier.round(history, round_size, new_urls)
+        else:
+            backend_round(frontier, history, scheduler, round_size, new_urls)
+        times.append(time.time() - start_time)
+
+        start_time = time.time()
+        if name == "legacy":
+            # the old URLStore.write2file rewrote both files in every round
+            for store in [frontier, history]:
+                with open(os.path.join(folder, "legacy.txt"), "w") as f:
+                    f.write("\n".join(store.urls))
+        else:
+            frontier.commit()
+            history.commit()
+        commit_times.append(time.time() - start_time)
+
+    # the first round builds the heaps of the scheduler
+    later_times = times[1:] if len(times) > 1 else times
+    return times[0], sum(later_times) / len(later_times), sum(commit_times) / len(commit_times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the per-round overhead of the url stores.")
+    parser.add_argument("--sizes", default="1000000,10000000,50000000", type=str, help="Comma separated number of urls in the frontier and in the history.")
+    parser.add_argument("--backends", default="text,sqlite", type=str, help="Comma separated list of backends. Add 'legacy' to measure the old list based implementation.")
+    parser.add_argument("--hosts", default=100000, type=int, help="Number of hosts of the urls.")
+    parser.add_argument("--round_size", default=5000, type=int, help="How many URLs to download per round.")
+    parser.add_argument("--num_rounds", default=5, type=int, help="How many rounds to simulate.")
+    parser.add_argument("--folder", default="benchmarks/temp", type=str, help="Where to store the sqlite databases.")
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'urls':>12} {'first round':>12} {'seconds per round':>18} {'seconds to persist':>18}")
+    for size in [int(x) for x in args.sizes.split(",")]:
+        for name in args.backends.split(","):
+            if os.path.exists(args.folder):
+                shutil.rmtree(args.folder)
+            os.makedirs(args.folder)
+
+            t_first, t, t_commit = benchmark(name, size, args.hosts, args.round_size, args.num_rounds, args.folder)
+            print(f"{name:>8} {size:>12,} {t_first:>12.4f} {t:>18.4f} {t_commit:>18.4f}", flush=True)
+
+    shutil.rmtree(args.folder)
@@ -0,0 +1,93 @@
+"""
+Benchmark for checking urls against cached robots.txt files.
+
+It fills the robots.txt cache for a number of hosts and then checks N urls of these hosts, the way
+Crawler.round does. It compares parsing the robots.txt with urllib.robotparser for every url, which
+is what the checker did before the parsed files were cached, with check_robots for every url and
+with can_fetch_multiple_urls, which checks the urls of each host in one call.
+
+Call it like this from the crawler folder:
+
+python -m benchmarks.benchmark_robots --urls 100000 --hosts 1000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import urllib.robotparser
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from robochecks import RobotsChecker
+
+USER_AGENT = "Crawlzilla/1.0"
+
+# a robots.txt with rules for a few crawlers, like on larger sites
+def generate_robots_txt(rules):
+    lines = []
+    for agent in ["Googlebot", "Bingbot", "*"]:
+        lines.append(f"User-agent: {agent}")
+        for i in range(rules):
+            lines.append(f"Disallow: /private{i}/")
+        lines.append("Allow: /private0/public/")
+        lines.append("Crawl-delay: 2")
+        lines.append("")
+    return "\n".join(lines)
+
+def generate_urls(n, hosts, rules):
+    random.seed(1)
+    return [f"https://host{random.randrange(hosts)}.example.com/private{random.randrange(2 * rules)}/page{i}.html"
+        for i in range(n)]
+
+def check_reparse(checker, urls):
+    results = []
+    for url in urls:
+        robots_url = f"{checker.get_domain(url)}/robots.txt"
+        rp = urllib.robotparser.RobotFileParser()
+        rp.set_url(robots_url)
+        rp.parse(checker.cache.get_robots_txt(url).splitlines())
+        results.append(rp.can_fetch(USER_AGENT, url))
+    return results
+
+def check_cached(checker, urls):
+    return [checker.check_robots(url, USER_AGENT)["can_fetch"] for url in urls]
+
+def check_bulk(checker, urls):
+    can_fetch_urls, _ = checker.can_fetch_multiple_urls(urls, USER_AGENT)
+    can_fetch_urls = set(can_fetch_urls)
+    return [url in can_fetch_urls for url in urls]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the time to check urls against robots.txt.")
+    parser.add_argument("--urls", default=100000, type=int, help="Number of urls to check.")
+    parser.add_argument("--hosts", default=1000, type=int, help="Number of hosts of the urls.")
+    parser.add_argument("--rules", default=20, type=int, help="Number of disallow rules per user agent.")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        checker = RobotsChecker(cache_file=os.path.join(folder, "robots_cache.sqlite"))
+        robots_txt = generate_robots_txt(args.rules)
+        for i in range(args.hosts):
+            checker.cache.set_robots_txt(f"https://host{i}.example.com", robots_txt)
+
+        urls = generate_urls(args.urls, args.hosts, args.rules)
+        print(f"{len(urls):,} urls, {args.hosts:,} hosts, robots.txt with {len(robots_txt.splitlines())} lines")
+
+        results = {}
+        print(f"{'method':>10} {'seconds':>8} {'urls per second':>16}")
+        for name, fn in [("reparse", check_reparse), ("cached", check_cached), ("bulk", check_bulk)]:
+            start_time = time.time()
+            results[name] = fn(checker, urls)
+            t = time.time() - start_time
+            print(f"{name:>10} {t:>8.3f} {len(urls) / t:>16.1f}", flush=True)
+
+        checker.close()
+        assert results["reparse"] == results["cached"] == results["bulk"]
+        allowed = sum(results["bulk"])
+        print(f"same result for all urls, {allowed:,} allowed")
+    finally:
+        shutil.rmtree(folder)
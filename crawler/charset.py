@@ -0,0 +1,136 @@
+"""
+Find the character encoding of a downloaded page.
+
+Statistical detection (requests' apparent_encoding) runs over the whole body in Python and is one
+of the most expensive steps per page. Most pages declare their encoding, so the resolver tries the
+cheap sources first, similar to a browser:
+
+1. a byte order mark
+2. the charset parameter of the content-type header
+3. a <meta charset> or <meta http-equiv="content-type"> tag in the beginning of the page
+4. the encoding that was detected for earlier pages of the same host
+5. statistical detection on the beginning of the page
+"""
+
+import re
+import codecs
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Tuple
+
+from requests.compat import chardet
+
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+HEADER_CHARSET_PATTERN = re.compile(r"charset\s*=\s*[\"']?([a-zA-Z0-9_.:-]+)", re.IGNORECASE)
+META_CHARSET_PATTERN = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([a-zA-Z0-9_.:-]+)", re.IGNORECASE)
+
+# browsers decode these labels as windows-1252, which is a superset of them
+WINDOWS_1252_LABELS = {"iso-8859-1", "iso8859-1", "latin1", "latin-1", "l1", "us-ascii", "ascii", "cp819"}
+
+
+# the python name of an encoding label, None if python does not know it
+def normalize_encoding(label : Optional[str]) -> Optional[str]:
+    if label is None:
+        return None
+    label = label.strip().lower()
+    if label in WINDOWS_1252_LABELS:
+        return "cp1252"
+    try:
+        return codecs.lookup(label).name
+    except LookupError:
+        return None
+
+
+def encoding_from_bom(content : bytes) -> Optional[str]:
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            return encoding
+    return None
+
+
+def encoding_from_header(content_type : Optional[str]) -> Optional[str]:
+    if content_type is None:
+        return None
+    match = HEADER_CHARSET_PATTERN.search(content_type)
+    return None if match is None else normalize_encoding(match.group(1))
+
+
+def encoding_from_meta(content : bytes, max_bytes : int) -> Optional[str]:
+    match = META_CHARSET_PATTERN.search(content[0:max_bytes])
+    return None if match is None else normalize_encoding(match.group(1).decode("ascii", errors="ignore"))
+
+
+class CharsetResolver:
+
+    def __init__(self, meta_bytes : int = 4096, sample_bytes : int = 65536, max_hosts : int = 100000):
+        """
+        Args:
+            meta_bytes: search the meta tag in this many bytes at the beginning of the page
+            sample_bytes: statistical detection only looks at this many bytes at the beginning of the page
+            max_hosts: number of hosts in the cache of detected encodings
+        """
+        self.meta_bytes = meta_bytes
+        self.sample_bytes = sample_bytes
+        self.max_hosts = max_hosts
+
+        self.lock = Lock()
+        self.host2encoding = OrderedDict()
+
+    # statistical detection, the result is cached per host
+    def detect(self, content : bytes, host : Optional[str]) -> Tuple[Optional[str], str]:
+        if host is not None:
+            with self.lock:
+                encoding = self.host2encoding.get(host)
+                if encoding is not None:
+                    self.host2encoding.move_to_end(host)
+            # the cached encoding is only used when it can decode the page
+            if encoding is not None:
+                try:
+                    content.decode(encoding)
+                    return encoding, "cache"
+                except UnicodeDecodeError:
+                    pass
+
+        encoding = normalize_encoding(chardet.detect(content[0:self.sample_bytes])["encoding"])
+        if host is not None and encoding is not None:
+            with self.lock:
+                self.host2encoding[host] = encoding
+                self.host2encoding.move_to_end(host)
+                if len(self.host2encoding) > self.max_hosts:
+                    self.host2encoding.popitem(last=False)
+        return encoding, "detection"
+
+    # the encoding of a page and where it came from
+    def resolve(self, content : bytes, content_type : Optional[str] = None, host : Optional[str] = None) -> Tuple[Optional[str], str]:
+        encoding = encoding_from_bom(content)
+        if encoding is not None:
+            return encoding, "bom"
+
+        encoding = encoding_from_header(content_type)
+        if encoding is not None:
+            return encoding, "header"
+
+        encoding = encoding_from_meta(content, self.meta_bytes)
+        if encoding is not None:
+            return encoding, "meta"
+
+        return self.detect(content, host)
+
+    def decode(self, content : bytes, content_type : Optional[str] = None, host : Optional[str] = None) -> str:
+        encoding, source = self.resolve(content, content_type, host)
+        logging.debug(f"decode {len(content)} bytes as {encoding} from {source}")
+        if encoding is None:
+            return str(content, errors="replace")
+        text = str(content, encoding, errors="replace")
+        # the byte order mark is not part of the text
+        if source == "bom" and text.startswith("\ufeff"):
+            text = text[1:]
+        return text
@@ -1,8 +1,10 @@
 from dataclasses import dataclass
 import os
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple
 import requests
+import asyncio
+import aiohttp
 import json
 from bs4 import BeautifulSoup
 import fasttext
@@ -16,14 +18,26 @@ import sys
 import shutil
 import argparse
 import random
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
 import logging
 import numpy as np
 import glob
 from robochecks import RobotsChecker
+from frontier import clean_urls, create_backend, get_host
+from scheduler import HostScheduler, HostYieldTracker, HostRateLimiter, HostCircuitBreaker
+from seen_filter import BloomURLBackend
+from sharding import ShardRouter
+from http_session import SessionPool
+from dns_cache import DNSCache
+from charset import CharsetResolver
+from seeds import SeedLoader
+from recrawl import ValidatorStore
+from retry import RetryQueue, is_retryable, parse_retry_after
+from records import FetchResult, dumps
 import traceback
 import copy
-from collections import defaultdict
+from collections import OrderedDict
 from extract_text import HTML2Text
 from warcio.warcwriter import WARCWriter
 from warcio.statusandheaders import StatusAndHeaders
@@ -61,7 +75,35 @@ class CrawlerConfig:
             "User-Agent": "Crawlzilla/1.0)",
             "Accept": "text/html"
         },
-        warc_output : bool = False):
+        warc_output : bool = False,
+        frontier_backend : str = "text",
+        seen_filter : bool = False,
+        seen_filter_error_rate : float = 0.001,
+        num_shards : int = 1,
+        shard_id : int = 0,
+        shard_idle_timeout : int = 600,
+        focused_crawl : bool = False,
+        focused_crawl_min_pages : int = 20,
+        seed_chunk_size : int = 1000000,
+        http_pool_hosts : int = 1000,
+        http_pool_size : int = 4,
+        http_idle_timeout : int = 30,
+        download_engine : str = "threads",
+        async_max_connections : int = 1000,
+        host_concurrency : int = 1,
+        adaptive_concurrency : bool = False,
+        max_body_size : int = 10000000,
+        truncate_large_bodies : bool = False,
+        recrawl_from : str = None,
+        circuit_breaker_threshold : int = 3,
+        circuit_breaker_suspension : int = 60,
+        circuit_breaker_max_suspension : int = 86400,
+        retry_max_attempts : int = 3,
+        retry_base_delay : int = 60,
+        retry_max_delay : int = 3600,
+        dns_cache_ttl : int = 300,
+        dns_prefetch_threads : int = 16,
+        host_policy_store : str = None):
 
         self.output_folder : str = output_folder
         self.html_folder : str = html_folder
@@ -87,6 +129,35 @@ class CrawlerConfig:
         self.delete_html : bool = delete_html
         self.request_headers : Dict[str,str] = request_headers
         self.warc_output : bool = warc_output
+        self.frontier_backend : str = frontier_backend
+        self.seen_filter : bool = seen_filter
+        self.seen_filter_error_rate : float = seen_filter_error_rate
+        self.num_shards : int = num_shards
+        self.shard_id : int = shard_id
+        self.shard_idle_timeout : int = shard_idle_timeout
+        self.focused_crawl : bool = focused_crawl
+        self.focused_crawl_min_pages : int = focused_crawl_min_pages
+        self.seed_chunk_size : int = seed_chunk_size
+        self.http_pool_hosts : int = http_pool_hosts
+        self.http_pool_size : int = http_pool_size
+        self.http_idle_timeout : int = http_idle_timeout
+        self.download_engine : str = download_engine
+        self.async_max_connections : int = async_max_connections
+        self.host_concurrency : int = host_concurrency
+        self.adaptive_concurrency : bool = adaptive_concurrency
+        self.max_body_size : int = max_body_size
+        self.truncate_large_bodies : bool = truncate_large_bodies
+        self.recrawl_from : str = recrawl_from
+        self.circuit_breaker_threshold : int = circuit_breaker_threshold
+        self.circuit_breaker_suspension : int = circuit_breaker_suspension
+        self.circuit_breaker_max_suspension : int = circuit_breaker_max_suspension
+        self.retry_max_attempts : int = retry_max_attempts
+        self.retry_base_delay : int = retry_base_delay
+        self.retry_max_delay : int = retry_max_delay
+        self.dns_cache_ttl : int = dns_cache_ttl
+        self.dns_prefetch_threads : int = dns_prefetch_threads
+        # SQLite file with the robots.txt files and the health of the hosts, shared by several crawler processes
+        self.host_policy_store : str = host_policy_store
 
     def clone(self):
         return copy.deepcopy(self)
@@ -97,10 +168,119 @@ class CrawlerConfig:
         else:
             return "Crawlzilla/1.0"
 
-# helper function to download a single url and convert the result to json
+# bytes of the response bodies of a round, shared by the download threads
+class DownloadStats:
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+        self.rejected = 0
+        self.truncated = 0
+        self.not_modified = 0
+
+    def add(self, bytes_downloaded : int = 0, bytes_saved : int = 0, rejected : int = 0, truncated : int = 0,
+            not_modified : int = 0):
+        with self.lock:
+            self.bytes_downloaded += bytes_downloaded
+            self.bytes_saved += bytes_saved
+            self.rejected += rejected
+            self.truncated += truncated
+            self.not_modified += not_modified
+
+    def log(self):
+        logging.info(f"downloaded {self.bytes_downloaded / 1e6:,.1f} MB of response bodies, "
+            f"skipped {self.bytes_saved / 1e6:,.1f} MB of {self.rejected:,} rejected and {self.truncated:,} truncated responses")
+        if self.not_modified > 0:
+            logging.info(f"{self.not_modified:,} pages did not change since the previous crawl")
+
+# the content-length header of a response, None if it is missing
+def get_content_length(headers):
+    try:
+        return int(headers.get("content-length"))
+    except (TypeError, ValueError):
+        return None
+
+# fill the status and the headers of the json record of a downloaded url and decide if its body is needed
+# it returns the parser type of the body, or None if the body should not be downloaded
+# it is shared by the download engines, so that they produce the same records
+def response2json(json_data, status_code : int, headers, config):
+    url = json_data["url"]
+    json_data["status"] = status_code
+
+    if status_code >= 200 and status_code < 300: 
+
+        json_data["headers"] = {key.lower():value.lower() for key, value in headers.items()}
+        if "content-type" in json_data["headers"].keys():
+
+            valid = False
+            parser_type = None
+            for ct in config.accept_content_types.keys():
+                if json_data["headers"]["content-type"].startswith(ct):
+                    valid = True
+                    parser_type = config.accept_content_types[ct]
+
+            if valid:
+                return parser_type
+            else:
+                logging.debug(f"skip {url} because of undesired content-type header {ct}")
+        else:
+            logging.debug(f"skip {url} because it does not specify a content-type header")
+    return None
+
+# mark the json record of a page that did not change since the previous crawl, it has no body and
+# is not parsed again
+def not_modified2json(json_data, stats : DownloadStats):
+    logging.debug(f"{json_data['url']} did not change since the previous crawl")
+    json_data["not_modified"] = True
+    stats.add(not_modified=1)
+
+# add the body of a response to the json record of a downloaded url
+# exceeded means that the body is larger than config.max_body_size and content holds its beginning
+# headers are the original response headers, they are stored with the hash of the body in validators
+def body2json(json_data, parser_type : str, content : bytes, exceeded : bool, config, stats : DownloadStats,
+        charset_resolver : CharsetResolver, validators : ValidatorStore, headers):
+    if exceeded:
+        if not config.truncate_large_bodies:
+            logging.debug(f"skip {json_data['url']} because the body is larger than {config.max_body_size:,} bytes")
+            stats.add(rejected=1)
+            return
+        json_data["truncated"] = True
+        stats.add(truncated=1)
+
+    if validators.update(json_data["url"], headers, content):
+        not_modified2json(json_data, stats)
+        return
+
+    if parser_type == "html":
+        json_data["html"] = charset_resolver.decode(content, json_data["headers"].get("content-type"), get_host(json_data["url"]))
+
+    elif parser_type == "pdf":
+        
+        json_data["text"] = text
+
+# a body that will be rejected anyway because of its content-length is not downloaded at all
+def is_too_large(content_length, config):
+    return config.max_body_size > 0 and content_length is not None and content_length > config.max_body_size \
+        and not config.truncate_large_bodies
+
+# read a body chunk by chunk and stop after config.max_body_size bytes
+# it returns the body and if the body was larger than the limit
+def read_body(chunks, config):
+    content = bytearray()
+    for chunk in chunks:
+        content += chunk
+        if config.max_body_size > 0 and len(content) > config.max_body_size:
+            return bytes(content[0:config.max_body_size]), True
+    return bytes(content), False
+
+# helper function to download a single url and convert the result to a FetchResult
 # it will be executed in parallel 
 def download(args):
-    url, config, pbar = args
+    url, config, pbar, session_pool, stats, charset_resolver, validators = args
 
     logging.debug(f"Downloading {url}") #for debugging only
 
@@ -109,58 +289,148 @@ def download(args):
     }
 
     r = None
+    retry_after = None
+    content = None
     try:
-        r = requests.get(url, headers=config.request_headers, timeout=config.request_timeout)
-        json_data["status"] = r.status_code
-
-        if r.status_code >= 200 and r.status_code < 300: 
-
-            json_data["headers"] = {key.lower():value.lower() for key, value in r.headers.items()}
-            if "content-type" in json_data["headers"].keys():
-
-                valid = False
-                parser_type = None
-                for ct in config.accept_content_types.keys():
-                    if json_data["headers"]["content-type"].startswith(ct):
-                        valid = True
-                        parser_type = config.accept_content_types[ct]
-
-                if valid:
-                    r.encoding = r.apparent_encoding
-
-                    if parser_type == "html":
-                        json_data["html"] = r.text
-
-                    elif parser_type == "pdf":
-                        
-                        json_data["text"] = text
-
+        # with stream=True only the headers are downloaded, so we can skip the body of responses we do not need
+        with session_pool.session(url) as session:
+            headers = validators.request_headers(url, config.request_headers)
+            with session.get(url, headers=headers, timeout=config.request_timeout, stream=True) as r:
+                parser_type = response2json(json_data, r.status_code, r.headers, config)
+                content_length = get_content_length(r.headers)
+                if is_retryable(r.status_code):
+                    retry_after = parse_retry_after(r.headers.get("retry-after"))
+                if r.status_code == 304:
+                    not_modified2json(json_data, stats)
+                elif parser_type is None:
+                    stats.add(bytes_saved=content_length or 0, rejected=1)
+                elif is_too_large(content_length, config):
+                    logging.debug(f"skip {url} because the body is larger than {config.max_body_size:,} bytes")
+                    stats.add(bytes_saved=content_length, rejected=1)
                 else:
-                    logging.debug(f"skip {url} because of undesired content-type header {ct}")
-            else:
-                logging.debug(f"skip {url} because it does not specify a content-type header")
+                    content, exceeded = read_body(r.iter_content(chunk_size=65536), config)
+                    saved = max(0, content_length - len(content)) if exceeded and content_length is not None else 0
+                    stats.add(bytes_downloaded=len(content), bytes_saved=saved)
+                    body2json(json_data, parser_type, content, exceeded, config, stats, charset_resolver, validators, r.headers)
     except Exception as e:
         json_data["status"] = -1
         json_data["error"] = str(e)
         logging.debug(e)
 
-    contains_body = "html" in json_data.keys()
-    json_data = json.dumps(json_data)
+    # the crawl delay is enforced by HostRateLimiter, see HTMLStore.download_urls
+    pbar.update(1)
 
-    if config.crawl_delay > 0:
-        time.sleep(config.crawl_delay)
+    # the raw body and headers are only needed for the warc output
+    if config.warc_output and r is not None:
+        return FetchResult(url, json_data, content, list(r.raw.headers.items()), retry_after)
+    return FetchResult(url, json_data, retry_after=retry_after)
+
+# asyncio version of read_body
+async def read_body_async(r : aiohttp.ClientResponse, config):
+    content = bytearray()
+    async for chunk in r.content.iter_chunked(65536):
+        content += chunk
+        if config.max_body_size > 0 and len(content) > config.max_body_size:
+            return bytes(content[0:config.max_body_size]), True
+    return bytes(content), False
+
+# asyncio version of download() for the urls of one host
+# every host has as many of these tasks as it has slots in the rate limiter. they share the list of
+# urls and wait until the rate limiter allows the next request to the host, which does not block a thread
+async def download_host_async(session : aiohttp.ClientSession, host : str, urls : List[str], crawl_delay : float,
+        rate_limiter : HostRateLimiter, config, pbar, stats : DownloadStats, charset_resolver : CharsetResolver,
+        validators : ValidatorStore, circuit_breaker : HostCircuitBreaker, results : List, deferred : List,
+        failed : List, released : asyncio.Event):
+    while len(urls) > 0:
+        # the remaining urls of a suspended host are downloaded in a later round
+        if circuit_breaker.is_suspended(host):
+            deferred.extend(urls)
+            urls.clear()
+            break
 
-    pbar.update(1)
+        wait_time = rate_limiter.wait_time(host)
+        if wait_time == float("inf"):
+            # all slots are downloading, wait until one of the other tasks of the host released its slot
+            released.clear()
+            await released.wait()
+            continue
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+            continue
+
+        url = urls.pop(0)
+        rate_limiter.acquire(host)
+        start_time = time.time()
 
-    if config.warc_output:
-        if r is None:
-            headers_list = None
+        logging.debug(f"Downloading {url}") #for debugging only
+
+        json_data = {
+            "url": url,
+        }
+
+        headers = None
+        retry_after = None
+        content = None
+        try:
+            async with session.get(url, headers=validators.request_headers(url, config.request_headers)) as r:
+                headers = r.headers
+                parser_type = response2json(json_data, r.status, r.headers, config)
+                content_length = get_content_length(r.headers)
+                if is_retryable(r.status):
+                    retry_after = parse_retry_after(r.headers.get("retry-after"))
+                if r.status == 304:
+                    not_modified2json(json_data, stats)
+                elif parser_type is None:
+                    stats.add(bytes_saved=content_length or 0, rejected=1)
+                elif is_too_large(content_length, config):
+                    logging.debug(f"skip {url} because the body is larger than {config.max_body_size:,} bytes")
+                    stats.add(bytes_saved=content_length, rejected=1)
+                else:
+                    content, exceeded = await read_body_async(r, config)
+                    saved = max(0, content_length - len(content)) if exceeded and content_length is not None else 0
+                    stats.add(bytes_downloaded=len(content), bytes_saved=saved)
+                    body2json(json_data, parser_type, content, exceeded, config, stats, charset_resolver, validators, r.headers)
+        except Exception as e:
+            json_data["status"] = -1
+            # timeouts have an empty message
+            json_data["error"] = str(e) if len(str(e)) > 0 else type(e).__name__
+            logging.debug(e)
+        rate_limiter.release(host, crawl_delay, json_data["status"], time.time() - start_time,
+            None if retry_after is None else min(retry_after, config.max_crawl_delay))
+        released.set()
+        circuit_breaker.record(host, json_data["status"])
+        if is_retryable(json_data["status"]):
+            failed.append((url, retry_after))
+
+        if config.warc_output and headers is not None:
+            results.append(FetchResult(url, json_data, content, list(headers.items()), retry_after))
         else:
-            headers_list = r.raw.headers.items()
-            headers_list = StatusAndHeaders('200 OK', headers_list, protocol='HTTP/1.0')
-        return json_data, contains_body, headers_list
-    else:
-        return json_data, contains_body
+            results.append(FetchResult(url, json_data, retry_after=retry_after))
+
+        pbar.update(1)
+
+# download urls with asyncio, one task per slot of each host
+# host2urls maps each host to its urls and host2delay to its crawl delay
+# it returns the results, the urls that were deferred because their host was suspended and the
+# urls that failed temporarily with the seconds from their Retry-After headers
+async def download_urls_async(host2urls : Dict[str, List[str]], host2delay : Dict[str, float],
+        rate_limiter : HostRateLimiter, config, pbar, stats : DownloadStats, charset_resolver : CharsetResolver,
+        validators : ValidatorStore, circuit_breaker : HostCircuitBreaker):
+    results = []
+    deferred = []
+    failed = []
+    timeout = aiohttp.ClientTimeout(total=config.request_timeout)
+    # the threaded resolver calls socket.getaddrinfo, which goes through the DNS cache of the HTMLStore
+    connector = aiohttp.TCPConnector(limit=config.async_max_connections, resolver=aiohttp.ThreadedResolver())
+    # the tasks of a host wait for this event when all slots of the host are downloading
+    host2released = {host: asyncio.Event() for host in host2urls.keys()}
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        tasks = [download_host_async(session, host, urls, host2delay[host], rate_limiter, config, pbar, stats,
+                charset_resolver, validators, circuit_breaker, results, deferred, failed, host2released[host])
+            for host, urls in host2urls.items()
+            for _ in range(min(len(urls), rate_limiter.get_max_slots(host)))]
+        await asyncio.gather(*tasks)
+    return results, deferred, failed
 
 # codes related to downloading and storing html data 
 class HTMLStore:
@@ -180,54 +450,59 @@ class HTMLStore:
 
         self.dump_writer = None
 
+        # keeps the connections to the hosts open between batches and rounds
+        self.session_pool = SessionPool(config.http_pool_hosts, config.http_pool_size, config.http_idle_timeout)
+
+        # the time when each host may be downloaded again, it is kept between rounds
+        self.rate_limiter = HostRateLimiter(adaptive=config.adaptive_concurrency)
+
+        # the thread pool of --download_engine stream, it is kept between rounds
+        self.executor : ThreadPoolExecutor = None
+
+        # seconds that the download threads spent downloading in the current round
+        self.busy_time = 0.0
+        self.busy_lock = Lock()
+
+        # bytes of the response bodies in the current round
+        self.download_stats = DownloadStats()
+
+        # finds the encoding of the pages and caches the detected encoding per host
+        self.charset_resolver = CharsetResolver()
+
+        # etag, last-modified and content hash of the downloaded pages, see recrawl.py
+        # the changes of a round are committed by the crawler together with the downloaded urls
+        self.validators = ValidatorStore(os.path.join(config.output_folder, "validators.sqlite"))
+
+        # suspends hosts that are down, their urls of the current round are deferred to a later round
+        self.circuit_breaker = HostCircuitBreaker(
+            os.path.join(config.output_folder, "host_health.json"),
+            config.circuit_breaker_threshold,
+            config.circuit_breaker_suspension,
+            config.circuit_breaker_max_suspension)
+        self.deferred_urls : List[str] = []
+
+        # the urls of the current round that failed temporarily and the seconds from their Retry-After headers
+        self.failed_urls : List[Tuple[str, Optional[float]]] = []
+        self.failed_lock = Lock()
+        # the urls of the current round that did not change since the previous crawl
+        self.not_modified_urls : List[str] = []
+
+        # caches the addresses of the hosts for the page and the robots.txt downloads, see dns_cache.py
+        # it replaces socket.getaddrinfo only while the crawler runs, see start_crawler
+        self.dns_cache = DNSCache(config.dns_cache_ttl, config.dns_prefetch_threads, on_nxdomain=self.suspend_host)
+
     # open the file writer in the beginning of each round
     def init_round(self, dump_file : str, round : str):
 
         self.current_round = round
         if self.config.dont_compress_outputs:
-            self.dump_writer = open(dump_file, "w")
+            self.dump_writer = open(dump_file, "w", encoding="utf-8")
         else:
-            self.dump_writer = gzip.open(dump_file, "wt")
-
-
-    # batch urls for friendly download
-    # we never download two urls from the same domain in the same batch
-    def batch_urls(self, urls, batch_size : int = 250):
-
-        # extract the domain from the urls
-        domains = []
-        for url in urls:
-            parsed = urlparse(url)
-            domain = parsed.netloc
-            # remove "www." if you want the bare domain
-            if domain.startswith("www."):
-                domain = domain[4:]
-            domains.append(domain)
-
-        domain_list = defaultdict(list)
-        for url, domain in zip(urls, domains):
-            domain_list[domain].append(url)
-
-        # sort urls to batches
-        max_n = max([len(value) for value in domain_list.values()])
-        batches = []
-        for i in range(max_n):
-            batch = []
-            
-            for domain, url_list in domain_list.items():
-                if i < len(url_list):
-                    batch.append(url_list[i])
+            self.dump_writer = gzip.open(dump_file, "wt", encoding="utf-8")
 
-                if len(batch) >= batch_size:
-                    batches.append(batch)
-                    batch = []
-
-            if len(batch) > 0:
-                batches.append(batch)
 
-        return batches
-    
-    def write_warc(self, url : str, page_content : str, headers_list):
+    # payload is the raw body of the response
+    def write_warc(self, url : str, payload : bytes, headers_list):
 
         try:
             if self.warc_writer is None:
@@ -237,7 +512,7 @@ class HTMLStore:
                 self.warc_file = open(warc_file, 'wb')
                 self.warc_writer = WARCWriter(self.warc_file, gzip=not self.config.dont_compress_outputs)
 
-            s = BytesIO(page_content.encode())
+            s = BytesIO(payload)
             http_headers = StatusAndHeaders('200 OK', headers_list, protocol='HTTP/1.0')
             record = self.warc_writer.create_warc_record(url, 'response',
                                                 payload=s,
@@ -247,50 +522,159 @@ class HTMLStore:
             logging.debug("An exception occurred in write_warc, ", exc_info=True)
 
 
+    # a host that does not exist is suspended, it is dead if it still does not exist after the longest suspension
+    # name is the host name without the port, so hosts with a port in their urls are not suspended
+    def suspend_host(self, name : str):
+        logging.info(f"{name} does not exist")
+        self.circuit_breaker.suspend(get_host("http://" + name))
+
+    # resolve the hosts of urls in the background
+    def prefetch_hosts(self, urls : List[str]):
+        self.dns_cache.prefetch(filter(None, (urlparse(url).hostname for url in urls)))
+
+    # the crawl delay of a url from robots.txt, limited by the crawl delays of the config
+    def get_crawl_delay(self, url : str):
+        crawl_delay = self.robots_checker.get_crawl_sleep_delay(url, self.config.get_user_agent())
+        if crawl_delay is None:
+            return self.config.crawl_delay
+        return min(max(self.config.crawl_delay, crawl_delay), self.config.max_crawl_delay)
+
+    # store the result of download() in warc and json, return True if it contains html
+    def write_result(self, result : FetchResult):
+        if result.not_modified:
+            self.not_modified_urls.append(result.url)
+        if self.config.warc_output and result.http_headers is not None and result.contains_body:
+            self.write_warc(result.url, result.content, result.http_headers)
+        self.dump_writer.write(result.to_json())
+        self.dump_writer.write("\n")
+        return result.contains_body
+
+    # download() and tell the rate limiter when the host may be downloaded again
+    # the slot of the host was acquired in next_batch
+    def download_and_release(self, args):
+        start_time = time.time()
+        result = download(args)
+        url, conf = args[0], args[1]
+        status, retry_after = result.status, result.retry_after
+        latency = time.time() - start_time
+        # a long Retry-After does not hold up the round, the url itself is retried in a later round
+        self.rate_limiter.release(get_host(url), conf.crawl_delay, status, latency,
+            None if retry_after is None else min(retry_after, self.config.max_crawl_delay))
+        self.circuit_breaker.record(get_host(url), status)
+        if is_retryable(status):
+            with self.failed_lock:
+                self.failed_urls.append((url, retry_after))
+        with self.busy_lock:
+            self.busy_time += latency
+        return result
+
+    # how many urls of the host of a url may be downloaded at the same time
+    # more than one only for hosts without a crawl delay in robots.txt
+    def get_host_concurrency(self, url : str):
+        if self.config.host_concurrency <= 1:
+            return 1
+        if self.robots_checker.get_crawl_sleep_delay(url, self.config.get_user_agent()) is not None:
+            return 1
+        return self.config.host_concurrency
+
+    # the parameters of download() for a url
+    def download_args(self, url : str, pbar):
+        conf = self.config.clone()
+        conf.crawl_delay = self.get_crawl_delay(url)
+        return (url, conf, pbar, self.session_pool, self.download_stats, self.charset_resolver, self.validators)
+
+    # group urls by host and set the number of slots of each host in the rate limiter
+    def group_by_host(self, urls : List[str]):
+        host2urls = OrderedDict()
+        for url in urls:
+            host = get_host(url)
+            if host not in host2urls:
+                host2urls[host] = []
+                self.rate_limiter.set_max_slots(host, self.get_host_concurrency(url))
+            host2urls[host].append(url)
+        return host2urls
+
+    # the next batch of urls to download, with at most one url per free slot of every host that may be
+    # downloaded now. the slots are acquired in the rate limiter. host2urls is changed in place
+    # the urls of suspended hosts are moved to deferred_urls
+    def next_batch(self, host2urls : Dict[str, List[str]], batch_size : int):
+        batch = []
+        for host in list(host2urls.keys()):
+            if self.circuit_breaker.is_suspended(host):
+                self.deferred_urls += host2urls.pop(host)
+                continue
+            while len(batch) < batch_size and len(host2urls[host]) > 0 and self.rate_limiter.wait_time(host) == 0:
+                batch.append(host2urls[host].pop(0))
+                self.rate_limiter.acquire(host)
+            if len(host2urls[host]) == 0:
+                del host2urls[host]
+            else:
+                # the other hosts come first in the next batch
+                host2urls.move_to_end(host)
+            if len(batch) >= batch_size:
+                break
+        return batch
+
     # download a list of urls in parallel in multiple batches
+    # it returns the urls that were not downloaded because their host was suspended
     def download_urls(self, urls : List[str]):
 
         start_time = time.time()
         urls_with_html = 0
+        self.deferred_urls = []
+        self.failed_urls = []
+        self.not_modified_urls = []
+        self.rate_limiter.cleanup()
+        self.prefetch_hosts(urls)
+        self.busy_time = 0.0
+        self.download_stats.reset()
+        self.validators.lookup(urls)
 
-        # batch urls for friendly download
-        # we never download two urls from the same domain in the same batch
-        batches = self.batch_urls(urls, batch_size=self.config.download_batch_size)
         pbar = tqdm(total=len(urls))
-        for i in range(len(batches)):
+        if self.config.download_engine == "asyncio":
+            urls_with_html = self.download_urls_async(urls, pbar)
+        elif self.config.download_engine == "stream":
+            urls_with_html = self.download_urls_stream(urls, pbar)
+        else:
+            host2urls = self.group_by_host(urls)
 
-            logging.debug(f"download batch {i+1}/{len(batches)} with urls: {batches[i]}")
-            # collect parameters for parallel download
-            batch = []
-            for j in range(len(batches[i])):
-                conf = self.config.clone()
-                crawl_delay = self.robots_checker.get_crawl_sleep_delay(batches[i][j], self.config.get_user_agent())
-                if crawl_delay is not None:
-                    conf.crawl_delay = max(conf.crawl_delay, crawl_delay)
-                    conf.crawl_delay = min(conf.crawl_delay, conf.max_crawl_delay)
-                batch.append((batches[i][j], conf, pbar))
-
-            # do parallel download
+            # batch urls for friendly download
+            # a batch contains at most one url per slot of a host, by default one, and only hosts
+            # whose crawl delay has passed
             with ThreadPoolExecutor(max_workers=self.config.download_n_threads) as executor:
-                data = list(executor.map(download, batch))
-
-            # store results in warc and json
-            for row in data:
-                if self.config.warc_output:
-                    html, contains_body, http_headers = row
-                    if http_headers is not None:
-                        content = json.loads(html)
-                        if 'html' in content.keys():
-                            self.write_warc(content['url'], content['html'], http_headers.headers)
-                else:
-                    html, contains_body = row
-                self.dump_writer.write(html)
-                self.dump_writer.write("\n")
-                if contains_body:
-                    urls_with_html += 1
+                i = 0
+                while len(host2urls) > 0:
+                    next_urls = self.next_batch(host2urls, self.config.download_batch_size)
+                    if len(next_urls) == 0:
+                        if len(host2urls) == 0:
+                            break
+                        time.sleep(min(self.rate_limiter.wait_time(host) for host in host2urls.keys()))
+                        continue
+
+                    i += 1
+                    logging.debug(f"download batch {i} with urls: {next_urls}")
+                    # collect parameters for parallel download
+                    batch = [self.download_args(url, pbar) for url in next_urls]
+
+                    # do parallel download
+                    data = list(executor.map(self.download_and_release, batch))
+
+                    # store results in warc and json
+                    for result in data:
+                        if self.write_result(result):
+                            urls_with_html += 1
 
         t = time.time() - start_time
         logging.info(f"downloaded {urls_with_html:,} urls that contain html code in {t:.2f} seconds")
+        self.download_stats.log()
+        if len(self.deferred_urls) > 0:
+            logging.info(f"deferred {len(self.deferred_urls):,} urls of suspended hosts")
+        if self.config.dns_cache_ttl > 0:
+            self.dns_cache.log_stats()
+        if self.config.download_engine != "asyncio":
+            self.session_pool.log_stats()
+            utilisation = self.busy_time / (self.config.download_n_threads * t) if t > 0 else 0
+            logging.info(f"the download threads were busy {utilisation:.0%} of the time")
 
         self.dump_writer.close()
 
@@ -298,6 +682,70 @@ class HTMLStore:
             self.warc_writer = None
             self.warc_file.close()
 
+        return self.deferred_urls
+
+    # download a list of urls with a long-lived thread pool that starts the next url as soon as a
+    # thread is free, instead of waiting for the slowest url of a batch. the results are written in
+    # the order in which the downloads finish.
+    def download_urls_stream(self, urls : List[str], pbar):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.config.download_n_threads)
+
+        host2urls = self.group_by_host(urls)
+        futures = {}
+        urls_with_html = 0
+        while len(host2urls) > 0 or len(futures) > 0:
+
+            # fill the free threads, the rate limiter decides how many urls of a host run at the same time
+            free_threads = self.config.download_n_threads - len(futures)
+            for url in self.next_batch(host2urls, free_threads):
+                futures[self.executor.submit(self.download_and_release, self.download_args(url, pbar))] = get_host(url)
+
+            # when threads are free, wake up as soon as the next waiting host may be downloaded
+            timeout = None
+            if len(futures) < self.config.download_n_threads and len(host2urls) > 0:
+                timeout = min(self.rate_limiter.wait_time(host) for host in host2urls.keys())
+                if timeout == float("inf"):
+                    timeout = None
+
+            if len(futures) == 0:
+                # the remaining urls may have been deferred
+                if timeout is not None:
+                    time.sleep(timeout)
+                continue
+
+            done, _ = wait(futures.keys(), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                del futures[future]
+                if self.write_result(future.result()):
+                    urls_with_html += 1
+
+        return urls_with_html
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.validators.close()
+        self.dns_cache.close()
+        if self.robots_checker is not None:
+            self.robots_checker.close()
+
+    # download a list of urls with the asyncio engine, see download_urls_async
+    def download_urls_async(self, urls : List[str], pbar):
+        host2urls = self.group_by_host(urls)
+        host2delay = {host: self.get_crawl_delay(host_urls[0]) for host, host_urls in host2urls.items()}
+
+        logging.debug(f"download {len(urls)} urls of {len(host2urls)} hosts with asyncio")
+        data, self.deferred_urls, self.failed_urls = asyncio.run(download_urls_async(host2urls, host2delay, self.rate_limiter, self.config,
+            pbar, self.download_stats, self.charset_resolver, self.validators, self.circuit_breaker))
+
+        urls_with_html = 0
+        for result in data:
+            if self.write_result(result):
+                urls_with_html += 1
+        return urls_with_html
+
 
 # parse downloaded html files to extract clean text, languages and more.
 class Parser:
@@ -311,7 +759,8 @@ class Parser:
         model_path = hf_hub_download(repo_id="facebook/fasttext-language-identification", filename="model.bin")
         self.language_identification = fasttext.load_model(model_path)
         self.html2text = HTML2Text()
-        self.robots_checker = RobotsChecker()
+        # only used for the robots meta tags, robots.txt is checked by the Crawler
+        self.robots_checker = RobotsChecker(enabled=False)
 
     def parse_segments(self, paragraphs : List[str], url : str):
         
@@ -451,14 +900,14 @@ class Parser:
         writers = {}
         try:
             if infile[-3:] == ".gz":
-                reader = gzip.open(infile, "rt")
+                reader = gzip.open(infile, "rt", encoding="utf-8")
             else:
-                reader = open(infile, "r")
+                reader = open(infile, "r", encoding="utf-8")
 
             if self.config.dont_compress_outputs:
-                writer = open(outfile, "w")
+                writer = open(outfile, "w", encoding="utf-8")
             else:
-                writer = gzip.open(outfile, "wt")
+                writer = gzip.open(outfile, "wt", encoding="utf-8")
 
             try:
                 for batch in iterate_batches(reader):
@@ -468,19 +917,17 @@ class Parser:
                         if parsed_data is None:
                             continue
 
-                        json_data = json.dumps(parsed_data)
+                        json_data = dumps(parsed_data)
                         writer.write(json_data)
                         writer.write("\n")
 
+                        # count the segments in the target languages per domain
                         domain = urlparse(parsed_data["url"]).netloc
                         if domain not in domains2languages:
                             domains2languages[domain] = {}
-                        language = parsed_data.get("language")
-                        if language:
-                            if language not in domains2languages[domain]:
-                                domains2languages[domain][language] = 1
-                            else:
-                                domains2domains[domain][language] += 1
+                        for segment in parsed_data["segments"]:
+                            language = segment["language"]
+                            domains2languages[domain][language] = domains2languages[domain].get(language, 0) + 1
 
                         for url in parsed_data["parsed_urls"]:
                             urls.add(url)
@@ -560,68 +1007,89 @@ class Parser:
 
             yield href
 
-# helper class to keep a list of urls in memory and serialize / unserialize it from a json file
+# helper class to keep a list of urls and serialize / unserialize it from disk
+# the urls are held by one of the backends in frontier.py, backend is its name or a backend object
 class URLStore:
 
-    def __init__(self, file, start_urls = []):
-        self.urls = start_urls
+    def __init__(self, file, start_urls = [], backend = "text"):
         self.file = file
+        self.backend = create_backend(backend, file) if isinstance(backend, str) else backend
+        if len(start_urls) > 0:
+            self.backend.add_urls(start_urls)
 
     def write2file(self):
-        self.urls = [u.replace("\n", "") for u in self.urls]
-        self.urls = list(filter(lambda x:len(x.strip()) > 0, self.urls))
-        with open(self.file, "w") as f:
-            f.write("\n".join(self.urls))
+        self.backend.commit()
 
     def read(self):
-        if os.path.exists(self.file):
-            with open(self.file, "r") as f:
-                self.urls = f.readlines()
+        self.backend.read()
+
+    def add_urls(self, urls):
+        return self.backend.add_urls(urls)
 
     def remove_urls(self, urls):
-        self.urls = list(filter(lambda x:x not in urls, self.urls))
+        self.backend.remove_urls(urls)
+
+    # remove all urls of a host, returns the number of removed urls
+    def remove_host(self, host):
+        return self.backend.remove_host(host)
+
+    def get_hosts(self):
+        return self.backend.get_hosts()
+
+    # return the subset of urls that are contained in this store
+    def known_urls(self, urls):
+        return self.backend.known_urls(urls)
+
+    def head(self, n):
+        return self.backend.head(n)
 
     def file_exists(self):
-        return os.path.exists(self.file)
+        return self.backend.exists()
+
+    def __len__(self):
+        return len(self.backend)
+
+    def __iter__(self):
+        return iter(self.backend)
 
 # the urls that we need to download
 class URLs2Download(URLStore):
 
     def __init__(self, seed_urls, config):
         outfile = os.path.join(config.output_folder, "urls2download.txt")
-        super().__init__(outfile, seed_urls)
+        super().__init__(outfile, seed_urls, config.frontier_backend)
+
+        self.scheduler = HostScheduler(config.crawl_delay)
+
+    def read(self):
+        super().read()
+        self.scheduler.reset()
+
+    # the scheduler keeps its hosts between rounds, it learns about the hosts of the new urls here
+    def add_urls(self, urls):
+        urls = list(clean_urls(urls))
+        n = super().add_urls(urls)
+        if n > 0:
+            self.scheduler.add_hosts({get_host(url) for url in urls})
+        return n
 
     # return a batch of urls
     # the batch should be diverse, meaning they should come from different domains
     # this is to ensure friendly crawling
     def get_batch(self, batch_size):
-        urls_to_check = self.urls[0:min(len(self.urls), batch_size*10)]
+        return self.scheduler.get_batch(self.backend, batch_size)
 
-        domains2urls = defaultdict(list)
-        for url in urls_to_check:
-            domain = urlparse(url).netloc
-            domains2urls[domain].append(url)
-        domains = sorted(domains2urls.keys(), key=lambda x:len(domains2urls[x]), reverse=True)
-        batch = []
-        i=0
-        while len(batch) < batch_size and len(batch) < len(urls_to_check):
-            for domain in domains:
-                if len(domains2urls[domain]) > i:
-                    batch.append(domains2urls[domain][i])
-                    if len(batch) == batch_size or len(batch) == batch_size:
-                        break
-                else:
-                    break
-            i += 1
-        return batch
-            
 
 # the urls that we already downloaded
 class DownloadedURLs(URLStore):
 
     def __init__(self, config):
         outfile = os.path.join(config.output_folder, "downloaded_urls.txt")
-        super().__init__(outfile)
+        backend = config.frontier_backend
+        if config.seen_filter:
+            # we only need to know if a url was downloaded, a bloom filter answers this with much less memory
+            backend = BloomURLBackend(os.path.join(config.output_folder, "downloaded_urls.bloom"), config.seen_filter_error_rate)
+        super().__init__(outfile, backend=backend)
 
 
 class Crawler:
@@ -631,18 +1099,189 @@ class Crawler:
         html_store : HTMLStore,
         parser : Parser,
         urls2download : URLs2Download,
-        downloaded_urls : DownloadedURLs):
+        downloaded_urls : DownloadedURLs,
+        shard_router : ShardRouter = None,
+        seed_loader : SeedLoader = None):
 
         self.config : CrawlerConfig = config
         self.html_store : HTMLStore = html_store
         self.parser : Parser = parser
         self.urls2download : URLs2Download = urls2download
         self.downloaded_urls : DownloadedURLs = downloaded_urls
+        self.shard_router : ShardRouter = shard_router
+        self.seed_loader : SeedLoader = seed_loader
 
+        # the crawler processes on a machine can share the robots.txt files, see --host_policy_store
+        robots_cache_file = os.path.join(self.config.output_folder, "robots_cache.sqlite")
+        if self.config.host_policy_store is not None:
+            robots_cache_file = self.config.host_policy_store
         self.robots_checker = RobotsChecker(
             enabled=self.config.robots_check, 
-            cache_file=os.path.join(self.config.output_folder, "robots_cache.pkl"))
+            cache_file=robots_cache_file,
+            session_pool=self.html_store.session_pool,
+            shared=self.config.host_policy_store is not None)
         self.html_store.robots_checker = self.robots_checker
+        self.urls2download.scheduler.get_crawl_delay = self.get_crawl_delay
+
+        # hosts that are down are not scheduled until their suspension ended
+        self.circuit_breaker = self.html_store.circuit_breaker
+        self.circuit_breaker.read()
+        self.sync_host_health()
+        self.urls2download.scheduler.is_suspended = self.circuit_breaker.is_suspended
+        # False when the urls to download are left but none of them can be scheduled
+        self.can_schedule = True
+
+        # urls that failed temporarily and are downloaded again in a later round
+        self.retry_queue = RetryQueue(
+            os.path.join(self.config.output_folder, "retry_queue.json"),
+            self.config.retry_max_attempts,
+            self.config.retry_base_delay,
+            self.config.retry_max_delay)
+        self.retry_queue.read()
+
+        # segments in the target languages per host, used for focused crawling
+        self.host_yield = HostYieldTracker(
+            os.path.join(self.config.output_folder, "domain_language_counter.json"),
+            min_pages=self.config.focused_crawl_min_pages)
+        self.host_yield.read()
+        if self.config.focused_crawl:
+            self.urls2download.scheduler.get_priority = self.host_yield.priority
+
+        # the urls of dead and blocked hosts may have been added before the crawler started, e.g. by a recrawl
+        self.circuit_breaker.new_dead_hosts()
+        dead_hosts = set(self.circuit_breaker.dead_hosts())
+        if len(dead_hosts) > 0:
+            self.evict_dead_hosts([host for host in self.urls2download.get_hosts() if host in dead_hosts])
+            self.retry_queue.remove_hosts(dead_hosts)
+        if self.config.focused_crawl:
+            self.evict_blocked_hosts([host for host in self.urls2download.get_hosts() if self.host_yield.is_blocked(host)])
+
+    # the crawl delay of HTMLStore.get_crawl_delay, but only from robots.txt files that are already
+    # cached, the scheduler never fetches them. None lets the scheduler use the default crawl delay
+    def get_crawl_delay(self, url):
+        if not self.robots_checker.enabled or not self.robots_checker.cache.in_cache(url):
+            return None
+        return self.html_store.get_crawl_delay(url)
+
+    # False for the urls that are not added to the urls to download because their host is dead or,
+    # with focused crawling, did not yield any text in the target languages
+    def accept_url(self, url : str) -> bool:
+        host = get_host(url)
+        if self.circuit_breaker.is_dead(host):
+            return False
+        return not (self.config.focused_crawl and self.host_yield.is_blocked(host))
+
+    # add the urls that other shards sent to this shard to the urls to download
+    def receive_urls(self):
+        if self.shard_router is None:
+            return 0
+
+        urls = self.shard_router.receive()
+        existing_urls = self.downloaded_urls.known_urls(urls)
+        n = self.urls2download.add_urls(filter(lambda url: url not in existing_urls and self.accept_url(url), urls))
+        self.urls2download.write2file()
+        self.shard_router.delete_received()
+        return n
+
+    # add the next chunk of the seed file to the urls to download, one chunk per round
+    def load_seeds(self):
+        if not self.has_seeds():
+            return 0
+        return self.seed_loader.load_next(self.urls2download, self.downloaded_urls, self.accept_url)
+
+    # True if there are urls to download that the last round could schedule
+    def has_urls(self):
+        return len(self.urls2download) > 0 and self.can_schedule
+
+    def has_seeds(self):
+        return self.seed_loader is not None and not self.seed_loader.finished
+
+    # when this shard has no urls left, other shards may still send some
+    # wait until urls arrive or until shard_idle_timeout seconds passed
+    def wait_for_urls(self):
+        if self.shard_router is None:
+            return False
+
+        start_time = time.time()
+        while time.time() - start_time < self.config.shard_idle_timeout:
+            if self.receive_urls() > 0:
+                return True
+            time.sleep(min(10, self.config.shard_idle_timeout))
+        return False
+
+    # the urls of the next round, the due retries, which fill at most half of the round, and the
+    # candidates from the urls to download. when nothing may be downloaded now, because all hosts
+    # with urls are suspended or the retries are not due yet, wait until the first one may be fetched
+    def get_candidates(self):
+        while True:
+            retry_urls = self.retry_queue.due(max(1, self.config.round_size // 2), self.circuit_breaker.is_suspended)
+            candidates = [url.strip() for url in self.urls2download.get_batch(self.config.round_size - len(retry_urls))]
+            candidates = list(filter(lambda url: len(url) > 0, candidates))
+            if len(retry_urls) > 0 or len(candidates) > 0:
+                self.can_schedule = True
+                return retry_urls, candidates
+
+            wake_times = [self.retry_queue.next_due_time()]
+            if len(self.urls2download) > 0:
+                wake_times.append(self.circuit_breaker.next_resume_time())
+            wake_times = [t for t in wake_times if t is not None]
+            if len(wake_times) == 0:
+                if len(self.urls2download) > 0:
+                    logging.warning(f"none of the {len(self.urls2download):,} urls to download can be scheduled")
+                    self.can_schedule = False
+                return [], []
+            # retries of suspended hosts may be due already
+            wait_time = max(1, min(wake_times) - time.time())
+            logging.info(f"no urls may be downloaded now, wait {wait_time:.0f} seconds")
+            time.sleep(wait_time)
+
+    # exchange the suspended and dead hosts with the other crawler processes
+    def sync_host_health(self):
+        if self.config.host_policy_store is not None:
+            self.circuit_breaker.sync(self.config.host_policy_store)
+
+    def has_retries(self):
+        return len(self.retry_queue) > 0
+
+    # put the urls that failed temporarily in the retry queue and remove the retries that succeeded
+    # retry_urls are the retries of this round and deferred_urls the urls of suspended hosts
+    def update_retries(self, retry_urls : List[str], deferred_urls : Set[str]):
+        failed_urls = dict(self.html_store.failed_urls)
+        for url in retry_urls:
+            if url in deferred_urls:
+                self.retry_queue.postpone(url, self.circuit_breaker.next_resume_time() or 0)
+            elif url not in failed_urls:
+                self.retry_queue.remove(url)
+
+        given_up = 0
+        for url, retry_after in failed_urls.items():
+            if not self.retry_queue.schedule(url, retry_after):
+                given_up += 1
+        if len(failed_urls) > 0:
+            logging.info(f"{len(failed_urls) - given_up:,} urls failed temporarily and are retried later, "
+                f"gave up {given_up:,} urls, {len(self.retry_queue):,} urls in the retry queue")
+
+    # remove the urls of hosts that the circuit breaker found dead since the last round from the urls to download
+    def evict_dead_hosts(self, hosts : Optional[List[str]] = None):
+        if hosts is None:
+            hosts = self.circuit_breaker.new_dead_hosts()
+        n = 0
+        for host in hosts:
+            n += self.urls2download.remove_host(host)
+        n += self.retry_queue.remove_hosts(set(hosts))
+        if n > 0:
+            logging.info(f"removed {n:,} urls of dead hosts")
+
+    # focused crawling: drop hosts that did not yield any text in the target languages
+    # by default the hosts that were blocked since the last round
+    def evict_blocked_hosts(self, hosts : Optional[List[str]] = None):
+        if hosts is None:
+            hosts = self.host_yield.new_blocked_hosts()
+        n = 0
+        for host in hosts:
+            n += self.urls2download.remove_host(host)
+        if n > 0:
+            logging.info(f"removed {n:,} urls of hosts without text in the target languages")
 
     def round(self, num):
         filename = f"{num:05}.json"
@@ -659,8 +1298,13 @@ class Crawler:
             return 
 
         logging.info(f"start round {num}")
-        logging.info(f"number of urls to download: {len(self.urls2download.urls):,}")
-        logging.info(f"number of downloaded urls: {len(self.downloaded_urls.urls):,}")
+        self.receive_urls()
+        self.load_seeds()
+        # the yield of the hosts of the last round is known after it was parsed
+        if self.config.focused_crawl:
+            self.evict_blocked_hosts()
+        logging.info(f"number of urls to download: {len(self.urls2download):,}")
+        logging.info(f"number of downloaded urls: {len(self.downloaded_urls):,}")
 
         # download websites
         if os.path.exists(html_file):
@@ -670,24 +1314,18 @@ class Crawler:
 
             self.html_store.init_round(tmp_file, num)
 
-            urls_for_batch = []
-            urls_to_discard = []
-
-            # Create a set for faster lookups
-            downloaded_urls_set = set(self.downloaded_urls.urls)
-            for url in self.urls2download.get_batch(self.config.round_size):
-                url = url.strip()
-                if not url:
-                    continue
-
-                if len(urls_for_batch) >= self.config.round_size:
-                    break
-
-                if url in downloaded_urls_set:
-                    urls_to_discard.append(url)
-                    continue
+            retry_urls, candidates = self.get_candidates()
+            # resolve the hosts while robots.txt is checked
+            self.html_store.prefetch_hosts(retry_urls + candidates)
+            # download the missing robots.txt files while the urls of the round are selected
+            self.robots_checker.prefetch(retry_urls + candidates, self.config.download_n_threads)
 
-                urls_for_batch.append(url)
+            # look up all candidates in the history at once
+            downloaded = self.downloaded_urls.known_urls(candidates)
+            urls_to_discard = [url for url in candidates if url in downloaded]
+            urls_for_batch = [url for url in candidates if url not in downloaded]
+            # the retries were downloaded before, so they are not looked up in the history
+            urls_for_batch = retry_urls + urls_for_batch[0:self.config.round_size - len(retry_urls)]
 
             if len(urls_to_discard) > 0:
                 self.urls2download.remove_urls(urls_to_discard)
@@ -703,21 +1341,36 @@ class Crawler:
             if urls_to_discard:
                 logging.info(f"Discarding {len(urls_to_discard)} URLs (disallowed or already seen).")
                 self.urls2download.remove_urls(urls_to_discard)
-                self.downloaded_urls.urls.extend(urls_to_discard)
+                self.downloaded_urls.add_urls(urls_to_discard)
+                for url in urls_to_discard:
+                    self.retry_queue.remove(url)
 
             if len(urls_for_batch) == 0:
                 logging.info("No URLs to download, stop round")
                 return
 
             logging.info(f"Downloading {len(urls_for_batch)} urls")
-            self.html_store.download_urls(urls_for_batch)
+            deferred_urls = set(self.html_store.download_urls(urls_for_batch))
 
+            # the deferred urls stay in the urls to download
+            urls_for_batch = [url for url in urls_for_batch if url not in deferred_urls]
             self.urls2download.remove_urls(urls_for_batch)
-            self.downloaded_urls.urls.extend(urls_for_batch)
+            self.downloaded_urls.add_urls(urls_for_batch)
+            # the pages of the retries were counted in their first attempt, pages that did not change
+            # since the previous crawl are not parsed again and have no segments to count
+            skipped = set(retry_urls) | set(self.html_store.not_modified_urls)
+            self.host_yield.add_pages([url for url in urls_for_batch if url not in skipped])
+            self.update_retries(retry_urls, deferred_urls)
+            self.sync_host_health()
+            self.evict_dead_hosts()
             
             # Persist changes
             self.urls2download.write2file()
+            self.html_store.validators.commit()
             self.downloaded_urls.write2file()
+            self.circuit_breaker.write2file()
+            self.retry_queue.write2file()
+            self.robots_checker.flush()
 
             os.rename(tmp_file, html_file)
 
@@ -730,17 +1383,26 @@ class Crawler:
             
             os.rename(tmp_file, parse_file)
 
+            self.host_yield.add_segments(domains2languages)
+            self.host_yield.write2file()
+
             logging.info(f"extracted {len(new_urls):,} new urls")
             
-            existing_urls = set(self.downloaded_urls.urls)
-            urls2download = set(self.urls2download.urls)
-
             new_urls = list(new_urls)
             random.shuffle(new_urls)
 
-            for url in new_urls:
-                if url not in existing_urls and url not in urls2download:
-                    self.urls2download.urls.append(url)
+            if self.shard_router is not None:
+                new_urls, foreign_urls = self.shard_router.split(new_urls)
+                self.shard_router.send(foreign_urls, num)
+
+            # add_urls skips urls that are already in the list of urls to download
+            # the urls of dead and blocked hosts are not added, their hosts were evicted already
+            existing_urls = self.downloaded_urls.known_urls(new_urls)
+            self.urls2download.add_urls(filter(lambda url: url not in existing_urls and self.accept_url(url), new_urls))
+
+            # focused crawling: the hosts that are blocked now that their pages of this round were parsed
+            if self.config.focused_crawl:
+                self.evict_blocked_hosts()
             self.urls2download.write2file()
 
         # cleanup
@@ -771,6 +1433,34 @@ def parse_args(config):
     parser.add_argument('--robots_check', default=True, type=bool, help="Enable or disable robots.txt checking.")  #robochecks
     parser.add_argument('--dont_compress_outputs', default=False, action="store_true", help="GZip compress the output files")
     parser.add_argument('--warc_output', default=False, action="store_true", help="Write WARC files in addition to the normal JSON files.")
+    parser.add_argument('--frontier_backend', default="text", type=str, choices=["text", "sqlite"], help="How to store the urls to download and the downloaded urls. Use sqlite for large crawls.")
+    parser.add_argument('--seen_filter', default=False, action="store_true", help="Store the downloaded urls in a compact Bloom filter instead of a full list.")
+    parser.add_argument('--seen_filter_error_rate', default=0.001, type=float, help="False positive rate of --seen_filter, i.e. the fraction of new urls that are wrongly skipped as downloaded.")
+    parser.add_argument('--num_shards', default=1, type=int, help="Split the crawl over this many crawler processes. Each process owns a part of the hosts.")
+    parser.add_argument('--shard_id', default=0, type=int, help="The shard of this process, between 0 and num_shards - 1.")
+    parser.add_argument('--shard_idle_timeout', default=600, type=int, help="When a shard has no urls left, wait this many seconds for urls from other shards before it stops.")
+    parser.add_argument('--focused_crawl', default=False, action="store_true", help="Prefer hosts that yielded many segments in the target languages and stop crawling hosts without any.")
+    parser.add_argument('--focused_crawl_min_pages', default=20, type=int, help="With --focused_crawl, stop crawling a host when this many pages did not contain any segment in the target languages.")
+    parser.add_argument('--seed_chunk_size', default=1000000, type=int, help="Read the seed file in chunks of this many lines. One chunk is added to the urls to download per round.")
+    parser.add_argument('--http_pool_hosts', default=1000, type=int, help="Keep open connections to this many hosts.")
+    parser.add_argument('--http_pool_size', default=4, type=int, help="Keep this many open connections per host.")
+    parser.add_argument('--http_idle_timeout', default=30, type=int, help="Close connections that were not used for this many seconds.")
+    parser.add_argument('--download_engine', default="threads", type=str, choices=["threads", "stream", "asyncio"], help="Download with a pool of threads in batches, with a pool of threads that starts the next url as soon as a thread is free, or with asyncio. asyncio can keep thousands of connections open at the same time.")
+    parser.add_argument('--async_max_connections', default=1000, type=int, help="With --download_engine asyncio, the maximum number of open connections.")
+    parser.add_argument('--host_concurrency', default=1, type=int, help="How many urls of the same host to download at the same time. It only applies to hosts without a Crawl-delay in robots.txt.")
+    parser.add_argument('--adaptive_concurrency', default=False, action="store_true", help="Start with one download per host and increase it up to --host_concurrency. Back off on 429 and 503 responses and when the responses of a host get slower.")
+    parser.add_argument('--max_body_size', default=10000000, type=int, help="Skip responses whose body is larger than this many bytes. Set to 0 for no limit.")
+    parser.add_argument('--truncate_large_bodies', default=False, action="store_true", help="Keep the first --max_body_size bytes of larger responses instead of skipping them.")
+    parser.add_argument('--recrawl_from', default=None, type=str, help="Output folder of a previous crawl. Download its pages again and only parse the pages that changed.")
+    parser.add_argument('--circuit_breaker_threshold', default=3, type=int, help="Suspend a host after this many connection errors or timeouts in a row. Set to 0 to never suspend hosts.")
+    parser.add_argument('--circuit_breaker_suspension', default=60, type=int, help="How many seconds a host is suspended the first time. The suspension doubles every time the host fails again.")
+    parser.add_argument('--circuit_breaker_max_suspension', default=86400, type=int, help="Remove the urls of a host when it would be suspended for longer than this many seconds.")
+    parser.add_argument('--retry_max_attempts', default=3, type=int, help="How often to download a url that fails with 429, 502, 503, 504 or a network error before it is given up.")
+    parser.add_argument('--retry_base_delay', default=60, type=int, help="Seconds before the first retry of a url whose response has no Retry-After header. The delay doubles with every attempt.")
+    parser.add_argument('--retry_max_delay', default=3600, type=int, help="The delay between two retries of a url without a Retry-After header is at most this many seconds.")
+    parser.add_argument('--dns_cache_ttl', default=300, type=int, help="Cache the addresses of the hosts for this many seconds. Set to 0 to disable the DNS cache.")
+    parser.add_argument('--dns_prefetch_threads', default=16, type=int, help="How many threads resolve the hosts of the next urls in the background.")
+    parser.add_argument('--host_policy_store', default=None, type=str, help="SQLite file with the robots.txt files and the suspended and dead hosts that several crawler processes share, e.g. one process per language.")
 
     args = parser.parse_args()
 
@@ -792,6 +1482,34 @@ def parse_args(config):
     config.robots_check = args.robots_check #robochecks
     config.dont_compress_outputs = args.dont_compress_outputs
     config.warc_output = args.warc_output
+    config.frontier_backend = args.frontier_backend
+    config.seen_filter = args.seen_filter
+    config.seen_filter_error_rate = args.seen_filter_error_rate
+    config.num_shards = args.num_shards
+    config.shard_id = args.shard_id
+    config.shard_idle_timeout = args.shard_idle_timeout
+    config.focused_crawl = args.focused_crawl
+    config.focused_crawl_min_pages = args.focused_crawl_min_pages
+    config.seed_chunk_size = args.seed_chunk_size
+    config.http_pool_hosts = args.http_pool_hosts
+    config.http_pool_size = args.http_pool_size
+    config.http_idle_timeout = args.http_idle_timeout
+    config.download_engine = args.download_engine
+    config.async_max_connections = args.async_max_connections
+    config.host_concurrency = args.host_concurrency
+    config.adaptive_concurrency = args.adaptive_concurrency
+    config.max_body_size = args.max_body_size
+    config.truncate_large_bodies = args.truncate_large_bodies
+    config.recrawl_from = args.recrawl_from
+    config.circuit_breaker_threshold = args.circuit_breaker_threshold
+    config.circuit_breaker_suspension = args.circuit_breaker_suspension
+    config.circuit_breaker_max_suspension = args.circuit_breaker_max_suspension
+    config.retry_max_attempts = args.retry_max_attempts
+    config.retry_base_delay = args.retry_base_delay
+    config.retry_max_delay = args.retry_max_delay
+    config.dns_cache_ttl = args.dns_cache_ttl
+    config.dns_prefetch_threads = args.dns_prefetch_threads
+    config.host_policy_store = args.host_policy_store
 
     return args
 
@@ -845,9 +1563,20 @@ def start_crawler(config):
 
     random.seed(0)
 
+    # each shard writes to its own subfolder of the output folder
+    shard_router = None
+    if config.num_shards > 1:
+        shard_router = ShardRouter(config.output_folder, config.num_shards, config.shard_id)
+        config.output_folder = shard_router.shard_folder()
+
+    if config.recrawl_from is not None and os.path.abspath(config.recrawl_from) == os.path.abspath(config.output_folder):
+        raise Exception("--recrawl_from needs to be different from --output_folder")
+
     if config.start_fresh:
         if os.path.exists(config.output_folder):
             shutil.rmtree(config.output_folder)
+        if shard_router is not None and os.path.exists(shard_router.inbox(config.shard_id)):
+            shutil.rmtree(shard_router.inbox(config.shard_id))
 
     if not os.path.exists(config.output_folder):
         os.makedirs(config.output_folder)
@@ -861,43 +1590,57 @@ def start_crawler(config):
     html_store = HTMLStore(config)
 
     urls2download = URLs2Download([], config)
-    if not urls2download.file_exists():
-
-        if config.seed_url is not None:
-            urls = [config.seed_url.strip()]
-        else:
-            if config.seed_file[-3:] == ".gz":
-                urls = gzip.open(config.seed_file, "rt").readlines()
-            else:
-                urls = open(config.seed_file, "r").readlines()
-
-            urls = [f.replace("\n", "") for f in urls]
-            urls = list(filter(lambda url : len(url.strip()) > 0, urls))
-
-            logging.info(f"initialize crawler with {len(urls):,} seed urls")
-        random.shuffle(urls)
-        urls2download.urls = urls
-    else:
-        urls2download.read()
+    is_new_crawl = not urls2download.file_exists()
+    urls2download.read()
+
+    # a recrawl downloads the pages of the previous crawl again with their validators
+    if config.recrawl_from is not None and is_new_crawl:
+        recrawl_folder = config.recrawl_from
+        if shard_router is not None:
+            recrawl_folder = os.path.join(recrawl_folder, os.path.basename(config.output_folder))
+        html_store.validators.copy_from(os.path.join(recrawl_folder, "validators.sqlite"))
+        urls2download.add_urls(html_store.validators)
+        urls2download.write2file()
+
+    # the seed file is streamed into the urls to download in chunks, see seeds.py
+    # crawls that were started before the seed loader existed have no progress file and all their seeds
+    seed_loader = None
+    seed_progress_file = os.path.join(config.output_folder, "seed_progress.json")
+    if config.seed_url is not None:
+        if is_new_crawl and (shard_router is None or shard_router.owns(config.seed_url)):
+            urls2download.add_urls([config.seed_url.strip()])
+    elif is_new_crawl or os.path.exists(seed_progress_file):
+        seed_loader = SeedLoader(
+            config.seed_file,
+            seed_progress_file,
+            chunk_size=config.seed_chunk_size,
+            filter_fn=None if shard_router is None else shard_router.owns)
+        if not is_new_crawl:
+            seed_loader.read_progress()
 
     downloaded_urls = DownloadedURLs(config)
     downloaded_urls.read()
 
     parser = Parser(config)
-    crawler = Crawler(config, html_store, parser, urls2download, downloaded_urls)
+    crawler = Crawler(config, html_store, parser, urls2download, downloaded_urls, shard_router, seed_loader)
+    crawler.receive_urls()
 
     # start crawling
     round = 1
-    if len(urls2download.urls) == 0:
+    if len(urls2download) == 0 and not crawler.has_seeds() and not crawler.has_retries():
         logging.info(f"there are no urls to download")
 
-    while len(urls2download.urls) > 0:
-        if config.num_rounds > 0 and config.num_rounds < round:
-            break
+    # the dns cache answers socket.getaddrinfo while the crawler runs
+    # the crawl ends when the remaining urls to download cannot be scheduled, e.g. because their hosts are dead
+    with html_store.dns_cache:
+        while crawler.has_urls() or crawler.has_seeds() or crawler.has_retries() or crawler.wait_for_urls():
+            if config.num_rounds > 0 and config.num_rounds < round:
+                break
 
-        crawler.round(round)
-        round += 1
+            crawler.round(round)
+            round += 1
 
+    html_store.close()
     logging.info("crawling finished")
 
 if __name__ == "__main__":
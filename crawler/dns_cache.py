@@ -0,0 +1,214 @@
+"""
+In-process DNS cache with a prefetcher.
+
+The urls of a batch mostly belong to different hosts, so almost every download starts with a
+getaddrinfo call to the system resolver, which does not scale well to many threads. The cache keeps
+the addresses of each host for ttl seconds. While the cache is installed, e.g. with "with cache:",
+socket.getaddrinfo is routed through it, so requests, the robots.txt fetcher and aiohttp's threaded
+resolver all use it. prefetch() resolves the hosts of the next urls in a thread pool while the
+current urls download.
+
+Hosts that do not exist (NXDOMAIN) are cached as negative entries and reported to on_nxdomain.
+Calls with flags other than AI_ADDRCONFIG, which aiohttp sets, are passed to the system resolver.
+"""
+
+import time
+import socket
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# the errors of getaddrinfo that mean that the host has no address, other errors are temporary
+NXDOMAIN_ERRORS = {socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)}
+
+# the flags of getaddrinfo calls that are answered from the cache, the cache resolves with AI_ADDRCONFIG
+CACHED_FLAGS = {0, socket.AI_ADDRCONFIG}
+
+# the real socket.getaddrinfo, and the cache that replaces it while one is installed
+system_getaddrinfo = socket.getaddrinfo
+installed_cache = None
+
+
+def cached_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    cache = installed_cache
+    if cache is None:
+        return system_getaddrinfo(host, port, family, type, proto, flags)
+    return cache.getaddrinfo(host, port, family, type, proto, flags)
+
+
+# an entry of the cache is a list of (address family, socket address) or a gaierror for hosts
+# that do not exist, and the time when it expires
+class DNSCache:
+
+    def __init__(self, ttl : float = 300, prefetch_threads : int = 16, max_hosts : int = 100000,
+            on_nxdomain : Optional[Callable[[str], None]] = None, resolve_fn : Callable = None):
+        """
+        Args:
+            ttl: seconds that the addresses of a host are cached, 0 disables the cache
+            prefetch_threads: number of threads that resolve hosts in the background
+            max_hosts: number of cached hosts, the least recently used host is dropped first
+            on_nxdomain: called with the name of a host that does not exist
+            resolve_fn: the function that resolves a host, socket.getaddrinfo by default
+        """
+        self.ttl = ttl
+        self.prefetch_threads = prefetch_threads
+        self.max_hosts = max_hosts
+        self.on_nxdomain = on_nxdomain
+        self.resolve_fn = resolve_fn if resolve_fn is not None else system_getaddrinfo
+
+        self.lock = Lock()
+        self.entries : Dict[str, Tuple[object, float]] = OrderedDict()
+        # hosts that are being resolved right now
+        self.pending : Dict[str, Future] = {}
+        self.executor : ThreadPoolExecutor = None
+
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.prefetched = 0
+
+    # route socket.getaddrinfo of the whole process through this cache
+    def install(self):
+        global installed_cache
+        installed_cache = self
+        socket.getaddrinfo = cached_getaddrinfo
+
+    def uninstall(self):
+        global installed_cache
+        if installed_cache is self:
+            installed_cache = None
+            socket.getaddrinfo = system_getaddrinfo
+
+    # install the cache for the duration of a with block, a cache with ttl 0 is not installed
+    def __enter__(self):
+        if self.ttl > 0:
+            self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.uninstall()
+
+    # look up the cache entry of a host, None if there is none or it expired
+    def get_entry(self, host : str):
+        with self.lock:
+            entry = self.entries.get(host)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self.entries[host]
+                return None
+            self.entries.move_to_end(host)
+            return entry[0]
+
+    def put_entry(self, host : str, value):
+        with self.lock:
+            self.entries[host] = (value, time.time() + self.ttl)
+            self.entries.move_to_end(host)
+            while len(self.entries) > self.max_hosts:
+                self.entries.popitem(last=False)
+
+    # resolve a host with the real resolver and cache the result
+    def lookup(self, host : str):
+        try:
+            value = [(info[0], info[4]) for info in self.resolve_fn(host, None, 0, socket.SOCK_STREAM, 0, socket.AI_ADDRCONFIG)]
+        except socket.gaierror as e:
+            if e.errno not in NXDOMAIN_ERRORS:
+                raise
+            logging.debug(f"{host} does not exist")
+            value = e
+            if self.on_nxdomain is not None:
+                self.on_nxdomain(host)
+        self.put_entry(host, value)
+        return value
+
+    # the addresses of a host as (address family, socket address), from the cache if possible
+    # it raises socket.gaierror for hosts that do not exist
+    def resolve(self, host : str) -> List[Tuple[int, tuple]]:
+        value = self.get_entry(host)
+        if value is None:
+            with self.lock:
+                future = self.pending.get(host)
+                if future is None:
+                    future = Future()
+                    self.pending[host] = future
+                    owner = True
+                else:
+                    owner = False
+                self.misses += 1
+
+            # only one thread resolves a host, the other threads wait for its result
+            if owner:
+                try:
+                    future.set_result(self.lookup(host))
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    with self.lock:
+                        del self.pending[host]
+            value = future.result()
+        else:
+            with self.lock:
+                self.hits += 1
+
+        if isinstance(value, socket.gaierror):
+            with self.lock:
+                self.negative_hits += 1
+            raise value
+        return value
+
+    # replacement for socket.getaddrinfo
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        # numeric service names and stream sockets are all that the crawler needs, the rest is not cached
+        if self.ttl <= 0 or not isinstance(host, str) or type not in [0, socket.SOCK_STREAM] or flags not in CACHED_FLAGS or \
+                not (port is None or isinstance(port, int) or (isinstance(port, str) and port.isdigit())):
+            return system_getaddrinfo(host, port, family, type, proto, flags)
+
+        port = 0 if port is None else int(port)
+        results = []
+        for address_family, address in self.resolve(host):
+            if family not in [0, address_family]:
+                continue
+            address = (address[0], port) + tuple(address[2:])
+            results.append((address_family, socket.SOCK_STREAM, proto or socket.IPPROTO_TCP, "", address))
+        if len(results) == 0:
+            raise socket.gaierror(socket.EAI_ADDRFAMILY if hasattr(socket, "EAI_ADDRFAMILY") else socket.EAI_NONAME,
+                f"{host} has no address of family {family}")
+        return results
+
+    def prefetch_host(self, host : str):
+        try:
+            self.resolve(host)
+        except Exception as e:
+            logging.debug(f"could not prefetch {host}: {e}")
+
+    # resolve hosts in the background, hosts that are cached or being resolved are skipped
+    def prefetch(self, hosts : Iterable[str]):
+        if self.ttl <= 0:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.prefetch_threads)
+        for host in set(hosts):
+            with self.lock:
+                entry = self.entries.get(host)
+                if host in self.pending or (entry is not None and entry[1] >= time.time()):
+                    continue
+                self.prefetched += 1
+            self.executor.submit(self.prefetch_host, host)
+
+    def close(self):
+        self.uninstall()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "negative_hits": self.negative_hits,
+                "prefetched": self.prefetched, "hosts": len(self.entries)}
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"dns cache: {stats['hits']:,} hits, {stats['misses']:,} misses, "
+            f"{stats['negative_hits']:,} hosts did not exist, {stats['prefetched']:,} hosts prefetched")
@@ -0,0 +1,318 @@
+"""
+Storage backends for the url lists of the crawler, i.e. the urls that we still need to download
+(the frontier) and the urls that we already downloaded.
+
+The "text" backend keeps all urls in memory and serializes them to a plain text file. The "sqlite"
+backend keeps the urls in an embedded SQLite database, so that memory and per-round I/O do not grow
+with the size of the crawl.
+"""
+
+import os
+import re
+import sqlite3
+import logging
+from itertools import islice
+from typing import Dict, Iterable, List, Set, Tuple
+from urllib.parse import urlparse
+
+
+HOST_PATTERN = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*://([^/?#]*)")
+
+# the host of a url, politeness rules are applied per host
+def get_host(url : str) -> str:
+    # a regular expression is much faster than urlparse, which is only needed for unusual urls
+    match = HOST_PATTERN.match(url)
+    host = match.group(1) if match else urlparse(url).netloc
+    host = host.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+def clean_urls(urls : Iterable[str]):
+    for url in urls:
+        url = url.replace("\n", "").strip()
+        if len(url) > 0:
+            yield url
+
+
+# keep the urls in memory and serialize them to a text file with one url per line
+# the urls are the keys of a dict, which keeps the insertion order and doubles as a hash index,
+# so adding, removing and looking up urls costs time proportional to the batch, not to the store.
+# a second index keeps the urls of each host in the same way.
+#
+# the text file is a checkpoint. commit() only appends the urls that were added ("+url") and
+# removed ("-url") since the last commit to a journal file, followed by a commit marker, and
+# fsyncs it. when the journal grows larger than the store, it is compacted into a new checkpoint.
+# read() loads the checkpoint and replays the journal up to the last commit marker, so changes of a
+# round that was interrupted by a crash are dropped.
+class TextURLBackend:
+
+    COMMIT_MARKER = "#commit"
+
+    def __init__(self, file : str, compaction_ratio : float = 1.0, min_compaction_size : int = 10000):
+        self.file = file
+        self.journal_file = file + ".journal"
+        self.compaction_ratio = compaction_ratio
+        self.min_compaction_size = min_compaction_size
+        self.urls : Dict[str, None] = {}
+        self.hosts : Dict[str, Dict[str, None]] = {}
+
+        # changes since the last commit as ("+" or "-", url) and number of changes in the journal file
+        self.changes : List[Tuple[str, str]] = []
+        self.journal_size = 0
+
+    def read(self):
+        self.urls = {}
+        self.hosts = {}
+        if os.path.exists(self.file):
+            with open(self.file, "r") as f:
+                for url in clean_urls(f):
+                    self.add(url)
+
+        self.journal_size = 0
+        if os.path.exists(self.journal_file):
+            self.replay_journal()
+        self.changes = []
+
+    def replay_journal(self):
+        pending = []
+        # the end of the last commit marker, the changes after it were not committed
+        committed_offset = 0
+        offset = 0
+        with open(self.journal_file, "rb") as f:
+            for line in f:
+                offset += len(line)
+                # the last line is incomplete if the crawler crashed while writing it
+                if not line.endswith(b"\n"):
+                    break
+                line = line[0:-1].decode("utf-8")
+                if line == TextURLBackend.COMMIT_MARKER:
+                    for change in pending:
+                        if change[0] == "+":
+                            self.add(change[1:])
+                        else:
+                            self.remove(change[1:])
+                    self.journal_size += len(pending)
+                    pending = []
+                    committed_offset = offset
+                else:
+                    pending.append(line)
+
+        # cut off the uncommitted tail, otherwise the next commit would append to it and make it valid
+        if offset > committed_offset:
+            logging.warning(f"dropped {len(pending):,} uncommitted changes from {self.journal_file}")
+            with open(self.journal_file, "r+b") as f:
+                f.truncate(committed_offset)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def commit(self):
+        if not os.path.exists(self.file):
+            self.compact()
+        elif len(self.changes) > 0:
+            journal_size = self.journal_size + len(self.changes)
+            if journal_size > max(self.min_compaction_size, len(self.urls) * self.compaction_ratio):
+                self.compact()
+            else:
+                with open(self.journal_file, "a") as f:
+                    f.write("".join(op + url + "\n" for op, url in self.changes))
+                    f.write(TextURLBackend.COMMIT_MARKER + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.journal_size = journal_size
+        self.changes = []
+
+    # write all urls to a new checkpoint and start an empty journal
+    def compact(self):
+        tmp_file = self.file + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write("\n".join(self.urls))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.file)
+
+        # replaying the old journal on top of the new checkpoint gives the same urls,
+        # so a crash before the journal is removed is harmless
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self.journal_size = 0
+
+    def exists(self) -> bool:
+        return os.path.exists(self.file) or os.path.exists(self.journal_file)
+
+    def add(self, url : str) -> bool:
+        if url in self.urls:
+            return False
+        self.urls[url] = None
+        self.hosts.setdefault(get_host(url), {})[url] = None
+        return True
+
+    def remove(self, url : str) -> bool:
+        if url not in self.urls:
+            return False
+        del self.urls[url]
+        host = get_host(url)
+        del self.hosts[host][url]
+        if len(self.hosts[host]) == 0:
+            del self.hosts[host]
+        return True
+
+    # remove all urls of a host
+    def remove_host(self, host : str) -> int:
+        urls = list(self.hosts.get(host, {}).keys())
+        self.remove_urls(urls)
+        return len(urls)
+
+    def add_urls(self, urls : Iterable[str]) -> int:
+        n = 0
+        for url in clean_urls(urls):
+            if self.add(url):
+                self.changes.append(("+", url))
+                n += 1
+        return n
+
+    def remove_urls(self, urls : Iterable[str]):
+        for url in urls:
+            if self.remove(url):
+                self.changes.append(("-", url))
+
+    def known_urls(self, urls : Iterable[str]) -> Set[str]:
+        return {url for url in urls if url in self.urls}
+
+    def head(self, n : int) -> List[str]:
+        return list(islice(self.urls, n))
+
+    # all hosts that have urls in the store
+    def get_hosts(self) -> List[str]:
+        return list(self.hosts.keys())
+
+    def host_urls(self, host : str, offset : int, n : int) -> List[str]:
+        return list(islice(self.hosts.get(host, {}), offset, offset + n))
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __iter__(self):
+        return iter(self.urls)
+
+
+# keep the urls in a SQLite table
+# the insertion order is kept by the autoincrement id, the unique index on the url column answers
+# "seen" lookups and the index on (host, id) gives the urls of a host in insertion order. the table
+# hosts counts the urls per host and is maintained by triggers. changes are written in a transaction
+# that is committed once per round, so a crash always leaves the database in the state of the last
+# completed round.
+class SQLiteURLBackend:
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS urls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL UNIQUE,
+            host TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS urls_host ON urls (host, id);
+        CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, n INTEGER NOT NULL);
+        CREATE TRIGGER IF NOT EXISTS urls_insert AFTER INSERT ON urls BEGIN
+            INSERT OR IGNORE INTO hosts (host, n) VALUES (NEW.host, 0);
+            UPDATE hosts SET n = n + 1 WHERE host = NEW.host;
+        END;
+        CREATE TRIGGER IF NOT EXISTS urls_delete AFTER DELETE ON urls BEGIN
+            UPDATE hosts SET n = n - 1 WHERE host = OLD.host;
+            DELETE FROM hosts WHERE host = OLD.host AND n <= 0;
+        END;
+    """
+
+    def __init__(self, file : str):
+        self.file = file
+        self.connection = None
+        self.count = 0
+
+    def get_connection(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.file)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SQLiteURLBackend.SCHEMA)
+            self.count = self.connection.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            logging.debug(f"opened {self.file} with {self.count:,} urls")
+        return self.connection
+
+    def read(self):
+        self.get_connection()
+
+    def commit(self):
+        self.get_connection().commit()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.file)
+
+    def add_urls(self, urls : Iterable[str]) -> int:
+        cursor = self.get_connection().executemany(
+            "INSERT OR IGNORE INTO urls (url, host) VALUES (?, ?)",
+            ((url, get_host(url)) for url in clean_urls(urls)))
+        self.count += cursor.rowcount
+        return cursor.rowcount
+
+    def remove_urls(self, urls : Iterable[str]):
+        cursor = self.get_connection().executemany(
+            "DELETE FROM urls WHERE url = ?", ((url,) for url in urls))
+        self.count -= cursor.rowcount
+
+    def remove_host(self, host : str) -> int:
+        cursor = self.get_connection().execute("DELETE FROM urls WHERE host = ?", (host,))
+        self.count -= cursor.rowcount
+        return cursor.rowcount
+
+    def known_urls(self, urls : Iterable[str]) -> Set[str]:
+        connection = self.get_connection()
+        urls = list(urls)
+        known = set()
+        # look up the urls in chunks, sqlite limits the number of parameters per query
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(f"SELECT url FROM urls WHERE url IN ({placeholders})", chunk)
+            known.update(row[0] for row in rows)
+        return known
+
+    def head(self, n : int) -> List[str]:
+        rows = self.get_connection().execute("SELECT url FROM urls ORDER BY id LIMIT ?", (n,))
+        return [row[0] for row in rows]
+
+    def get_hosts(self) -> List[str]:
+        return [row[0] for row in self.get_connection().execute("SELECT host FROM hosts ORDER BY rowid")]
+
+    def host_urls(self, host : str, offset : int, n : int) -> List[str]:
+        rows = self.get_connection().execute(
+            "SELECT url FROM urls WHERE host = ? ORDER BY id LIMIT ? OFFSET ?", (host, n, offset))
+        return [row[0] for row in rows]
+
+    def __len__(self):
+        self.get_connection()
+        return self.count
+
+    def __iter__(self):
+        for row in self.get_connection().execute("SELECT url FROM urls ORDER BY id"):
+            yield row[0]
+
+
+FRONTIER_BACKENDS = {
+    "text": TextURLBackend,
+    "sqlite": SQLiteURLBackend,
+}
+
+# create a backend for the given text file
+# the sqlite backend stores its data next to it in a file with the extension .sqlite
+def create_backend(name : str, file : str):
+    if name not in FRONTIER_BACKENDS:
+        raise Exception(f"unknown frontier backend '{name}', choose one of {list(FRONTIER_BACKENDS.keys())}")
+
+    if name == "sqlite":
+        file = os.path.splitext(file)[0] + ".sqlite"
+
+    return FRONTIER_BACKENDS[name](file)
@@ -0,0 +1,146 @@
+"""
+Pool of HTTP sessions that keeps the connections to the crawled hosts alive.
+
+requests.get opens a new connection for every url, so every page costs a TCP and often a TLS
+handshake. The pool keeps idle requests.Session objects per host. A worker checks out a session for
+the host of its url and returns it afterwards, so the next url of the same host, e.g. in the next
+batch or after robots.txt was fetched, reuses the open connection. A session is only used by one
+thread at a time.
+"""
+
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import requests
+
+from frontier import get_host
+
+
+# number of requests and newly opened connections of a session
+def session_counts(session : requests.Session) -> Tuple[int, int]:
+    num_requests, num_connections = 0, 0
+    for adapter in session.adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            num_requests += pool.num_requests
+            num_connections += pool.num_connections
+    return num_requests, num_connections
+
+
+class SessionPool:
+
+    def __init__(self, max_hosts : int = 1000, max_sessions_per_host : int = 4, idle_timeout : float = 30):
+        """
+        Args:
+            max_hosts: number of hosts with idle sessions, the least recently used host is closed first
+            max_sessions_per_host: number of idle sessions that are kept per host
+            idle_timeout: sessions that were not used for this many seconds are closed
+        """
+        self.max_hosts = max_hosts
+        self.max_sessions_per_host = max_sessions_per_host
+        self.idle_timeout = idle_timeout
+
+        self.lock = Lock()
+        # host -> list of (session, time of last use), the least recently used host comes first
+        self.idle_sessions : Dict[str, List[Tuple[requests.Session, float]]] = OrderedDict()
+        self.last_cleanup = time.time()
+
+        # counts of the sessions that were already closed
+        self.closed_requests = 0
+        self.closed_connections = 0
+
+    def close_session(self, session : requests.Session):
+        num_requests, num_connections = session_counts(session)
+        self.closed_requests += num_requests
+        self.closed_connections += num_connections
+        session.close()
+
+    # close all sessions that were idle for longer than idle_timeout
+    # this runs at most every idle_timeout / 2 seconds
+    def close_idle_sessions(self, now : float):
+        if now - self.last_cleanup < self.idle_timeout / 2:
+            return
+        self.last_cleanup = now
+
+        for host in list(self.idle_sessions.keys()):
+            sessions = []
+            for session, last_used in self.idle_sessions[host]:
+                if now - last_used > self.idle_timeout:
+                    self.close_session(session)
+                else:
+                    sessions.append((session, last_used))
+            if len(sessions) > 0:
+                self.idle_sessions[host] = sessions
+            else:
+                del self.idle_sessions[host]
+
+    def checkout(self, host : str) -> requests.Session:
+        with self.lock:
+            now = time.time()
+            self.close_idle_sessions(now)
+            sessions = self.idle_sessions.get(host, [])
+            while len(sessions) > 0:
+                session, last_used = sessions.pop()
+                if now - last_used <= self.idle_timeout:
+                    return session
+                self.close_session(session)
+        return requests.Session()
+
+    def checkin(self, host : str, session : requests.Session):
+        with self.lock:
+            sessions = self.idle_sessions.setdefault(host, [])
+            sessions.append((session, time.time()))
+            self.idle_sessions.move_to_end(host)
+
+            if len(sessions) > self.max_sessions_per_host:
+                self.close_session(sessions.pop(0)[0])
+
+            while len(self.idle_sessions) > self.max_hosts:
+                _, sessions = self.idle_sessions.popitem(last=False)
+                for session, _ in sessions:
+                    self.close_session(session)
+
+    # use it like this:
+    # with session_pool.session(url) as session:
+    #     session.get(url)
+    @contextmanager
+    def session(self, url : str):
+        host = get_host(url)
+        session = self.checkout(host)
+        try:
+            yield session
+        finally:
+            self.checkin(host, session)
+
+    def get(self, url : str, **kwargs) -> requests.Response:
+        with self.session(url) as session:
+            return session.get(url, **kwargs)
+
+    def close(self):
+        with self.lock:
+            for sessions in self.idle_sessions.values():
+                for session, _ in sessions:
+                    self.close_session(session)
+            self.idle_sessions.clear()
+
+    # number of requests, opened connections and requests that reused an open connection
+    # sessions that are checked out while this runs are not counted
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            num_requests, num_connections = self.closed_requests, self.closed_connections
+            for sessions in self.idle_sessions.values():
+                for session, _ in sessions:
+                    counts = session_counts(session)
+                    num_requests += counts[0]
+                    num_connections += counts[1]
+        return {"requests": num_requests, "connections": num_connections, "reused": num_requests - num_connections}
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.info(f"http connections: {stats['requests']:,} requests over {stats['connections']:,} connections, "
+            f"{stats['reused']:,} requests reused an open connection")
@@ -0,0 +1,60 @@
+"""
+The result of downloading a url, as it is passed from the download engines to the outputs.
+
+The record keeps the json data of the url, and for the WARC output the raw body and the response
+headers. Each output serialises it once: the json dump with dumps(), the WARC writer from the raw
+bytes. orjson is used for the json dump when it is installed.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# serialise the json data of a record
+def dumps(data : Dict) -> str:
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # e.g. lone surrogates, which json.dumps escapes
+            pass
+    return json.dumps(data)
+
+
+class FetchResult:
+
+    __slots__ = ["url", "data", "content", "http_headers", "status", "retry_after"]
+
+    def __init__(self, url : str, data : Dict, content : Optional[bytes] = None,
+            http_headers : Optional[List[Tuple[str, str]]] = None, retry_after : Optional[float] = None):
+        """
+        Args:
+            url: the downloaded url
+            data: the json record of the url with its status, headers and html
+            content: the raw body, only kept for the WARC output
+            http_headers: the original response headers, only kept for the WARC output
+            retry_after: seconds from the Retry-After header of a response that should be retried
+        """
+        self.url = url
+        self.data = data
+        self.content = content
+        self.http_headers = http_headers
+        self.status : int = data["status"]
+        self.retry_after = retry_after
+
+    @property
+    def contains_body(self) -> bool:
+        return "html" in self.data
+
+    # the page did not change since the previous crawl, see not_modified2json
+    @property
+    def not_modified(self) -> bool:
+        return self.data.get("not_modified", False)
+
+    def to_json(self) -> str:
+        return dumps(self.data)
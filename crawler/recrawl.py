@@ -0,0 +1,120 @@
+"""
+Validators of the downloaded pages for incremental recrawls.
+
+For every downloaded page the store keeps the etag and last-modified headers and a hash of the
+body. A recrawl (--recrawl_from) starts with a copy of the store of the previous crawl and downloads
+its urls again with If-None-Match and If-Modified-Since headers. Pages that respond with 304 Not
+Modified or whose body has the same hash as before are not parsed again, so the cost of a recrawl
+grows with the number of changed pages instead of the size of the corpus.
+"""
+
+import os
+import sqlite3
+import hashlib
+import logging
+from threading import Lock
+from typing import Dict, Iterable, Optional, Tuple
+
+
+# the hash of a response body
+def content_hash(content : bytes) -> str:
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+# the validators are stored in an SQLite database. lookup() and commit() are called by the main
+# thread once per round, the download threads only read the validators of the round and collect
+# their changes in memory.
+class ValidatorStore:
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS validators (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT NOT NULL);
+    """
+
+    def __init__(self, file : str):
+        self.file = file
+        self.connection = None
+
+        # the validators of the urls of the current round, url -> (etag, last_modified, content_hash)
+        self.previous : Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+        self.changes = []
+        self.lock = Lock()
+
+    def get_connection(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.file)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(ValidatorStore.SCHEMA)
+        return self.connection
+
+    # start a recrawl with the validators of a previous crawl
+    def copy_from(self, file : str):
+        if not os.path.exists(file):
+            raise Exception(f"cannot recrawl, {file} does not exist")
+        source = sqlite3.connect(file)
+        try:
+            source.backup(self.get_connection())
+        finally:
+            source.close()
+        logging.info(f"copied the validators of {len(self):,} urls from {file}")
+
+    # load the validators of the urls that are downloaded next
+    def lookup(self, urls : Iterable[str]):
+        connection = self.get_connection()
+        urls = list(urls)
+        self.previous = {}
+        # look up the urls in chunks, sqlite limits the number of parameters per query
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i+500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT url, etag, last_modified, content_hash FROM validators WHERE url IN ({placeholders})", chunk)
+            self.previous.update((row[0], row[1:]) for row in rows)
+
+    # the request headers for a url, with If-None-Match and If-Modified-Since if it was downloaded before
+    def request_headers(self, url : str, headers : Dict[str, str]) -> Dict[str, str]:
+        previous = self.previous.get(url)
+        if previous is None or (previous[0] is None and previous[1] is None):
+            return headers
+        headers = dict(headers)
+        if previous[0] is not None:
+            headers["If-None-Match"] = previous[0]
+        if previous[1] is not None:
+            headers["If-Modified-Since"] = previous[1]
+        return headers
+
+    # remember the validators of a downloaded body, returns True if the body did not change
+    # headers are the original response headers, the etag is case sensitive
+    def update(self, url : str, headers, content : bytes) -> bool:
+        digest = content_hash(content)
+        with self.lock:
+            self.changes.append((url, headers.get("etag"), headers.get("last-modified"), digest))
+        previous = self.previous.get(url)
+        return previous is not None and previous[2] == digest
+
+    # write the changes of the round
+    def commit(self):
+        connection = self.get_connection()
+        with self.lock:
+            changes, self.changes = self.changes, []
+        connection.executemany(
+            "INSERT OR REPLACE INTO validators (url, etag, last_modified, content_hash) VALUES (?, ?, ?, ?)", changes)
+        connection.commit()
+        self.previous = {}
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def __len__(self):
+        return self.get_connection().execute("SELECT COUNT(*) FROM validators").fetchone()[0]
+
+    def __iter__(self):
+        for row in self.get_connection().execute("SELECT url FROM validators ORDER BY rowid"):
+            yield row[0]
@@ -0,0 +1,136 @@
+"""
+Delay queue for urls whose download failed temporarily.
+
+Responses with 429 Too Many Requests, 502, 503 and 504 and network errors are usually transient.
+Such urls are scheduled for another attempt after the time in the Retry-After header of the response,
+or otherwise after an exponential backoff with jitter. Due retries are downloaded together with the
+urls of the frontier in the next rounds. A url is given up after max_attempts failed downloads.
+"""
+
+import os
+import json
+import time
+import random
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Set
+
+from frontier import get_host
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+
+# True if a download with this http status code should be tried again, -1 is a network error
+def is_retryable(status : int) -> bool:
+    return status == -1 or status in RETRY_STATUS_CODES
+
+
+# the seconds to wait from a Retry-After header, which contains seconds or an http date
+def parse_retry_after(value : Optional[str]) -> Optional[float]:
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+# the queue is small compared to the frontier, so it is kept in memory and persisted to a json file
+# once per round, like the statistics of the scheduler
+class RetryQueue:
+
+    def __init__(self, file : str, max_attempts : int = 3, base_delay : float = 60, max_delay : float = 3600):
+        """
+        Args:
+            file: json file to persist the queue
+            max_attempts: number of downloads of a url before it is given up
+            base_delay: seconds before the first retry of a url without a Retry-After header
+            max_delay: the backoff without a Retry-After header is at most this many seconds
+        """
+        self.file = file
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        # url -> {"attempts": failed downloads, "next_time": time of the next attempt}
+        self.urls : Dict[str, Dict] = {}
+
+    def read(self):
+        if os.path.exists(self.file):
+            with open(self.file, "r") as f:
+                self.urls = json.load(f)
+
+    def write2file(self):
+        tmp_file = self.file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.urls, f)
+        os.replace(tmp_file, self.file)
+
+    # call this when the download of a url failed, it returns False if the url is given up
+    def schedule(self, url : str, retry_after : Optional[float] = None) -> bool:
+        state = self.urls.setdefault(url, {"attempts": 0, "next_time": 0.0})
+        state["attempts"] += 1
+        if state["attempts"] >= self.max_attempts:
+            logging.debug(f"give up {url} after {state['attempts']} attempts")
+            del self.urls[url]
+            return False
+
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            # equal jitter, so that the retries of many urls that failed together are spread out
+            delay = min(self.max_delay, self.base_delay * 2 ** (state["attempts"] - 1))
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        state["next_time"] = time.time() + delay
+        logging.debug(f"retry {url} in {delay:.0f} seconds")
+        return True
+
+    # try a url again after a time without counting an attempt, e.g. when its host is suspended
+    def postpone(self, url : str, next_time : float):
+        if url in self.urls:
+            self.urls[url]["next_time"] = max(self.urls[url]["next_time"], next_time)
+
+    # call this when the download of a url succeeded or the url should not be downloaded anymore
+    def remove(self, url : str):
+        self.urls.pop(url, None)
+
+    def remove_host(self, host : str) -> int:
+        return self.remove_hosts({host})
+
+    # remove the urls of several hosts in one pass over the queue
+    def remove_hosts(self, hosts : Set[str]) -> int:
+        if len(hosts) == 0:
+            return 0
+        urls = [url for url in self.urls.keys() if get_host(url) in hosts]
+        for url in urls:
+            del self.urls[url]
+        return len(urls)
+
+    # up to n urls that may be downloaded again now, the longest waiting first
+    def due(self, n : int, is_suspended : Optional[Callable[[str], bool]] = None) -> List[str]:
+        now = time.time()
+        urls = [(state["next_time"], url) for url, state in self.urls.items() if state["next_time"] <= now]
+        urls.sort()
+        urls = [url for _, url in urls]
+        if is_suspended is not None:
+            urls = [url for url in urls if not is_suspended(get_host(url))]
+        return urls[0:n]
+
+    # the time when the next url may be downloaded again, None if the queue is empty
+    def next_due_time(self) -> Optional[float]:
+        if len(self.urls) == 0:
+            return None
+        return min(state["next_time"] for state in self.urls.values())
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, url : str):
+        return url in self.urls
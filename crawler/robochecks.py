@@ -7,59 +7,125 @@ import requests
 import json
 import os
 import pickle
+import sqlite3
+import time
 import argparse
-from urllib.parse import urlparse
-import urllib.robotparser
+from urllib.parse import urlparse, urlsplit
 import logging
-from typing import Dict, Optional, Tuple, Any, cast
+from typing import Dict, List, Optional, Tuple, Any, cast
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from threading import Lock
 from bs4 import BeautifulSoup
-from tqdm.contrib.concurrent import process_map
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from http_session import SessionPool
+from robots_rules import RobotsRules, split_url_path
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# the robots.txt files are stored in an SQLite database. New and changed files are kept in memory and
+# written in one transaction when flush_size files changed or flush_interval seconds passed, and at
+# the end of every round. A crash loses at most these files, which are downloaded again. Files are
+# read from the database when a host is checked for the first time.
+#
+# A shared cache file is used by several crawler processes at the same time. Before a process
+# downloads a robots.txt, it claims the download in the cache file, and the other processes wait
+# for its result instead of downloading the file again.
 class RobotsCache:
-    def __init__(self, cache_file: str = "robots_cache.pkl", cache_duration: int = 86400):
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS robots (
+            domain TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            expires REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS robots_claims (
+            domain TEXT PRIMARY KEY,
+            until REAL NOT NULL);
+    """
+
+    def __init__(self, cache_file: str = "robots_cache.sqlite", cache_duration: int = 86400,
+            flush_size: int = 1000, flush_interval: float = 60, shared: bool = False):
         """Initialize robots.txt cache
         
         Args:
             cache_file: Path to cache file
             cache_duration: Cache validity in seconds (default 24 hours)
+            flush_size: Number of changed files that are written to the cache file at once
+            flush_interval: Seconds after which changed files are written to the cache file
+            shared: True if other crawler processes use the same cache file
         """
         self.cache_file = cache_file
         self.cache_duration = timedelta(seconds=cache_duration)
-        self.cache: Dict[str, Tuple[str, datetime]] = self._load_cache()
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.shared = shared
+        # domain -> (content, time when it expires), the files that were read or changed
+        self.cache: Dict[str, Tuple[str, float]] = {}
+        # domains that are not in the cache file
+        self.absent = set()
+        # changes that are not written to the cache file yet
+        self.pending: Dict[str, Tuple[str, float]] = {}
+        self.last_flush = time.time()
         self.lock = Lock()
-        
-    def _load_cache(self) -> Dict[str, Tuple[str, datetime]]:
-        """Load cache from disk"""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'rb') as f:
-                    return cast(Dict[str, Tuple[str, datetime]], pickle.load(f))
-            except Exception as e:
-                logger.error(f"Error loading cache: {e}")
-        return {}
-    
-    def _save_cache(self):
-        """Save cache to disk"""
+
+        # the cache file is opened when it is used for the first time
+        self.connection = None
+        self.db_lock = Lock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Open the cache file, the db_lock must be held"""
+        if self.connection is None:
+            # wait for the other processes that write to a shared cache file
+            self.connection = sqlite3.connect(self.cache_file, timeout=60, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("PRAGMA mmap_size=268435456")
+            self.connection.executescript(RobotsCache.SCHEMA)
+            self.connection.execute("DELETE FROM robots WHERE expires < ?", (time.time(),))
+            self.connection.commit()
+            self._import_pickle(os.path.splitext(self.cache_file)[0] + ".pkl")
+        return self.connection
+
+    def _import_pickle(self, pickle_file: str):
+        """Import the cache of crawls that were started before the cache was stored in SQLite, the db_lock must be held"""
+        if not os.path.exists(pickle_file):
+            return
         try:
-            with open(self.cache_file, 'wb') as f:
-                pickle.dump(self.cache, f)
+            with open(pickle_file, 'rb') as f:
+                entries = cast(Dict[str, Tuple[str, datetime]], pickle.load(f))
         except Exception as e:
-            logger.error(f"Error saving cache: {e}")
+            logger.error(f"Error loading cache: {e}")
+            return
+        rows = [(domain, content, (timestamp + self.cache_duration).timestamp())
+            for domain, (content, timestamp) in entries.items()]
+        self.connection.executemany("INSERT OR IGNORE INTO robots (domain, content, expires) VALUES (?, ?, ?)", rows)
+        self.connection.commit()
+        os.rename(pickle_file, pickle_file + ".imported")
+        logger.info(f"imported {len(rows):,} robots.txt files from {pickle_file}")
+
+    def _load_entry(self, domain: str) -> Optional[Tuple[str, float]]:
+        """Look up a domain in memory and otherwise in the cache file, the lock must be held"""
+        entry = self.cache.get(domain)
+        if entry is None and domain not in self.absent:
+            with self.db_lock:
+                row = self._get_connection().execute("SELECT content, expires FROM robots WHERE domain = ?", (domain,)).fetchone()
+            if row is None:
+                # other processes add files to a shared cache file
+                if not self.shared:
+                    self.absent.add(domain)
+            else:
+                entry = (row[0], row[1])
+                self.cache[domain] = entry
+        return entry
     
     def get_robots_txt(self, url: str) -> Optional[str]:
         """Get robots.txt content from cache if valid"""
         with self.lock:
-            domain = self.get_cache_key(url)
-            if domain in self.cache:
-                content, timestamp = self.cache[domain]
-                if datetime.now() - timestamp < self.cache_duration:
-                    return content
+            entry = self._load_entry(self.get_cache_key(url))
+            if entry is not None and time.time() < entry[1]:
+                return entry[0]
             return None
 
     def get_cache_key(self, url: str) -> str:
@@ -68,28 +134,132 @@ class RobotsCache:
 
     def in_cache(self, url: str) -> bool:
         with self.lock:
-            return self.get_cache_key(url) in self.cache
+            return self._load_entry(self.get_cache_key(url)) is not None
     
-    def set_robots_txt(self, url: str, content: str):
+    def set_robots_txt(self, url: str, content: str, ttl: Optional[float] = None):
+        """Store robots.txt content in cache, it expires after ttl seconds or the cache duration"""
+        if ttl is None:
+            ttl = self.cache_duration.total_seconds()
+        domain = self.get_cache_key(url)
         with self.lock:
-            """Store robots.txt content in cache"""
-            self.cache[self.get_cache_key(url)] = (content, datetime.now())
-            self._save_cache()
+            entry = (content, time.time() + ttl)
+            self.cache[domain] = entry
+            self.absent.discard(domain)
+            self.pending[domain] = entry
+            flush = len(self.pending) >= self.flush_size or time.time() - self.last_flush >= self.flush_interval
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write the changed files to the cache file in one transaction"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_flush = time.time()
+        if len(pending) == 0:
+            return
+        rows = [(domain, content, expires) for domain, (content, expires) in pending.items()]
+        with self.db_lock:
+            connection = self._get_connection()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO robots (domain, content, expires) VALUES (?, ?, ?)", rows)
+
+    def claim(self, domain: str, seconds: float) -> Optional[str]:
+        """Claim the download of the robots.txt of a domain for some seconds in a shared cache file.
+        If another process downloads it, wait for its result and return it. None means that the caller
+        has to download the file and call release()."""
+        while True:
+            with self.db_lock:
+                connection = self._get_connection()
+                # the write lock of the cache file is held until the claim is stored
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    now = time.time()
+                    row = connection.execute("SELECT content, expires FROM robots WHERE domain = ?", (domain,)).fetchone()
+                    if row is not None and row[1] > now:
+                        claimed = True
+                    else:
+                        row = None
+                        until = connection.execute("SELECT until FROM robots_claims WHERE domain = ?", (domain,)).fetchone()
+                        claimed = until is not None and until[0] > now
+                        if not claimed:
+                            connection.execute("INSERT OR REPLACE INTO robots_claims (domain, until) VALUES (?, ?)",
+                                (domain, now + seconds))
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+
+            if row is not None:
+                with self.lock:
+                    self.cache[domain] = (row[0], row[1])
+                    self.absent.discard(domain)
+                return row[0]
+            if not claimed:
+                return None
+            # another process downloads the file
+            time.sleep(0.1)
+
+    def release(self, domain: str):
+        """Write the downloaded robots.txt of a claimed domain and end the claim"""
+        with self.lock:
+            entry = self.pending.pop(domain, None)
+        with self.db_lock:
+            connection = self._get_connection()
+            with connection:
+                if entry is not None:
+                    connection.execute("INSERT OR REPLACE INTO robots (domain, content, expires) VALUES (?, ?, ?)",
+                        (domain, entry[0], entry[1]))
+                connection.execute("DELETE FROM robots_claims WHERE domain = ?", (domain,))
+
+    def close(self):
+        self.flush()
+        with self.db_lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def __len__(self):
+        self.flush()
+        with self.db_lock:
+            return self._get_connection().execute("SELECT COUNT(*) FROM robots").fetchone()[0]
 
 class RobotsChecker:
 
     RobotsTxtDoesNotExist = 'non_existing'
 
-    def __init__(self, cache_file: str = "robots_cache.pkl", enabled: bool = True):
+    def __init__(self, cache_file: str = "robots_cache.sqlite", enabled: bool = True, session_pool: Optional[SessionPool] = None,
+            max_policies: int = 10000, shared: bool = False):
+        """
+        Args:
+            cache_file: Path to the cache of the robots.txt files
+            enabled: Disable to allow all urls
+            session_pool: Sessions to download the robots.txt files, a new connection per file if None
+            max_policies: Number of parsed robots.txt files to keep, the least recently used is dropped first
+            shared: True if other crawler processes use the same cache file
+        """
         self.enabled = enabled
-        self.cache = RobotsCache(cache_file) if enabled else None
+        self.session_pool = session_pool
+        self.cache = RobotsCache(cache_file, shared=shared) if enabled else None
+        self.max_policies = max_policies
+        # domain -> compiled robots.txt, it is compiled again when the cached robots.txt changes
+        self.policies: Dict[str, RobotsRules] = OrderedDict()
+        self.policies_lock = Lock()
+        # domain -> download of its robots.txt that is in progress
+        self.pending: Dict[str, Future] = {}
+        self.pending_lock = Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
 
     @staticmethod
-    def fetch_robots_txt(robots_url: str) -> Optional[str]:
+    def fetch_robots_txt(robots_url: str, session_pool: Optional[SessionPool] = None) -> Optional[str]:
         """Fetch and validate robots.txt content"""
         try:
             logging.debug(f'fetch robots.txt from {robots_url}')
-            resp = requests.get(robots_url, timeout=10)
+            if session_pool is None:
+                resp = requests.get(robots_url, timeout=10)
+            else:
+                # the connection stays open for the pages of the same host
+                resp = session_pool.get(robots_url, timeout=10)
             if resp.status_code == 200:
                 content_type = resp.headers.get('content-type', '').lower()
                 # Strict validation: Must be text/plain.
@@ -110,34 +280,105 @@ class RobotsChecker:
         if not self.enabled:
             return None
         
-        content = self.cache.get_robots_txt(url) if self.cache else None
+        content = self.cache.get_robots_txt(url) if self.cache is not None else None
         if content is None:
-            robots_url = f"{self.get_domain(url)}/robots.txt"
-            content = RobotsChecker.fetch_robots_txt(robots_url)
+            domain = self.get_domain(url)
+            future, owner = self.start_fetch(domain)
+            if owner:
+                self.fetch(domain, future)
+            content = future.result()
+        return content
 
+    # the future of the download of the robots.txt of a domain, and True if the caller has to download it
+    # only one thread downloads the robots.txt of a domain, the other threads wait for its result
+    def start_fetch(self, domain: str) -> Tuple[Future, bool]:
+        with self.pending_lock:
+            future = self.pending.get(domain)
+            if future is not None:
+                return future, False
+            future = Future()
+            self.pending[domain] = future
+            return future, True
+
+    # download the robots.txt of a domain and store it in the cache
+    # with a shared cache, the file may have been downloaded by another crawler process
+    def fetch(self, domain: str, future: Future):
+        try:
+            content = None
+            if self.cache.shared:
+                # longer than the timeout of fetch_robots_txt
+                content = self.cache.claim(domain, 30)
             if content is None:
-                content = RobotsChecker.RobotsTxtDoesNotExist
-            if self.cache:
-                self.cache.set_robots_txt(url, content)
-        return content
+                try:
+                    content = RobotsChecker.fetch_robots_txt(f"{domain}/robots.txt", self.session_pool)
+                    if content is None:
+                        content = RobotsChecker.RobotsTxtDoesNotExist
+                    self.cache.set_robots_txt(domain, content)
+                finally:
+                    if self.cache.shared:
+                        self.cache.release(domain)
+            future.set_result(content)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.pending_lock:
+                del self.pending[domain]
 
-    def get_crawl_sleep_delay(self, url: str, user_agent : str = '*') -> int:
-        """Get Crawl-delay from robots.txt for the given URL"""
-        robots_txt = self.get_and_cache_robots_txt(url)
+    # start downloading the robots.txt files of the domains of the urls that are not in the cache
+    # in the background, each domain once. It returns the futures of the downloads.
+    def prefetch(self, urls: list, max_workers: int = 5) -> List[Future]:
+        if not self.enabled:
+            return []
+        domains = set()
+        for url in urls:
+            parsed = urlsplit(url)
+            domains.add(f"{parsed.scheme}://{parsed.netloc}")
+
+        futures = []
+        started = 0
+        for domain in domains:
+            if self.cache.get_robots_txt(domain) is not None:
+                continue
+            future, owner = self.start_fetch(domain)
+            if owner:
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(max_workers=max_workers)
+                self.executor.submit(self.fetch, domain, future)
+                started += 1
+            futures.append(future)
+        if started > 0:
+            logging.info(f"Fetching {started:,} robots.txt files of {len(domains):,} hosts with {max_workers} threads")
+        return futures
 
+    # the compiled robots.txt of the domain of a url, None if the domain has no robots.txt
+    # the robots.txt is only compiled again when it was fetched again, e.g. after the cache expired
+    def get_policy(self, url: str) -> Optional[RobotsRules]:
+        domain = self.get_domain(url)
+        robots_txt = self.get_and_cache_robots_txt(domain)
         if robots_txt is None or robots_txt == RobotsChecker.RobotsTxtDoesNotExist:
             return None
-        
-        try:
-            rp = urllib.robotparser.RobotFileParser()
-            rp.set_url(url)
-            rp.parse(robots_txt.splitlines())
-            crawl_delay = rp.crawl_delay(user_agent)
 
-            if crawl_delay is None:
+        with self.policies_lock:
+            policy = self.policies.get(domain)
+            if policy is not None and policy.robots_txt == robots_txt:
+                self.policies.move_to_end(domain)
+                return policy
+
+        policy = RobotsRules(robots_txt)
+        with self.policies_lock:
+            self.policies[domain] = policy
+            self.policies.move_to_end(domain)
+            while len(self.policies) > self.max_policies:
+                self.policies.popitem(last=False)
+        return policy
+
+    def get_crawl_sleep_delay(self, url: str, user_agent : str = '*') -> int:
+        """Get Crawl-delay from robots.txt for the given URL"""
+        try:
+            policy = self.get_policy(url)
+            if policy is None:
                 return None
-            else:
-                return int(crawl_delay)
+            return policy.crawl_delay(user_agent)
         except Exception as e:
             logger.error(f"Error parsing robots.txt for crawl delay: {str(e)}")
             return None
@@ -147,32 +388,55 @@ class RobotsChecker:
     # if robots.txts is not in cache, fetch them in parallel
     # return 2 lists of urls we can fetch and we cannot fetch
     def can_fetch_multiple_urls(self, urls: list, user_agent: str = "Crawlzilla/1.0", max_workers: int = 5):
-        # robots_urls = [self.get_domain(url) + '/robots.txt' for url in urls]
-        # robots_urls = list(set(robots_urls))
-        # robots_urls = list(filter(lambda x: not self.cache.in_cache(self.get_domain(x)), robots_urls))
-        
-        download_urls = list(filter(lambda x: not self.cache.in_cache(x), urls))
-
-        logging.info(f"Fetching {len(download_urls)} robots.txt files in parallel with {max_workers} workers")
-        if len(download_urls) > 0:
-            results = process_map(RobotsChecker.fetch_robots_txt, download_urls, max_workers=max_workers, chunksize=1)
-            assert len(download_urls) == len(results)
+        if not self.enabled:
+            return list(urls), []
 
-            for url, content in zip(download_urls, results):
-                self.cache.set_robots_txt(url, content)
+        # the downloads that prefetch() started already are not started again
+        futures = self.prefetch(urls, max_workers)
+        if len(futures) > 0:
+            start_time = time.time()
+            wait(futures)
+            logging.info(f"waited {time.time() - start_time:.1f} seconds for {len(futures):,} robots.txt files")
 
-        can_fetch_urls = []
-        cannot_fetch_urls = []
-        
+        # check the paths of the urls of each host in one call
+        domain2urls: Dict[str, list] = {}
+        domain2paths: Dict[str, list] = {}
         for url in urls:
-            result = self.check_robots(url, user_agent)
-            if result.get("can_fetch", False):
-                can_fetch_urls.append(url)
-            else:
-                cannot_fetch_urls.append(url)
+            parsed = urlsplit(url)
+            domain = f"{parsed.scheme}://{parsed.netloc}"
+            domain2urls.setdefault(domain, []).append(url)
+            domain2paths.setdefault(domain, []).append(split_url_path(parsed))
+
+        allowed = set()
+        for domain, domain_urls in domain2urls.items():
+            try:
+                policy = self.get_policy(domain)
+                if policy is None:
+                    allowed.update(domain_urls)
+                    continue
+                results = policy.can_fetch_paths(domain2paths[domain], user_agent)
+                allowed.update(url for url, can_fetch in zip(domain_urls, results) if can_fetch)
+            except Exception as e:
+                # fail-open like check_robots
+                logger.error(f"Error checking robots.txt of {domain}: {str(e)}")
+                allowed.update(domain_urls)
 
+        can_fetch_urls = [url for url in urls if url in allowed]
+        cannot_fetch_urls = [url for url in urls if url not in allowed]
         return can_fetch_urls, cannot_fetch_urls
 
+    # write the robots.txt files that were downloaded since the last call to the cache file
+    def flush(self):
+        if self.cache is not None:
+            self.cache.flush()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.cache is not None:
+            self.cache.close()
+
     def get_domain(self, url: str) -> str:
         parsed = urlparse(url)
         return f"{parsed.scheme}://{parsed.netloc}"
@@ -204,24 +468,18 @@ class RobotsChecker:
             domain = self.get_domain(url)
             robots_url = f"{domain}/robots.txt"
             
-            robots_txt = self.get_and_cache_robots_txt(domain)
-
             result: Dict[str, Any] = {
                 "can_fetch": True, # Default to True (fail-open)
                 "error": None,
             }
 
-            if robots_txt is None or robots_txt == RobotsChecker.RobotsTxtDoesNotExist:
-                result["error"] = f"No valid robots.txt found at {robots_url}. Assuming allowed."
-                return result
-
             try:
-                rp = urllib.robotparser.RobotFileParser()
-                rp.set_url(robots_url)
-                rp.parse(robots_txt.splitlines())
-                
-                can_fetch = rp.can_fetch(user_agent, url)
-                result["can_fetch"] = can_fetch
+                policy = self.get_policy(domain)
+                if policy is None:
+                    result["error"] = f"No valid robots.txt found at {robots_url}. Assuming allowed."
+                    return result
+
+                result["can_fetch"] = policy.can_fetch(url, user_agent)
             except Exception as e:
                 result["error"] = f"Error parsing robots.txt: {str(e)}"
                 logger.error(result["error"])
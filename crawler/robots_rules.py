@@ -0,0 +1,188 @@
+"""
+Compiler for the rules of robots.txt files.
+
+urllib.robotparser compares the path of a url with the rules of a robots.txt one after another, and
+it does not understand the wildcards * and $ that many sites use. RobotsRules parses a robots.txt
+once and compiles the rules for each user agent into a matcher that checks a whole list of paths of
+the host in one call: rules without wildcards are looked up by the prefixes of the path in a dict,
+rules with wildcards are combined into one regular expression.
+
+The rules are applied like RFC 9309 describes it: the groups of all user-agent lines that name the
+crawler are merged, otherwise the groups for * apply. The longest rule that matches the path decides,
+and allow wins over disallow if both are equally long. Like urllib.robotparser, a group names the
+crawler if its user agent is part of the name of the crawler's user agent.
+"""
+
+import re
+from urllib.parse import quote, unquote, urlsplit, SplitResult
+from typing import Dict, List, Optional, Tuple
+
+# characters that are not percent-encoded in paths and rules, the wildcards * and $ are among them
+SAFE_CHARACTERS = "/:@!$&'()*+,;=?~"
+# paths without other characters and without percent-encoded characters are already normalized
+NEEDS_NORMALIZATION = re.compile(r"[^A-Za-z0-9_.\-/:@!$&'()*+,;=?~]")
+
+
+# percent-encode a path or a rule the same way, so that they can be compared
+def normalize_path(path : str) -> str:
+    if NEEDS_NORMALIZATION.search(path) is None:
+        return path
+    return quote(unquote(path), safe=SAFE_CHARACTERS)
+
+
+# the part of a url that is matched against the rules: the path and the query, without the fragment
+def url_path(url : str) -> str:
+    return split_url_path(urlsplit(url))
+
+
+def split_url_path(parsed : SplitResult) -> str:
+    path = parsed.path
+    if parsed.query:
+        path += "?" + parsed.query
+    return normalize_path(path) or "/"
+
+
+# the allow and disallow rules of the groups that apply to one user agent
+class RuleMatcher:
+
+    def __init__(self, rules : List[Tuple[str, bool]]):
+        """
+        Args:
+            rules: the normalized rules as (pattern, allow)
+        """
+        # rules without wildcards, prefix -> allow
+        self.prefixes : Dict[str, bool] = {}
+        # rules with wildcards as (length, allow) in the order of the groups of the regular expression
+        self.wildcard_rules : List[Tuple[int, bool]] = []
+        self.regex = None
+
+        wildcard_patterns = []
+        for pattern, allow in rules:
+            if "*" in pattern.rstrip("*") or pattern.endswith("$"):
+                wildcard_patterns.append((len(pattern), allow, pattern))
+            else:
+                # a trailing * does not change which paths a rule matches
+                prefix = pattern.rstrip("*")
+                self.prefixes[prefix] = self.prefixes.get(prefix, False) or allow
+        # the lengths of the prefixes, the longest first
+        self.lengths = sorted(set(len(prefix) for prefix in self.prefixes), reverse=True)
+
+        if len(wildcard_patterns) > 0:
+            # the alternatives are tried from left to right, so the first one that matches is the
+            # longest matching rule, and allow comes before disallow
+            wildcard_patterns.sort(key=lambda rule: (-rule[0], not rule[1]))
+            alternatives = []
+            for length, allow, pattern in wildcard_patterns:
+                self.wildcard_rules.append((length, allow))
+                alternatives.append("(" + RuleMatcher.pattern2regex(pattern) + ")")
+            self.regex = re.compile("|".join(alternatives), re.DOTALL)
+
+    @staticmethod
+    def pattern2regex(pattern : str) -> str:
+        anchored = pattern.endswith("$")
+        if anchored:
+            pattern = pattern[:-1]
+        regex = ".*".join(re.escape(part) for part in pattern.split("*"))
+        return regex + "\\Z" if anchored else regex
+
+    # True if the crawler may download the normalized path
+    def allowed(self, path : str) -> bool:
+        length, allow = -1, True
+        prefixes = self.prefixes
+        for prefix_length in self.lengths:
+            if prefix_length <= len(path):
+                prefix_allow = prefixes.get(path[:prefix_length])
+                if prefix_allow is not None:
+                    length, allow = prefix_length, prefix_allow
+                    break
+
+        if self.regex is not None:
+            match = self.regex.match(path)
+            if match is not None:
+                wildcard_length, wildcard_allow = self.wildcard_rules[match.lastindex - 1]
+                if wildcard_length > length or (wildcard_length == length and wildcard_allow):
+                    allow = wildcard_allow
+        return allow
+
+
+# a group of a robots.txt: the user agents that it names, their rules and their crawl delay
+class RobotsGroup:
+    def __init__(self):
+        self.user_agents : List[str] = []
+        self.rules : List[Tuple[str, bool]] = []
+        self.delay : Optional[float] = None
+
+
+class RobotsRules:
+
+    def __init__(self, robots_txt : str):
+        """
+        Args:
+            robots_txt: the content of the robots.txt file
+        """
+        self.robots_txt = robots_txt
+        self.groups : List[RobotsGroup] = RobotsRules.parse(robots_txt)
+        # user agent -> compiled rules and crawl delay
+        self.matchers : Dict[str, Tuple[RuleMatcher, Optional[float]]] = {}
+
+    @staticmethod
+    def parse(robots_txt : str) -> List[RobotsGroup]:
+        groups = []
+        group = None
+        for line in robots_txt.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            key = key.strip().lower()
+            value = value.strip()
+
+            if key == "user-agent":
+                # consecutive user-agent lines share their rules
+                if group is None or len(group.rules) > 0 or group.delay is not None:
+                    group = RobotsGroup()
+                    groups.append(group)
+                group.user_agents.append(value.split("/")[0].strip().lower())
+            elif group is None:
+                # rules before the first user-agent line do not apply to anyone
+                continue
+            elif key in ["allow", "disallow"]:
+                # an empty rule allows everything
+                if value:
+                    group.rules.append((normalize_path(value), key == "allow"))
+            elif key == "crawl-delay":
+                try:
+                    group.delay = float(value)
+                except ValueError:
+                    pass
+        return groups
+
+    # the compiled rules and the crawl delay that apply to a user agent
+    def get_matcher(self, user_agent : str) -> Tuple[RuleMatcher, Optional[float]]:
+        matcher = self.matchers.get(user_agent)
+        if matcher is None:
+            name = user_agent.split("/")[0].lower()
+            groups = [group for group in self.groups
+                if any(agent not in ["", "*"] and agent in name for agent in group.user_agents)]
+            if len(groups) == 0:
+                groups = [group for group in self.groups if "*" in group.user_agents]
+
+            rules = [rule for group in groups for rule in group.rules]
+            delays = [group.delay for group in groups if group.delay is not None]
+            matcher = (RuleMatcher(rules), delays[0] if len(delays) > 0 else None)
+            self.matchers[user_agent] = matcher
+        return matcher
+
+    # check the paths of a host in one call, the paths are the output of url_path()
+    def can_fetch_paths(self, paths : List[str], user_agent : str) -> List[bool]:
+        matcher = self.get_matcher(user_agent)[0]
+        if len(matcher.lengths) == 0 and matcher.regex is None:
+            return [True] * len(paths)
+        return [matcher.allowed(path) for path in paths]
+
+    def can_fetch(self, url : str, user_agent : str) -> bool:
+        return self.can_fetch_paths([url_path(url)], user_agent)[0]
+
+    def crawl_delay(self, user_agent : str) -> Optional[int]:
+        delay = self.get_matcher(user_agent)[1]
+        return None if delay is None else int(delay)
@@ -0,0 +1,531 @@
+"""
+Politeness scheduler that decides which urls of the frontier are downloaded in the next round.
+"""
+
+import os
+import json
+import heapq
+import sqlite3
+import time
+import logging
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from frontier import get_host
+
+
+# keeps the hosts of the frontier between batches in two heaps: the hosts that may be fetched now,
+# ordered by their priority, and the hosts that wait for their crawl delay, ordered by the time when
+# they may be fetched next. get_batch pops the ready host with the highest priority, takes its next
+# url and pushes the host to the waiting heap with the time of the following fetch, which is the
+# crawl delay of the host later. when no host is ready, the batch continues with the hosts that are
+# ready first. hosts with the same ready time are visited round robin, so a batch contains one url of
+# every host before it contains the second url of any host.
+#
+# the heaps are built from the hosts of the frontier once and then updated as hosts get urls, see
+# add_hosts, are fetched, suspended or run out of urls, so a batch costs time proportional to its
+# size and not to the number of hosts.
+class HostScheduler:
+
+    def __init__(self, crawl_delay : float = 1, get_crawl_delay : Optional[Callable[[str], Optional[float]]] = None,
+            get_priority : Optional[Callable[[str], Optional[float]]] = None,
+            is_suspended : Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            crawl_delay: default waiting time between two requests to the same host in seconds
+            get_crawl_delay: optional function that returns the crawl delay for a url, e.g. from robots.txt
+            get_priority: optional function that returns the priority of a host, None means do not fetch the host
+            is_suspended: optional function that returns True if a host should not be fetched now
+        """
+        self.crawl_delay = crawl_delay
+        self.get_crawl_delay = get_crawl_delay
+        self.get_priority = get_priority
+        self.is_suspended = is_suspended
+
+        # the frontier that the heaps were built from, None until the first batch
+        self.frontier = None
+        # hosts that may be fetched now as (-priority, counter, host, ready time)
+        self.ready : List[Tuple[float, int, str, float]] = []
+        # hosts that wait for their crawl delay as (the earliest time of the next fetch, counter, host)
+        self.waiting : List[Tuple[float, int, str]] = []
+        # suspended hosts, they are checked again in every batch
+        self.suspended : Set[str] = set()
+        # all hosts in one of the above
+        self.hosts : Set[str] = set()
+        self.counter = 0
+
+    def host_delay(self, url : str) -> float:
+        delay = None
+        if self.get_crawl_delay is not None:
+            delay = self.get_crawl_delay(url)
+        return self.crawl_delay if delay is None else delay
+
+    def host_priority(self, host : str) -> Optional[float]:
+        return 0.0 if self.get_priority is None else self.get_priority(host)
+
+    # build the heaps from the hosts of a frontier, None forgets all hosts, e.g. after the frontier was read again
+    def reset(self, frontier = None):
+        self.frontier = frontier
+        self.ready = []
+        self.waiting = []
+        self.suspended = set()
+        self.hosts = set()
+        if frontier is None:
+            return
+
+        now = time.time()
+        for host in frontier.get_hosts():
+            priority = self.host_priority(host)
+            if priority is not None:
+                self.counter += 1
+                self.ready.append((-priority, self.counter, host, now))
+                self.hosts.add(host)
+        heapq.heapify(self.ready)
+
+    def push_ready(self, host : str, ready_time : float):
+        priority = self.host_priority(host)
+        if priority is None:
+            self.hosts.discard(host)
+            return
+        self.counter += 1
+        heapq.heappush(self.ready, (-priority, self.counter, host, ready_time))
+
+    # call this with the hosts of urls that were added to the frontier, hosts that are known already are skipped
+    def add_hosts(self, hosts : Iterable[str]):
+        if self.frontier is None:
+            return
+        now = time.time()
+        for host in hosts:
+            if host not in self.hosts:
+                self.hosts.add(host)
+                self.push_ready(host, now)
+
+    # move the waiting hosts that may be fetched at the given time to the ready hosts
+    def release_waiting(self, clock : float):
+        while len(self.waiting) > 0 and self.waiting[0][0] <= clock:
+            ready_time, _, host = heapq.heappop(self.waiting)
+            self.push_ready(host, ready_time)
+
+    # return up to batch_size urls from the given frontier backend
+    def get_batch(self, frontier, batch_size : int, chunk_size : int = 16) -> List[str]:
+        if frontier is not self.frontier:
+            self.reset(frontier)
+
+        now = time.time()
+        for host in list(self.suspended):
+            if self.is_suspended is None or not self.is_suspended(host):
+                self.suspended.discard(host)
+                self.push_ready(host, now)
+        clock = now
+        self.release_waiting(clock)
+
+        # urls are fetched from the frontier in small chunks per host
+        queues : Dict[str, List[str]] = {}
+        offsets : Dict[str, int] = {}
+        delays : Dict[str, float] = {}
+        # hosts whose urls are all in the batch and their ready time, they wait again after the batch
+        exhausted : Dict[str, float] = {}
+
+        batch = []
+        while len(batch) < batch_size:
+            if len(self.ready) == 0:
+                if len(self.waiting) == 0:
+                    break
+                # all hosts wait, the batch continues with the hosts that may be fetched first
+                clock = self.waiting[0][0]
+                self.release_waiting(clock)
+                continue
+
+            neg_priority, _, host, ready_time = heapq.heappop(self.ready)
+            if self.is_suspended is not None and self.is_suspended(host):
+                self.suspended.add(host)
+                continue
+            # the priority may have changed since the host was pushed, e.g. after its pages were parsed
+            if self.get_priority is not None:
+                priority = self.get_priority(host)
+                if priority is None:
+                    self.hosts.discard(host)
+                    continue
+                if -priority != neg_priority:
+                    self.counter += 1
+                    heapq.heappush(self.ready, (-priority, self.counter, host, ready_time))
+                    continue
+
+            if len(queues.get(host, [])) == 0:
+                offset = offsets.get(host, 0)
+                queues[host] = frontier.host_urls(host, offset, chunk_size)
+                offsets[host] = offset + len(queues[host])
+                if len(queues[host]) == 0:
+                    if offset == 0:
+                        # the host has no urls left, add_hosts brings it back when it gets new ones
+                        self.hosts.discard(host)
+                    else:
+                        exhausted[host] = ready_time
+                    continue
+
+            url = queues[host].pop(0)
+            batch.append(url)
+
+            if host not in delays:
+                delays[host] = self.host_delay(url)
+            self.counter += 1
+            heapq.heappush(self.waiting, (max(now, ready_time) + delays[host], self.counter, host))
+
+        for host, ready_time in exhausted.items():
+            self.counter += 1
+            heapq.heappush(self.waiting, (ready_time, self.counter, host))
+
+        logging.debug(f"scheduled {len(batch)} urls from {len(delays)} hosts")
+        return batch
+
+
+# next-allowed-time table for the download engines. after a page of a host was downloaded, the host
+# may be fetched again after its crawl delay. the engines skip hosts that are not ready instead of
+# sleeping, so a worker downloads a page of another host in the meantime.
+#
+# a host can have several slots, i.e. several downloads at the same time. every slot waits for the
+# crawl delay after its download. by default every host has one slot. in adaptive mode a host starts
+# with one slot and gets one more after every fast response, up to its maximum. a 429 or 503 response
+# or a response that takes twice as long as usual halves the slots and doubles the crawl delay of the
+# host until the responses are fast again.
+class HostRateLimiter:
+
+    def __init__(self, adaptive : bool = False, max_backoff : float = 32, clock : Callable[[], float] = time.time):
+        """
+        Args:
+            adaptive: adapt the slots and the crawl delay of each host to its responses
+            max_backoff: the crawl delay of a host is multiplied by at most this factor
+            clock: returns the current time in seconds
+        """
+        self.adaptive = adaptive
+        self.max_backoff = max_backoff
+        self.clock = clock
+
+        self.lock = Lock()
+        # the times when the slots that finished a download may be used again
+        self.next_fetch_times : Dict[str, List[float]] = {}
+        self.in_flight : Dict[str, int] = {}
+
+        # hosts that do not appear here have one slot, a backoff of 1 and no measured latency
+        self.max_slots : Dict[str, int] = {}
+        self.slots : Dict[str, int] = {}
+        self.backoff : Dict[str, float] = {}
+        self.latency : Dict[str, float] = {}
+
+    def set_max_slots(self, host : str, n : int):
+        with self.lock:
+            if n <= 1:
+                self.max_slots.pop(host, None)
+                self.slots.pop(host, None)
+                return
+            self.max_slots[host] = n
+            if not self.adaptive:
+                self.slots[host] = n
+
+    def get_max_slots(self, host : str) -> int:
+        return self.max_slots.get(host, 1)
+
+    # number of downloads from the host that may run at the same time
+    def get_slots(self, host : str) -> int:
+        return self.slots.get(host, 1)
+
+    # seconds until the host may be fetched, 0 if it may be fetched now
+    # it is infinite when all slots of the host are downloading
+    def wait_time(self, host : str) -> float:
+        with self.lock:
+            now = self.clock()
+            times = [t for t in self.next_fetch_times.get(host, []) if t > now]
+            self.next_fetch_times[host] = times
+            if self.in_flight.get(host, 0) + len(times) < self.get_slots(host):
+                return 0.0
+            if len(times) > 0:
+                return min(times) - now
+            return float("inf")
+
+    # call this when a download from the host starts
+    def acquire(self, host : str):
+        with self.lock:
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+
+    # call this when a download from the host finished
+    # status and latency are the http status code and the seconds that the download took
+    # retry_after are the seconds from the Retry-After header of the response, if it had one
+    def release(self, host : str, crawl_delay : float, status : int = None, latency : float = None,
+            retry_after : float = None):
+        with self.lock:
+            self.in_flight[host] = max(0, self.in_flight.get(host, 0) - 1)
+            if self.adaptive and status is not None and latency is not None:
+                self.adapt(host, status, latency)
+            delay = crawl_delay * self.backoff.get(host, 1)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            self.next_fetch_times.setdefault(host, []).append(self.clock() + delay)
+
+    # additive increase and multiplicative decrease of the slots of a host
+    def adapt(self, host : str, status : int, latency : float):
+        usual_latency = self.latency.get(host)
+        self.latency[host] = latency if usual_latency is None else 0.8 * usual_latency + 0.2 * latency
+
+        if status in [429, 503] or (usual_latency is not None and latency > 2 * usual_latency):
+            self.slots[host] = max(1, self.get_slots(host) // 2)
+            self.backoff[host] = min(self.max_backoff, self.backoff.get(host, 1) * 2)
+            logging.debug(f"back off from {host} to {self.slots[host]} slots and a backoff of {self.backoff[host]}")
+        else:
+            self.slots[host] = min(self.get_max_slots(host), self.get_slots(host) + 1)
+            backoff = self.backoff.get(host, 1) / 2
+            if backoff <= 1:
+                self.backoff.pop(host, None)
+            else:
+                self.backoff[host] = backoff
+
+    # forget the hosts that may be fetched now
+    def cleanup(self):
+        with self.lock:
+            now = self.clock()
+            self.next_fetch_times = {host: [t for t in times if t > now] for host, times in self.next_fetch_times.items()}
+            self.next_fetch_times = {host: times for host, times in self.next_fetch_times.items() if len(times) > 0}
+            self.in_flight = {host: n for host, n in self.in_flight.items() if n > 0}
+            self.latency = {host: t for host, t in self.latency.items() if host in self.max_slots or host in self.backoff}
+
+
+# stops fetching hosts that are down or do not answer. after threshold connection errors or timeouts
+# in a row, a host is suspended and its urls are deferred. the suspension starts with
+# base_suspension seconds and doubles every time the host fails again after a suspension. a single
+# failure after a suspension suspends the host again, a successful response resets it. a host whose
+# suspension would be longer than max_suspension is dead and its urls are removed from the frontier.
+class HostCircuitBreaker:
+
+    def __init__(self, file : str, threshold : int = 3, base_suspension : float = 60, max_suspension : float = 86400):
+        """
+        Args:
+            file: json file to persist the state of the hosts
+            threshold: number of failures in a row that suspend a host, 0 disables the circuit breaker
+            base_suspension: seconds that a host is suspended the first time
+            max_suspension: hosts that would be suspended longer than this are dead
+        """
+        self.file = file
+        self.threshold = threshold
+        self.base_suspension = base_suspension
+        self.max_suspension = max_suspension
+
+        self.lock = Lock()
+        # host -> {"failures": int, "trips": int, "suspended_until": float, "dead": bool, "since": float}
+        # since is the time of the first failure. hosts that answer normally do not appear here
+        self.hosts : Dict[str, Dict] = {}
+        # hosts whose state changed since the last sync()
+        self.changed = set()
+        # hosts that became dead since the last call of new_dead_hosts()
+        self.new_dead = set()
+
+    def read(self):
+        if os.path.exists(self.file):
+            with open(self.file, "r") as f:
+                self.hosts = json.load(f)
+
+    def write2file(self):
+        tmp_file = self.file + ".tmp"
+        with self.lock:
+            with open(tmp_file, "w") as f:
+                json.dump(self.hosts, f)
+        os.replace(tmp_file, self.file)
+
+    def get_state(self, host : str) -> Dict:
+        state = self.hosts.get(host)
+        if state is None:
+            state = {"failures": 0, "trips": 0, "suspended_until": 0.0, "dead": False, "since": time.time()}
+            self.hosts[host] = state
+        return state
+
+    # call this after each download, status -1 means a connection error or a timeout
+    def record(self, host : str, status : int):
+        if self.threshold <= 0:
+            return
+        with self.lock:
+            if status != -1:
+                if self.hosts.pop(host, None) is not None:
+                    self.changed.add(host)
+                return
+
+            state = self.get_state(host)
+            # downloads that failed while the host is suspended, e.g. because its name did not resolve,
+            # do not suspend it again
+            if state["suspended_until"] > time.time():
+                return
+            self.changed.add(host)
+            state["failures"] += 1
+            if state["failures"] >= self.threshold or state["trips"] > 0:
+                self.trip(host, state)
+
+    def trip(self, host : str, state : Dict):
+        suspension = self.base_suspension * 2 ** state["trips"]
+        state["failures"] = 0
+        state["trips"] += 1
+        if suspension > self.max_suspension:
+            if not state["dead"]:
+                self.new_dead.add(host)
+            state["dead"] = True
+            logging.info(f"{host} is dead after {state['trips']} suspensions")
+        else:
+            state["suspended_until"] = time.time() + suspension
+            logging.info(f"suspend {host} for {suspension:.0f} seconds")
+
+    # suspend a host right away, e.g. when its name does not resolve
+    def suspend(self, host : str):
+        if self.threshold <= 0:
+            return
+        with self.lock:
+            self.changed.add(host)
+            self.trip(host, self.get_state(host))
+
+    # share the suspended and dead hosts with the other crawler processes that use the same SQLite file.
+    # a host that answered again keeps its row with the time of the recovery, which clears the failures
+    # that the other processes saw before that time.
+    def sync(self, file : str):
+        connection = sqlite3.connect(file, timeout=60)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS host_health (
+                    host TEXT PRIMARY KEY,
+                    trips INTEGER NOT NULL,
+                    suspended_until REAL NOT NULL,
+                    dead INTEGER NOT NULL,
+                    recovered_at REAL NOT NULL)""")
+            with self.lock:
+                changed, self.changed = self.changed, set()
+                updates = [(host, self.hosts.get(host)) for host in changed]
+            now = time.time()
+            with connection:
+                for host, state in updates:
+                    if state is None:
+                        connection.execute("""
+                            INSERT INTO host_health (host, trips, suspended_until, dead, recovered_at) VALUES (?, 0, 0, 0, ?)
+                            ON CONFLICT(host) DO UPDATE SET
+                                trips = 0, suspended_until = 0, dead = 0, recovered_at = excluded.recovered_at""",
+                            (host, now))
+                    elif state["trips"] > 0 or state["dead"]:
+                        # failures from before the last recovery are not shared, they are cleared below
+                        connection.execute("""
+                            INSERT INTO host_health (host, trips, suspended_until, dead, recovered_at) VALUES (?, ?, ?, ?, 0)
+                            ON CONFLICT(host) DO UPDATE SET
+                                trips = MAX(trips, excluded.trips),
+                                suspended_until = MAX(suspended_until, excluded.suspended_until),
+                                dead = MAX(dead, excluded.dead)
+                            WHERE recovered_at < ?""",
+                            (host, state["trips"], state["suspended_until"], int(state["dead"]), state.get("since", 0)))
+                # the recoveries are kept as long as the longest suspension, every process syncs before that
+                connection.execute("DELETE FROM host_health WHERE trips = 0 AND dead = 0 AND recovered_at < ?",
+                    (now - self.max_suspension,))
+                rows = connection.execute("SELECT host, trips, suspended_until, dead, recovered_at FROM host_health").fetchall()
+        finally:
+            connection.close()
+
+        with self.lock:
+            for host, trips, suspended_until, dead, recovered_at in rows:
+                state = self.hosts.get(host)
+                if state is not None and state.get("since", 0) <= recovered_at:
+                    del self.hosts[host]
+                if trips > 0 or dead:
+                    state = self.get_state(host)
+                    state["trips"] = max(state["trips"], trips)
+                    state["suspended_until"] = max(state["suspended_until"], suspended_until)
+                    if dead and not state["dead"]:
+                        state["dead"] = True
+                        self.new_dead.add(host)
+
+    def is_dead(self, host : str) -> bool:
+        state = self.hosts.get(host)
+        return state is not None and state["dead"]
+
+    # True if the urls of the host should not be fetched now
+    def is_suspended(self, host : str) -> bool:
+        state = self.hosts.get(host)
+        return state is not None and (state["dead"] or state["suspended_until"] > time.time())
+
+    def dead_hosts(self) -> List[str]:
+        with self.lock:
+            return [host for host, state in self.hosts.items() if state["dead"]]
+
+    # the hosts that became dead since the last call, e.g. to remove their urls only once
+    def new_dead_hosts(self) -> List[str]:
+        with self.lock:
+            hosts, self.new_dead = self.new_dead, set()
+            return [host for host in hosts if self.is_dead(host)]
+
+    # the time when the first suspended host may be fetched again, None if no host is suspended
+    def next_resume_time(self) -> Optional[float]:
+        now = time.time()
+        with self.lock:
+            times = [state["suspended_until"] for state in self.hosts.values()
+                if not state["dead"] and state["suspended_until"] > now]
+        return min(times) if len(times) > 0 else None
+
+
+# counts how many pages we downloaded from each host and how many segments in the target languages
+# they contained. focused crawling uses the yield, i.e. the segments per page, as the priority of
+# a host and stops fetching hosts that yielded no segments after min_pages pages.
+class HostYieldTracker:
+
+    def __init__(self, file : str, min_pages : int = 20, prior_pages : float = 1, prior_segments : float = 1):
+        """
+        Args:
+            file: json file to persist the statistics
+            min_pages: number of pages after which a host without any segment is not fetched anymore
+            prior_pages, prior_segments: smoothing for hosts with few pages, new hosts have a yield of
+                prior_segments / prior_pages
+        """
+        self.file = file
+        self.min_pages = min_pages
+        self.prior_pages = prior_pages
+        self.prior_segments = prior_segments
+
+        # host -> {"pages": int, "segments": int}
+        self.hosts : Dict[str, Dict[str, int]] = {}
+        # hosts that got pages since the last call of new_blocked_hosts()
+        self.changed = set()
+
+    def read(self):
+        if os.path.exists(self.file):
+            with open(self.file, "r") as f:
+                self.hosts = json.load(f)
+
+    def write2file(self):
+        tmp_file = self.file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self.hosts, f)
+        os.replace(tmp_file, self.file)
+
+    def get_stats(self, host : str) -> Dict[str, int]:
+        if host not in self.hosts:
+            self.hosts[host] = {"pages": 0, "segments": 0}
+        return self.hosts[host]
+
+    def add_pages(self, urls : Iterable[str]):
+        for url in urls:
+            host = get_host(url)
+            self.get_stats(host)["pages"] += 1
+            self.changed.add(host)
+
+    # domains2languages is the output of Parser.parse_json, the number of segments per domain and language
+    def add_segments(self, domains2languages : Dict[str, Dict[str, int]]):
+        for domain, languages in domains2languages.items():
+            self.get_stats(get_host("http://" + domain))["segments"] += sum(languages.values())
+
+    def is_blocked(self, host : str) -> bool:
+        stats = self.hosts.get(host)
+        return stats is not None and stats["segments"] == 0 and stats["pages"] >= self.min_pages
+
+    def blocked_hosts(self) -> List[str]:
+        return [host for host in self.hosts.keys() if self.is_blocked(host)]
+
+    # the hosts that got pages since the last call and are blocked now, e.g. to remove their urls only once
+    def new_blocked_hosts(self) -> List[str]:
+        hosts, self.changed = self.changed, set()
+        return [host for host in hosts if self.is_blocked(host)]
+
+    # segments per page, None if the host should not be fetched anymore
+    def priority(self, host : str) -> Optional[float]:
+        if self.is_blocked(host):
+            return None
+        stats = self.hosts.get(host, {"pages": 0, "segments": 0})
+        return (stats["segments"] + self.prior_segments) / (stats["pages"] + self.prior_pages)
@@ -0,0 +1,99 @@
+"""
+Stream seed urls from a large seed file into the urls to download.
+"""
+
+import os
+import gzip
+import json
+import random
+import logging
+from itertools import islice
+from typing import Callable, List, Optional
+
+from frontier import clean_urls
+
+
+# reads the seed file in chunks instead of loading it completely. each chunk is deduplicated and
+# shuffled and then added to the urls to download, so the first round can start after the first
+# chunk. the number of consumed lines is stored in a progress file, so a restarted crawler continues
+# with the next chunk.
+class SeedLoader:
+
+    def __init__(self, seed_file : str, progress_file : str, chunk_size : int = 1000000,
+            filter_fn : Optional[Callable[[str], bool]] = None):
+        """
+        Args:
+            seed_file: text file with one url per line, optionally gzip compressed
+            progress_file: json file that stores how many lines were consumed
+            chunk_size: number of lines per chunk
+            filter_fn: optional function to select the seed urls, e.g. the urls of a shard
+        """
+        self.seed_file = seed_file
+        self.progress_file = progress_file
+        self.chunk_size = chunk_size
+        self.filter_fn = filter_fn
+
+        self.lines = 0
+        self.finished = False
+        self.reader = None
+
+    def read_progress(self):
+        if os.path.exists(self.progress_file):
+            with open(self.progress_file, "r") as f:
+                progress = json.load(f)
+            self.lines = progress["lines"]
+            self.finished = progress["finished"]
+
+    def write_progress(self):
+        tmp_file = self.progress_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"seed_file": self.seed_file, "lines": self.lines, "finished": self.finished}, f)
+        os.replace(tmp_file, self.progress_file)
+
+    def open(self):
+        if self.seed_file[-3:] == ".gz":
+            self.reader = gzip.open(self.seed_file, "rt")
+        else:
+            self.reader = open(self.seed_file, "r")
+
+        # skip the lines that were consumed before a restart
+        for _ in islice(self.reader, self.lines):
+            pass
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    # read the next chunk of seed urls, deduplicated and shuffled
+    def next_chunk(self) -> List[str]:
+        if self.finished:
+            return []
+        if self.reader is None:
+            self.open()
+
+        lines = list(islice(self.reader, self.chunk_size))
+        self.lines += len(lines)
+        if len(lines) < self.chunk_size:
+            self.finished = True
+            self.close()
+
+        urls = list(dict.fromkeys(clean_urls(lines)))
+        if self.filter_fn is not None:
+            urls = list(filter(self.filter_fn, urls))
+        random.shuffle(urls)
+        return urls
+
+    # add the next chunk to the urls to download, skipping urls that were already downloaded
+    # and the urls for which accept_url returns False, e.g. the urls of dead hosts
+    # the progress is written after the urls were committed, so a crash can only load a chunk twice
+    def load_next(self, urls2download, downloaded_urls, accept_url : Optional[Callable[[str], bool]] = None) -> int:
+        urls = self.next_chunk()
+        if accept_url is not None:
+            urls = list(filter(accept_url, urls))
+        existing_urls = downloaded_urls.known_urls(urls)
+        n = urls2download.add_urls(filter(lambda url: url not in existing_urls, urls))
+        urls2download.write2file()
+        self.write_progress()
+        logging.info(f"added {n:,} seed urls after reading {self.lines:,} lines of {self.seed_file}")
+        return n
@@ -0,0 +1,224 @@
+"""
+Compact probabilistic set of the downloaded urls.
+
+A scalable Bloom filter answers "have we downloaded this url before?" with a configurable false
+positive rate and needs about 2 bytes per url instead of the full url string. The bit arrays are
+NumPy arrays that are memory mapped from disk, so restarting the crawler does not need to load them.
+The bits of the urls that were added in a round are kept in memory as a sparse list of the changed
+bytes and only written to the bit arrays by commit(), so a crash before the end of the round does
+not leave them on disk.
+"""
+
+import os
+import json
+import math
+import hashlib
+import logging
+import numpy as np
+from typing import Iterable, List, Set
+
+from frontier import clean_urls
+
+
+# hash a list of urls to two 64 bit integers each, the k hash functions are derived from them
+# with double hashing
+def hash_urls(urls : List[str]):
+    h1 = np.empty(len(urls), dtype=np.uint64)
+    h2 = np.empty(len(urls), dtype=np.uint64)
+    for i, url in enumerate(urls):
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1[i] = int.from_bytes(digest[0:8], "little")
+        h2[i] = int.from_bytes(digest[8:16], "little") | 1
+    return h1, h2
+
+
+# a Bloom filter with a fixed capacity
+class BloomFilter:
+
+    def __init__(self, bits : np.ndarray, num_hashes : int, capacity : int, count : int = 0):
+        self.bits = bits
+        self.num_bits = len(bits) * 8
+        self.num_hashes = num_hashes
+        self.capacity = capacity
+        self.count = count
+        # the bytes that changed since the last commit as sorted, unique byte indices and the bits
+        # that were set in them, None if there are none
+        self.pending_indices : np.ndarray = None
+        self.pending_masks : np.ndarray = None
+
+    @staticmethod
+    def size(capacity : int, error_rate : float):
+        """Number of bits and hash functions for the given capacity and false positive rate"""
+        num_bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return num_bits, num_hashes
+
+    def positions(self, h1 : np.ndarray, h2 : np.ndarray) -> np.ndarray:
+        i = np.arange(self.num_hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    @staticmethod
+    def masks(positions : np.ndarray) -> np.ndarray:
+        return np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+
+    def contains(self, h1 : np.ndarray, h2 : np.ndarray) -> np.ndarray:
+        positions = self.positions(h1, h2)
+        indices = positions >> np.uint64(3)
+        values = self.bits[indices]
+        if self.pending_indices is not None:
+            # searching sorted keys is much faster
+            flat = indices.ravel()
+            order = np.argsort(flat)
+            i = np.empty(len(flat), dtype=np.intp)
+            i[order] = np.searchsorted(self.pending_indices, flat[order])
+            i = np.minimum(i, len(self.pending_indices) - 1).reshape(indices.shape)
+            values |= np.where(self.pending_indices[i] == indices, self.pending_masks[i], np.uint8(0))
+        return np.all((values & self.masks(positions)) > 0, axis=1)
+
+    def add(self, h1 : np.ndarray, h2 : np.ndarray):
+        positions = self.positions(h1, h2).ravel()
+        indices = positions >> np.uint64(3)
+        masks = self.masks(positions)
+
+        # merge the masks of the same byte
+        order = np.argsort(indices)
+        indices, masks = indices[order], masks[order]
+        starts = np.flatnonzero(np.concatenate([[True], indices[1:] != indices[:-1]]))
+        indices, masks = indices[starts], np.bitwise_or.reduceat(masks, starts)
+        self.count += len(h1)
+
+        if self.pending_indices is None:
+            self.pending_indices, self.pending_masks = indices, masks
+            return
+
+        # bytes that already changed get the new bits, the other bytes are inserted in order
+        i = np.searchsorted(self.pending_indices, indices)
+        found = self.pending_indices[np.minimum(i, len(self.pending_indices) - 1)] == indices
+        self.pending_masks[i[found]] |= masks[found]
+        self.pending_indices = np.insert(self.pending_indices, i[~found], indices[~found])
+        self.pending_masks = np.insert(self.pending_masks, i[~found], masks[~found])
+
+    # write the bits of the added urls to the bit array, only the changed bytes are touched
+    def commit(self):
+        if self.pending_indices is not None:
+            self.bits[self.pending_indices] |= self.pending_masks
+            self.pending_indices = None
+            self.pending_masks = None
+        self.bits.flush()
+
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+# a scalable Bloom filter that adds a new, larger filter whenever the current one is full.
+# the false positive rate of the filters shrinks geometrically, so the overall false positive rate
+# stays below error_rate no matter how many urls are added.
+# it has the same interface as the url backends in frontier.py, but cannot list or remove urls.
+class BloomURLBackend:
+
+    def __init__(self, folder : str, error_rate : float = 0.001, initial_capacity : int = 1000000,
+            growth : int = 2, tightening : float = 0.5):
+        self.folder = folder
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.growth = growth
+        self.tightening = tightening
+        self.filters : List[BloomFilter] = []
+
+    def meta_file(self) -> str:
+        return os.path.join(self.folder, "meta.json")
+
+    def filter_file(self, i : int) -> str:
+        return os.path.join(self.folder, f"filter_{i:05}.npy")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_file())
+
+    def read(self):
+        if not self.exists():
+            return
+
+        with open(self.meta_file(), "r") as f:
+            meta = json.load(f)
+
+        self.error_rate = meta["error_rate"]
+        self.initial_capacity = meta["initial_capacity"]
+        self.growth = meta["growth"]
+        self.tightening = meta["tightening"]
+        self.filters = []
+        for i, info in enumerate(meta["filters"]):
+            bits = np.load(self.filter_file(i), mmap_mode="r+")
+            self.filters.append(BloomFilter(bits, info["num_hashes"], info["capacity"], info["count"]))
+        logging.debug(f"loaded {len(self.filters)} bloom filters with {len(self):,} urls from {self.folder}")
+
+    def commit(self):
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+
+        for f in self.filters:
+            f.commit()
+
+        meta = {
+            "error_rate": self.error_rate,
+            "initial_capacity": self.initial_capacity,
+            "growth": self.growth,
+            "tightening": self.tightening,
+            "filters": [{"capacity": f.capacity, "num_hashes": f.num_hashes, "count": f.count} for f in self.filters],
+        }
+        tmp_file = self.meta_file() + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.meta_file())
+
+    def add_filter(self):
+        i = len(self.filters)
+        capacity = self.initial_capacity * self.growth ** i
+        error_rate = self.error_rate * (1 - self.tightening) * self.tightening ** i
+        num_bits, num_hashes = BloomFilter.size(capacity, error_rate)
+
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        bits = np.lib.format.open_memmap(self.filter_file(i), mode="w+", dtype=np.uint8, shape=((num_bits + 7) // 8,))
+        self.filters.append(BloomFilter(bits, num_hashes, capacity))
+        logging.info(f"added bloom filter {i} for {capacity:,} urls with {len(bits) / 1e6:.1f} MB")
+
+    def contains(self, h1 : np.ndarray, h2 : np.ndarray) -> np.ndarray:
+        found = np.zeros(len(h1), dtype=bool)
+        for f in self.filters:
+            found |= f.contains(h1, h2)
+        return found
+
+    def add_urls(self, urls : Iterable[str]) -> int:
+        # urls that are already in the filter are not added again
+        urls = list(dict.fromkeys(clean_urls(urls)))
+        if len(urls) == 0:
+            return 0
+        h1, h2 = hash_urls(urls)
+        new = ~self.contains(h1, h2)
+        h1, h2 = h1[new], h2[new]
+
+        while len(h1) > 0:
+            if len(self.filters) == 0 or self.filters[-1].is_full():
+                self.add_filter()
+            f = self.filters[-1]
+            n = f.capacity - f.count
+            f.add(h1[0:n], h2[0:n])
+            h1, h2 = h1[n:], h2[n:]
+
+        return int(np.sum(new))
+
+    def known_urls(self, urls : Iterable[str]) -> Set[str]:
+        urls = list(urls)
+        if len(urls) == 0 or len(self.filters) == 0:
+            return set()
+        found = self.contains(*hash_urls(urls))
+        return {url for url, f in zip(urls, found) if f}
+
+    def remove_urls(self, urls : Iterable[str]):
+        raise Exception("urls cannot be removed from a bloom filter")
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
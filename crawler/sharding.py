@@ -0,0 +1,95 @@
+"""
+Split one crawl over several crawler processes.
+
+Every process owns the hosts whose hash modulo the number of shards equals its shard id. Urls of
+hosts that belong to another shard are written to the inbox folder of that shard, which the other
+process reads at the beginning of its next round. The processes only share a folder, so they can
+run on different machines with a shared filesystem. Because every host belongs to exactly one shard,
+the politeness rules per host stay the same as for a single process.
+"""
+
+import os
+import glob
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Iterable, List, Tuple
+
+from frontier import get_host, clean_urls
+
+
+# the shard that owns a url. python's hash() differs between processes, so we use md5
+def shard_of(url : str, num_shards : int) -> int:
+    digest = hashlib.md5(get_host(url).encode("utf-8")).digest()
+    return int.from_bytes(digest[0:8], "little") % num_shards
+
+
+class ShardRouter:
+
+    def __init__(self, folder : str, num_shards : int, shard_id : int):
+        """
+        Args:
+            folder: the output folder that is shared by all shards
+            num_shards: number of crawler processes
+            shard_id: the shard of this process, between 0 and num_shards - 1
+        """
+        if shard_id < 0 or shard_id >= num_shards:
+            raise Exception(f"shard id {shard_id} is not between 0 and {num_shards - 1}")
+
+        self.folder = folder
+        self.num_shards = num_shards
+        self.shard_id = shard_id
+        self.received_files : List[str] = []
+
+    # the folder with the urls that other shards sent to this shard
+    def inbox(self, shard_id : int) -> str:
+        return os.path.join(self.folder, "inbox", f"shard_{shard_id:03}")
+
+    def shard_folder(self) -> str:
+        return os.path.join(self.folder, f"shard_{self.shard_id:03}")
+
+    def owns(self, url : str) -> bool:
+        return shard_of(url, self.num_shards) == self.shard_id
+
+    # split urls into the urls of this shard and the urls of other shards
+    def split(self, urls : Iterable[str]) -> Tuple[List[str], List[str]]:
+        own, foreign = [], []
+        for url in urls:
+            if self.owns(url):
+                own.append(url)
+            else:
+                foreign.append(url)
+        return own, foreign
+
+    # write urls to the inboxes of their shards
+    # the files are renamed after writing, so the receiver never reads a partially written file
+    def send(self, urls : Iterable[str], round : int):
+        shards2urls = defaultdict(list)
+        for url in urls:
+            shards2urls[shard_of(url, self.num_shards)].append(url)
+
+        for shard_id, shard_urls in shards2urls.items():
+            inbox = self.inbox(shard_id)
+            os.makedirs(inbox, exist_ok=True)
+            file = os.path.join(inbox, f"from_{self.shard_id:03}_{round:05}.txt")
+            with open(file + ".tmp", "w") as f:
+                f.write("\n".join(shard_urls))
+            os.replace(file + ".tmp", file)
+            logging.debug(f"sent {len(shard_urls):,} urls to shard {shard_id}")
+
+    # read all urls from the inbox of this shard
+    # call delete_received() after the urls were committed to the frontier
+    def receive(self) -> List[str]:
+        self.received_files = sorted(glob.glob(os.path.join(self.inbox(self.shard_id), "*.txt")))
+        urls = []
+        for file in self.received_files:
+            with open(file, "r") as f:
+                urls.extend(clean_urls(f))
+        if len(urls) > 0:
+            logging.info(f"received {len(urls):,} urls from other shards")
+        return urls
+
+    def delete_received(self):
+        for file in self.received_files:
+            os.remove(file)
+        self.received_files = []
@@ -1,5 +1,8 @@
 #!/usr/bin/env bash
 
+# usage: start_crawler.sh LANGUAGE [NUM_SHARDS SHARD_ID]
+# start NUM_SHARDS processes with SHARD_ID 0 ... NUM_SHARDS-1 to split a large language over several nodes
+
 cd "$(dirname "$0")"
 
 export HF_HOME=/data/nehring/cache/hf_home
@@ -14,4 +17,6 @@ python3 crawler.py \
     --download_n_threads 50 \
     --language $1 \
     --seed_file ../../seeds-2025-10-10/$1.txt.gz \
+    --num_shards ${2:-1} \
+    --shard_id ${3:-0} \
     --warc_output
@@ -0,0 +1,61 @@
+"""
+Compare the asyncio download engine with the default threaded engine.
+
+Call it like this:
+
+python -m unittest tests.test_async_download
+"""
+
+import os
+import json
+import shutil
+import unittest
+from tests.util import ServerThread, create_html_store
+
+class TestAsyncDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/async_download"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+        self.server, self.port = ServerThread.setup(os.path.join(os.path.dirname(__file__), "assets/books.toscrape.com"), port=5005)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def download(self, engine, urls):
+        output_folder = os.path.join(self.folder, engine)
+        html_store = create_html_store(output_folder, warc_output=True, download_engine=engine)
+        html_store.download_urls(urls)
+
+        with open(os.path.join(output_folder, "00001.json")) as f:
+            rows = [json.loads(line) for line in f]
+        for row in rows:
+            row.get("headers", {}).pop("date", None)
+        return sorted(rows, key=lambda row: row["url"])
+
+    def test_same_records(self):
+        base_url = f"http://localhost:{self.port}"
+        urls = [
+            f"{base_url}/index.html",
+            f"{base_url}/catalogue/category/books_1/index.html",
+            f"{base_url}/does_not_exist.html",
+            "http://localhost:1/unreachable.html",
+        ]
+
+        rows = self.download("asyncio", urls)
+        self.assertEqual([row["status"] for row in rows], [-1, 200, 404, 200])
+        self.assertIn("html", rows[1])
+
+        # apart from the error messages, the records are the same as with the threaded engine
+        expected = self.download("threads", urls)
+        rows[0].pop("error")
+        expected[0].pop("error")
+        self.assertEqual(rows, expected)
+
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "asyncio", "warc", "00001.warc.gz")))
+
+if __name__ == '__main__':
+    unittest.main()
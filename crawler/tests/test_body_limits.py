@@ -0,0 +1,85 @@
+"""
+Unit tests for skipping unwanted and large response bodies.
+
+Call it like this:
+
+python -m unittest tests.test_body_limits
+"""
+
+import os
+import json
+import shutil
+import unittest
+from flask import Flask, Response
+from tests.util import ServerThread, create_html_store
+
+class TestBodyLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/body_limits"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+        app = Flask(__name__)
+
+        @app.route("/video")
+        def video():
+            return Response(b"0" * 1000000, mimetype="video/mp4")
+
+        @app.route("/small")
+        def small():
+            return "<html><body>small</body></html>"
+
+        @app.route("/large")
+        def large():
+            return "<html><body>" + "large " * 10000 + "</body></html>"
+
+        # without content-length, so the limit is only noticed while reading the body
+        @app.route("/stream")
+        def stream():
+            return Response((("chunk " * 1000) for _ in range(100)), mimetype="text/html")
+
+        self.server = ServerThread(app, port=5006)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def download(self, engine, truncate):
+        output_folder = os.path.join(self.folder, engine)
+        html_store = create_html_store(output_folder, download_engine=engine, max_body_size=10000, truncate_large_bodies=truncate)
+        html_store.download_urls([f"http://localhost:5006/{page}" for page in ["video", "small", "large", "stream"]])
+
+        with open(os.path.join(output_folder, "00001.json")) as f:
+            rows = {row["url"].split("/")[-1]: row for row in map(json.loads, f)}
+        return rows, html_store.download_stats
+
+    def test_body_limits(self):
+        for engine in ["threads", "asyncio"]:
+            rows, stats = self.download(engine, truncate=False)
+
+            self.assertEqual(rows["video"]["status"], 200)
+            self.assertNotIn("html", rows["video"])
+            self.assertEqual(rows["small"]["html"], "<html><body>small</body></html>")
+            self.assertNotIn("html", rows["large"])
+            self.assertNotIn("html", rows["stream"])
+
+            # the video and the large page were not downloaded at all
+            self.assertEqual(stats.rejected, 3)
+            self.assertGreaterEqual(stats.bytes_saved, 1000000 + 60000)
+            self.assertLess(stats.bytes_downloaded, 200000)
+
+    def test_truncate(self):
+        for engine in ["threads", "asyncio"]:
+            rows, stats = self.download(engine, truncate=True)
+
+            self.assertEqual(len(rows["large"]["html"]), 10000)
+            self.assertTrue(rows["large"]["truncated"])
+            self.assertEqual(len(rows["stream"]["html"]), 10000)
+            self.assertNotIn("truncated", rows["small"])
+            self.assertEqual(stats.truncated, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Unit tests for finding the character encoding of a page.
+
+Call it like this:
+
+python -m unittest tests.test_charset
+"""
+
+import codecs
+import unittest
+from charset import CharsetResolver
+
+class TestCharset(unittest.TestCase):
+
+    def test_sources(self):
+        resolver = CharsetResolver()
+        text = "<html><body>Murakaza neza, ça va? Grüße</body></html>"
+
+        # the byte order mark comes first, then the header, then the meta tag
+        content = codecs.BOM_UTF8 + text.encode("utf-8")
+        self.assertEqual(resolver.resolve(content, "text/html; charset=iso-8859-1"), ("utf-8", "bom"))
+        self.assertEqual(resolver.decode(content), text)
+
+        content = text.encode("cp1252")
+        self.assertEqual(resolver.resolve(content, "text/html; charset=ISO-8859-1"), ("cp1252", "header"))
+        self.assertEqual(resolver.decode(content, "text/html; charset=ISO-8859-1"), text)
+
+        content = b'<meta http-equiv="content-type" content="text/html; charset=UTF-8" />' + text.encode("utf-8")
+        self.assertEqual(resolver.resolve(content, "text/html"), ("utf-8", "meta"))
+        content = b'<meta charset="koi8-r">' + text.encode("utf-8")
+        self.assertEqual(resolver.resolve(content, "text/html; charset=unknown"), ("koi8-r", "meta"))
+
+    def test_host_cache(self):
+        resolver = CharsetResolver()
+        content = ("<html><body>" + "Привет, как дела? " * 20 + "</body></html>").encode("utf-8")
+
+        self.assertEqual(resolver.resolve(content, "text/html", "example.com"), ("utf-8", "detection"))
+        self.assertEqual(resolver.resolve(content, "text/html", "example.com"), ("utf-8", "cache"))
+
+        # the cached encoding is not used when it cannot decode the page
+        content = ("<html><body>" + "Привет, как дела? " * 20 + "</body></html>").encode("cp1251")
+        self.assertEqual(resolver.resolve(content, "text/html", "example.com")[1], "detection")
+        self.assertEqual(resolver.decode(content, "text/html", "example.com"), content.decode("cp1251"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Unit tests for suspending hosts that do not answer.
+
+Call it like this:
+
+python -m unittest tests.test_circuit_breaker
+"""
+
+import os
+import json
+import time
+import socket
+import shutil
+import unittest
+from flask import Flask
+from crawler import CrawlerConfig, HTMLStore, Crawler, URLs2Download, DownloadedURLs
+from seeds import SeedLoader
+from tests.util import ServerThread, create_html_store
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/circuit_breaker"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+        app = Flask(__name__)
+
+        @app.route("/<page>")
+        def page(page):
+            return f"<html><body>{page}</body></html>"
+
+        self.server = ServerThread(app, port=5008)
+        self.server.start()
+
+        # a host that accepts connections but never answers
+        self.tarpit = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tarpit.bind(("127.0.0.1", 5009))
+        self.tarpit.listen(16)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.join()
+        self.tarpit.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def check_engine(self, engine):
+        html_store = create_html_store(os.path.join(self.folder, engine),
+            request_timeout=1, download_engine=engine, circuit_breaker_threshold=2)
+
+        # 8 timeouts one after another would take 8 seconds
+        urls = [f"http://localhost:{port}/page{i}" for i in range(8) for port in [5008, 5009]]
+        start_time = time.time()
+        deferred_urls = html_store.download_urls(urls)
+        duration = time.time() - start_time
+        html_store.close()
+
+        self.assertLess(duration, 4)
+        self.assertTrue(html_store.circuit_breaker.is_suspended("localhost:5009"))
+        self.assertFalse(html_store.circuit_breaker.is_suspended("localhost:5008"))
+        self.assertEqual(len(deferred_urls), 6)
+        self.assertTrue(all(url.startswith("http://localhost:5009/") for url in deferred_urls))
+
+    def test_engines(self):
+        for engine in ["threads", "stream", "asyncio"]:
+            self.check_engine(engine)
+
+    def test_dead_hosts_end_crawl(self):
+        folder = os.path.join(self.folder, "dead_hosts")
+        os.makedirs(folder)
+        config = CrawlerConfig(output_folder=folder, dont_compress_outputs=True, crawl_delay=0, robots_check=False)
+
+        # an earlier run found dead.example dead
+        with open(os.path.join(folder, "host_health.json"), "w") as f:
+            json.dump({"dead.example": {"failures": 0, "trips": 5, "suspended_until": 0.0, "dead": True}}, f)
+        seed_file = os.path.join(folder, "seeds.txt")
+        with open(seed_file, "w") as f:
+            f.write("http://dead.example/page1\nhttp://dead.example/page2\n")
+
+        # the urls of the dead host in the urls to download, e.g. from a recrawl, are removed
+        # when the crawler starts and its seeds are not added
+        html_store = HTMLStore(config)
+        urls2download = URLs2Download(["http://dead.example/old"], config)
+        seed_loader = SeedLoader(seed_file, os.path.join(folder, "seed_progress.json"))
+        crawler = Crawler(config, html_store, None, urls2download, DownloadedURLs(config), None, seed_loader)
+        self.assertEqual(len(urls2download), 0)
+        crawler.round(1)
+        self.assertEqual(len(urls2download), 0)
+        self.assertFalse(crawler.has_urls() or crawler.has_seeds() or crawler.has_retries())
+
+        # the crawl ends when urls are left that can never be scheduled
+        urls2download.add_urls(["http://localhost:5008/page"])
+        self.assertTrue(crawler.has_urls())
+        urls2download.scheduler.is_suspended = lambda host: True
+        crawler.round(2)
+        self.assertEqual(len(urls2download), 1)
+        self.assertFalse(crawler.has_urls())
+        html_store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Unit tests for the DNS cache.
+
+Call it like this:
+
+python -m unittest tests.test_dns_cache
+"""
+
+import os
+import time
+import socket
+import shutil
+import unittest
+from threading import Lock
+from flask import Flask
+from dns_cache import DNSCache
+from tests.util import ServerThread, create_html_store
+
+class FakeResolver:
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.lock = Lock()
+        self.calls = []
+
+    def __call__(self, host, port, family=0, type=0, proto=0, flags=0):
+        with self.lock:
+            self.calls.append(host)
+        time.sleep(self.delay)
+        if host.endswith("site.example"):
+            return [
+                (socket.AF_INET6, socket.SOCK_STREAM, 6, "", ("::1", 0, 0, 0)),
+                (socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", 0)),
+            ]
+        if host == "timeout.example":
+            raise socket.gaierror(socket.EAI_AGAIN, "Temporary failure in name resolution")
+        raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+
+class TestDNSCache(unittest.TestCase):
+
+    def test_cache(self):
+        resolver = FakeResolver()
+        nxdomains = []
+        cache = DNSCache(ttl=60, resolve_fn=resolver, on_nxdomain=nxdomains.append)
+
+        # the port, the address family and the socket type of the request are filled in
+        self.assertEqual(cache.getaddrinfo("site.example", 443, socket.AF_INET, socket.SOCK_STREAM),
+            [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", ("127.0.0.1", 443))])
+        self.assertEqual([info[4] for info in cache.getaddrinfo("site.example", "80")], [("::1", 80, 0, 0), ("127.0.0.1", 80)])
+        self.assertEqual(resolver.calls, ["site.example"])
+
+        # hosts that do not exist are cached as well, temporary errors are not
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                cache.getaddrinfo("gone.example", 80)
+        self.assertEqual(nxdomains, ["gone.example"])
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                cache.getaddrinfo("timeout.example", 80)
+        self.assertEqual(resolver.calls.count("timeout.example"), 2)
+
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 4, "negative_hits": 2, "prefetched": 0, "hosts": 2})
+
+        # calls with other flags go to the system resolver
+        self.assertEqual(cache.getaddrinfo("127.0.0.1", 80, socket.AF_INET, socket.SOCK_STREAM, 0, socket.AI_NUMERICHOST),
+            socket.getaddrinfo("127.0.0.1", 80, socket.AF_INET, socket.SOCK_STREAM, 0, socket.AI_NUMERICHOST))
+        self.assertNotIn("127.0.0.1", resolver.calls)
+        cache.getaddrinfo("site.example", 80, flags=socket.AI_ADDRCONFIG)
+        self.assertEqual(resolver.calls.count("site.example"), 1)
+
+        # expired entries are resolved again
+        cache.entries["site.example"] = (cache.entries["site.example"][0], time.time() - 1)
+        cache.getaddrinfo("site.example", 80)
+        self.assertEqual(resolver.calls.count("site.example"), 2)
+
+    def test_prefetch(self):
+        resolver = FakeResolver(delay=0.2)
+        cache = DNSCache(ttl=60, prefetch_threads=32, resolve_fn=resolver)
+        cache.prefetch([f"{i}.site.example" for i in range(20)] + ["0.site.example"])
+
+        # a lookup waits for the prefetch of its host instead of resolving it again
+        start_time = time.time()
+        cache.resolve("19.site.example")
+        self.assertLess(time.time() - start_time, 0.5)
+        cache.close()
+        self.assertEqual(len(resolver.calls), 20)
+        self.assertEqual(cache.stats()["prefetched"], 20)
+
+    def test_download(self):
+        folder = "tests/assets/temp/dns_cache"
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+
+        app = Flask(__name__)
+
+        @app.route("/<page>")
+        def page(page):
+            return f"<html><body>{page}</body></html>"
+
+        server = ServerThread(app, port=5016)
+        server.start()
+        try:
+            for engine in ["threads", "asyncio"]:
+                html_store = create_html_store(os.path.join(folder, engine), download_engine=engine)
+                resolver = FakeResolver()
+                html_store.dns_cache.resolve_fn = resolver
+
+                # site.example only exists in the dns cache, which is installed while the urls download
+                with html_store.dns_cache:
+                    self.assertNotEqual(socket.getaddrinfo.__module__, "socket")
+                    html_store.download_urls([f"http://www.site.example:5016/page{i}" for i in range(3)] + ["http://gone.example/page"])
+                self.assertEqual(socket.getaddrinfo.__module__, "socket")
+                html_store.close()
+
+                self.assertEqual(html_store.download_stats.bytes_downloaded, 3 * len("<html><body>page0</body></html>"))
+                self.assertEqual(sorted(set(resolver.calls)), ["gone.example", "www.site.example"])
+                self.assertEqual(resolver.calls.count("www.site.example"), 1)
+                # a host that does not exist is suspended, not dead
+                self.assertTrue(html_store.circuit_breaker.is_suspended("gone.example"))
+                self.assertFalse(html_store.circuit_breaker.is_dead("gone.example"))
+                self.assertEqual(html_store.circuit_breaker.hosts["gone.example"]["trips"], 1)
+        finally:
+            server.shutdown()
+            server.join()
+            shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Unit tests for the url storage backends.
+
+Call it like this:
+
+python -m unittest tests.test_frontier
+"""
+
+import os
+import shutil
+import unittest
+from frontier import create_backend
+
+class TestFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/frontier"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+        os.makedirs(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def check_backend(self, name):
+        file = os.path.join(self.folder, "urls.txt")
+        backend = create_backend(name, file)
+        backend.read()
+
+        urls = ["https://example.com/page1", "https://example.com/page2", "https://another.com/page1\n", "  "]
+        self.assertEqual(backend.add_urls(urls), 3)
+        self.assertEqual(backend.add_urls(["https://example.com/page1"]), 0)
+        self.assertEqual(len(backend), 3)
+
+        # insertion order is kept
+        self.assertEqual(backend.head(2), ["https://example.com/page1", "https://example.com/page2"])
+
+        self.assertEqual(
+            backend.known_urls(["https://example.com/page2", "https://unknown.com"]),
+            {"https://example.com/page2"})
+
+        # urls are indexed per host
+        self.assertEqual(backend.get_hosts(), ["example.com", "another.com"])
+        self.assertEqual(backend.host_urls("example.com", 1, 10), ["https://example.com/page2"])
+
+        backend.remove_urls(["https://example.com/page1"])
+        self.assertEqual(len(backend), 2)
+        self.assertEqual(list(backend), ["https://example.com/page2", "https://another.com/page1"])
+        backend.remove_urls(["https://another.com/page1"])
+        self.assertEqual(backend.get_hosts(), ["example.com"])
+        backend.add_urls(["https://another.com/page1"])
+        backend.commit()
+
+        # the committed state survives a restart
+        backend = create_backend(name, file)
+        self.assertTrue(backend.exists())
+        backend.read()
+        self.assertEqual(list(backend), ["https://example.com/page2", "https://another.com/page1"])
+        self.assertEqual(len(backend), 2)
+
+    def test_text_backend(self):
+        self.check_backend("text")
+
+    def test_sqlite_backend(self):
+        self.check_backend("sqlite")
+
+    def test_text_journal(self):
+        file = os.path.join(self.folder, "urls.txt")
+        backend = create_backend("text", file)
+        backend.min_compaction_size = 3
+        backend.add_urls(["https://example.com/page1", "https://example.com/page2"])
+        backend.commit()
+        checkpoint = open(file).read()
+
+        # later rounds only append their changes to the journal
+        backend.add_urls(["https://example.com/page3"])
+        backend.remove_urls(["https://example.com/page1"])
+        backend.commit()
+        self.assertEqual(open(file).read(), checkpoint)
+        self.assertEqual(open(file + ".journal").read(), "+https://example.com/page3\n-https://example.com/page1\n#commit\n")
+
+        # simulate a crash while the next round is written
+        with open(file + ".journal", "a") as f:
+            f.write("+https://example.com/page4\n+https://exa")
+
+        backend = create_backend("text", file)
+        backend.read()
+        self.assertEqual(list(backend), ["https://example.com/page2", "https://example.com/page3"])
+
+        # a journal that grows larger than the store is compacted into a new checkpoint
+        backend.min_compaction_size = 2
+        backend.compaction_ratio = 0.5
+        backend.add_urls(["https://example.com/page5"])
+        backend.commit()
+        self.assertFalse(os.path.exists(file + ".journal"))
+        self.assertEqual(open(file).read().split("\n"), list(backend))
+
+    def test_text_append_after_torn_write(self):
+        file = os.path.join(self.folder, "urls.txt")
+        backend = create_backend("text", file)
+        backend.add_urls(["https://example.com/page1"])
+        backend.commit()
+        backend.add_urls(["https://example.com/page2"])
+        backend.commit()
+        journal = open(file + ".journal").read()
+
+        # simulate a crash while the next round is written
+        with open(file + ".journal", "a") as f:
+            f.write("+https://a.com/crashed\n+https://exa")
+
+        # the uncommitted tail is cut off, so the next commit does not make it valid
+        backend = create_backend("text", file)
+        backend.read()
+        self.assertEqual(open(file + ".journal").read(), journal)
+        backend.add_urls(["https://a.com/next"])
+        backend.commit()
+
+        backend = create_backend("text", file)
+        backend.read()
+        self.assertEqual(list(backend), ["https://example.com/page1", "https://example.com/page2", "https://a.com/next"])
+
+    def test_sqlite_uncommitted_changes_are_lost(self):
+        file = os.path.join(self.folder, "urls.txt")
+        backend = create_backend("sqlite", file)
+        backend.add_urls(["https://example.com/page1"])
+        backend.commit()
+        backend.add_urls(["https://example.com/page2"])
+
+        # simulate a crash before the end of the round
+        backend.connection.rollback()
+        backend.connection.close()
+
+        backend = create_backend("sqlite", file)
+        self.assertEqual(list(backend), ["https://example.com/page1"])
+
+if __name__ == '__main__':
+    unittest.main()
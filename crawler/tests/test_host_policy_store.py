@@ -0,0 +1,136 @@
+"""
+Unit tests for the robots.txt files and the host health that several crawler processes share.
+
+Call it like this:
+
+python -m unittest tests.test_host_policy_store
+"""
+
+import os
+import time
+import unittest
+import multiprocessing
+from flask import Flask, Response, request
+from robochecks import RobotsChecker
+from scheduler import HostCircuitBreaker
+from tests.util import ServerThread, remove_sqlite
+
+STORE = "tests/assets/temp/host_policy_store.sqlite"
+
+def check_urls(urls, results):
+    rc = RobotsChecker(cache_file=STORE, shared=True)
+    can_fetch, cannot_fetch = rc.can_fetch_multiple_urls(urls, max_workers=4)
+    results.put((can_fetch, cannot_fetch))
+    rc.close()
+
+class TestHostPolicyStore(unittest.TestCase):
+
+    def setUp(self):
+        remove_sqlite(STORE)
+
+    def tearDown(self):
+        remove_sqlite(STORE)
+
+    def test_shared_robots_txt(self):
+        requests = multiprocessing.Manager().list()
+        app = Flask(__name__)
+
+        @app.route("/robots.txt")
+        def robots_txt():
+            requests.append(request.host)
+            time.sleep(0.5)
+            return Response("User-agent: *\nDisallow: /private\n", content_type="text/plain")
+
+        server = ServerThread(app, port=5019, threaded=True)
+        server.start()
+        try:
+            urls = [f"http://{host}:5019/{folder}/{i}.html"
+                for host in ["localhost", "127.0.0.1"] for folder in ["public", "private"] for i in range(5)]
+
+            # three crawler processes check the same hosts at the same time
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=check_urls, args=(urls, results)) for _ in range(3)]
+            for process in processes:
+                process.start()
+            for _ in processes:
+                can_fetch, cannot_fetch = results.get(timeout=30)
+                self.assertEqual(can_fetch, [url for url in urls if "/public/" in url])
+                self.assertEqual(cannot_fetch, [url for url in urls if "/private/" in url])
+            for process in processes:
+                process.join()
+
+            # each robots.txt was downloaded once
+            self.assertEqual(sorted(requests), ["127.0.0.1:5019", "localhost:5019"])
+
+            # a crawler that starts later finds the files in the store
+            rc = RobotsChecker(cache_file=STORE, shared=True)
+            self.assertEqual(rc.prefetch(urls), [])
+            self.assertFalse(rc.check_robots(urls[-1])["can_fetch"])
+            rc.close()
+            self.assertEqual(len(requests), 2)
+        finally:
+            server.shutdown()
+            server.join()
+
+    def test_shared_host_health(self):
+        a = HostCircuitBreaker("tests/assets/temp/host_health_a.json", threshold=2, max_suspension=200)
+        b = HostCircuitBreaker("tests/assets/temp/host_health_b.json", threshold=2, max_suspension=200)
+
+        # a suspends a host and finds another one dead
+        a.record("down.com", -1)
+        a.record("down.com", -1)
+        for _ in range(3):
+            a.suspend("nxdomain.com")
+        a.record("slow.com", -1)
+        a.sync(STORE)
+        self.assertTrue(a.is_suspended("down.com"))
+
+        # b learns about them, failures below the threshold are not shared
+        b.sync(STORE)
+        self.assertTrue(b.is_suspended("down.com"))
+        self.assertTrue(b.is_dead("nxdomain.com"))
+        self.assertEqual(b.dead_hosts(), ["nxdomain.com"])
+        self.assertFalse(b.is_suspended("slow.com"))
+
+        # a failure in b while the host is suspended does not change the suspension that a shared
+        b.record("down.com", -1)
+        b.sync(STORE)
+        a.sync(STORE)
+        self.assertEqual(a.hosts["down.com"]["trips"], 1)
+        self.assertTrue(a.is_suspended("down.com"))
+
+        # a failure after the suspension suspends the host longer for everyone
+        b.hosts["down.com"]["suspended_until"] = time.time() - 1
+        b.record("down.com", -1)
+        b.sync(STORE)
+        a.sync(STORE)
+        self.assertEqual(a.hosts["down.com"]["trips"], 2)
+
+        # a host that answers again is removed for everyone, also for the processes that knew it
+        b.record("nxdomain.com", 200)
+        b.sync(STORE)
+        self.assertFalse(b.is_dead("nxdomain.com"))
+        a.sync(STORE)
+        self.assertFalse(a.is_dead("nxdomain.com"))
+        self.assertEqual(a.dead_hosts(), [])
+        fresh = HostCircuitBreaker("tests/assets/temp/host_health_c.json")
+        fresh.sync(STORE)
+        self.assertFalse(fresh.is_dead("nxdomain.com"))
+        self.assertTrue(fresh.is_suspended("down.com"))
+
+        a.record("down.com", 200)
+        a.sync(STORE)
+        b.sync(STORE)
+        self.assertFalse(a.is_suspended("down.com"))
+        self.assertFalse(b.is_suspended("down.com"))
+
+        # failures after the recovery are shared again
+        for _ in range(3):
+            b.suspend("nxdomain.com")
+        b.sync(STORE)
+        a.sync(STORE)
+        self.assertTrue(a.is_dead("nxdomain.com"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+Unit tests for the pool of HTTP sessions.
+
+Call it like this:
+
+python -m unittest tests.test_http_session
+"""
+
+import os
+import unittest
+from werkzeug.serving import WSGIRequestHandler
+from http_session import SessionPool
+from tests.util import ServerThread
+
+class TestHTTPSession(unittest.TestCase):
+
+    def setUp(self):
+        # the flask development server closes every connection unless it speaks HTTP/1.1
+        self.protocol_version = WSGIRequestHandler.protocol_version
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"
+        self.server, self.port = ServerThread.setup(os.path.join(os.path.dirname(__file__), "assets/books.toscrape.com"), port=5004)
+        self.url = f"http://localhost:{self.port}/index.html"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.join()
+        WSGIRequestHandler.protocol_version = self.protocol_version
+
+    def test_connection_reuse(self):
+        session_pool = SessionPool()
+        for _ in range(10):
+            self.assertEqual(session_pool.get(self.url, timeout=5).status_code, 200)
+
+        self.assertEqual(session_pool.stats(), {"requests": 10, "connections": 1, "reused": 9})
+
+        # the counts of closed sessions are kept
+        session_pool.close()
+        self.assertEqual(session_pool.stats(), {"requests": 10, "connections": 1, "reused": 9})
+        session_pool.get(self.url, timeout=5)
+        self.assertEqual(session_pool.stats()["connections"], 2)
+
+    def test_idle_timeout(self):
+        session_pool = SessionPool(idle_timeout=-1)
+        for _ in range(3):
+            session_pool.get(self.url, timeout=5)
+        self.assertEqual(session_pool.stats()["connections"], 3)
+
+    def test_limits(self):
+        session_pool = SessionPool(max_hosts=2, max_sessions_per_host=1)
+        with session_pool.session("https://a.com/1") as s1, session_pool.session("https://a.com/2") as s2:
+            self.assertIsNot(s1, s2)
+        session_pool.checkin("b.com", session_pool.checkout("b.com"))
+        session_pool.checkin("c.com", session_pool.checkout("c.com"))
+
+        # a.com was used least recently
+        self.assertEqual(list(session_pool.idle_sessions.keys()), ["b.com", "c.com"])
+        self.assertEqual(len(session_pool.idle_sessions["c.com"]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Check that the download engines keep the slots and crawl delays of the per-host rate limiter against
+several local servers.
+
+Call it like this:
+
+python -m unittest tests.test_rate_limiter
+"""
+
+import os
+import time
+import shutil
+import logging
+import unittest
+from collections import defaultdict
+from flask import Flask, request
+from tests.util import ServerThread, create_html_store
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/rate_limiter"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+        # each port is a different host for the crawler
+        self.request_times = defaultdict(list)
+        app = Flask(__name__)
+
+        @app.route("/<page>")
+        def page(page):
+            self.request_times[request.host].append(time.time())
+            return f"<html><body>{page}</body></html>"
+
+        @app.route("/slow/<page>")
+        def slow_page(page):
+            self.request_times[request.host].append(time.time())
+            time.sleep(0.2)
+            return f"<html><body>{page}</body></html>"
+
+        self.ports = [5010, 5011, 5012, 5013]
+        self.servers = [ServerThread(app, port=port) for port in self.ports]
+        # a host that answers several requests at the same time
+        self.servers.append(ServerThread(app, port=5014, threaded=True))
+        for server in self.servers:
+            server.start()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    # record the slots that the engine takes from the rate limiter and when they may be used again
+    def record_slots(self, limiter):
+        events = defaultdict(list)
+        acquire, release = limiter.acquire, limiter.release
+
+        def record_acquire(host):
+            acquire(host)
+            events[host].append(("acquire", limiter.clock(), limiter.in_flight[host], limiter.get_slots(host)))
+
+        def record_release(host, *args, **kwargs):
+            release(host, *args, **kwargs)
+            events[host].append(("release", limiter.next_fetch_times[host][-1]))
+
+        limiter.acquire, limiter.release = record_acquire, record_release
+        return events
+
+    def check_engine(self, engine, max_wait_time_calls=None):
+        pages_per_host = 3
+        html_store = create_html_store(os.path.join(self.folder, engine), crawl_delay=1, download_engine=engine)
+        events = self.record_slots(html_store.rate_limiter)
+
+        # count how often the engine asks for the wait time of a host
+        wait_time_calls = []
+        wait_time = html_store.rate_limiter.wait_time
+        def count_wait_time(host):
+            wait_time_calls.append(host)
+            return wait_time(host)
+        html_store.rate_limiter.wait_time = count_wait_time
+
+        urls = [f"http://localhost:{port}/page{i}" for i in range(pages_per_host) for port in self.ports]
+        start_time = time.time()
+        html_store.download_urls(urls)
+        logging.info(f"{engine}: {len(urls) / (time.time() - start_time):.1f} requests per second")
+        self.assertEqual(sum(len(times) for times in self.request_times.values()), len(urls))
+
+        # every host has one slot, a download only starts when the crawl delay after the previous one passed
+        self.assertEqual(len(events), len(self.ports))
+        for host_events in events.values():
+            self.assertEqual([event[0] for event in host_events], ["acquire", "release"] * pages_per_host)
+            for acquired, released, next_acquired in zip(host_events[0::2], host_events[1::2], host_events[2::2]):
+                self.assertEqual(acquired[2], 1)
+                self.assertGreaterEqual(next_acquired[1], released[1])
+
+        if max_wait_time_calls is not None:
+            self.assertLessEqual(len(wait_time_calls), max_wait_time_calls)
+
+    def check_host_concurrency(self, engine, adaptive=False):
+        html_store = create_html_store(os.path.join(self.folder, engine),
+            host_concurrency=4, adaptive_concurrency=adaptive, download_engine=engine)
+        events = self.record_slots(html_store.rate_limiter)
+
+        # 8 pages of a single host that need 0.2 seconds each
+        urls = [f"http://localhost:5014/slow/page{i}" for i in range(8)]
+        start_time = time.time()
+        html_store.download_urls(urls)
+        logging.info(f"{engine}: {len(urls) / (time.time() - start_time):.1f} requests per second with 4 connections per host")
+        self.assertEqual(len(self.request_times["localhost:5014"]), 8)
+
+        # the downloads never take more slots than the host has, the adaptive rate limiter starts with one
+        # slot and adds more after fast responses
+        acquired = [event for event in events["localhost:5014"] if event[0] == "acquire"]
+        self.assertEqual(len(acquired), 8)
+        self.assertTrue(all(in_flight <= slots for _, _, in_flight, slots in acquired))
+        if adaptive:
+            self.assertEqual(acquired[0][2], 1)
+            self.assertGreater(max(in_flight for _, _, in_flight, _ in acquired), 1)
+        else:
+            self.assertEqual(max(in_flight for _, _, in_flight, _ in acquired), 4)
+
+    def test_host_concurrency(self):
+        for engine in ["threads", "stream", "asyncio"]:
+            self.request_times.clear()
+            self.check_host_concurrency(engine)
+
+    def test_adaptive_asyncio(self):
+        # the host starts with one slot, the other tasks of the host wait until a slot is released
+        self.check_host_concurrency("asyncio", adaptive=True)
+
+    def test_threads(self):
+        self.check_engine("threads")
+
+    def test_stream(self):
+        self.check_engine("stream")
+
+    def test_asyncio(self):
+        # the tasks sleep until the host is ready instead of checking it again and again
+        self.check_engine("asyncio", max_wait_time_calls=2 * 3 * 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Unit tests for the records of downloaded urls and their outputs.
+
+Call it like this:
+
+python -m unittest tests.test_records
+"""
+
+import os
+import json
+import shutil
+import unittest
+from flask import Flask, Response
+from warcio.archiveiterator import ArchiveIterator
+from records import FetchResult, dumps
+from tests.util import ServerThread, create_html_store
+
+class TestRecords(unittest.TestCase):
+
+    def test_dumps(self):
+        data = {"url": "https://a.com", "status": 200, "html": "Murakaza neza ça va \U0001f600"}
+        self.assertEqual(json.loads(dumps(data)), data)
+
+        # lone surrogates are escaped like json.dumps does
+        data["html"] = "broken \ud800"
+        self.assertEqual(json.loads(dumps(data)), data)
+
+        result = FetchResult("https://a.com", {"url": "https://a.com", "status": -1, "error": "timeout"}, retry_after=5)
+        self.assertEqual(result.status, -1)
+        self.assertFalse(result.contains_body)
+        self.assertEqual(json.loads(result.to_json())["error"], "timeout")
+
+    def test_outputs(self):
+        folder = "tests/assets/temp/records"
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+
+        body = "<html><body>Grüße</body></html>".encode("iso-8859-1")
+        app = Flask(__name__)
+
+        @app.route("/page")
+        def page():
+            return Response(body, content_type="text/html; charset=iso-8859-1")
+
+        server = ServerThread(app, port=5017)
+        server.start()
+        try:
+            for engine in ["threads", "asyncio"]:
+                output_folder = os.path.join(folder, engine)
+                html_store = create_html_store(output_folder, warc_output=True, download_engine=engine)
+                html_store.download_urls(["http://localhost:5017/page"])
+                html_store.close()
+
+                with open(os.path.join(output_folder, "00001.json"), encoding="utf-8") as f:
+                    self.assertEqual(json.loads(f.readline())["html"], "<html><body>Grüße</body></html>")
+
+                # the warc output contains the body as it was downloaded
+                with open(os.path.join(output_folder, "warc", "00001.warc.gz"), "rb") as f:
+                    records = [(record.rec_headers.get_header("WARC-Target-URI"), record.content_stream().read())
+                        for record in ArchiveIterator(f) if record.rec_type == "response"]
+                self.assertEqual(records, [("http://localhost:5017/page", body)])
+        finally:
+            server.shutdown()
+            server.join()
+            shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Unit tests for recrawling with etags, last-modified headers and content hashes.
+
+Call it like this:
+
+python -m unittest tests.test_recrawl
+"""
+
+import os
+import json
+import shutil
+import unittest
+from flask import Flask, Response, request
+from tests.util import ServerThread, create_html_store
+
+class TestRecrawl(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/recrawl"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+        self.version = 1
+        self.if_none_match = []
+        app = Flask(__name__)
+
+        # etags are case sensitive
+        @app.route("/etag")
+        def etag():
+            self.if_none_match.append(request.headers.get("If-None-Match"))
+            if request.headers.get("If-None-Match") == '"AbC"':
+                return Response(status=304)
+            return Response("<html><body>etag</body></html>", headers={"ETag": '"AbC"'})
+
+        # the same body without any validators
+        @app.route("/same")
+        def same():
+            return "<html><body>same</body></html>"
+
+        @app.route("/changed")
+        def changed():
+            return f"<html><body>version {self.version}</body></html>"
+
+        self.server = ServerThread(app, port=5007)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def crawl(self, engine, name, recrawl_from=None):
+        output_folder = os.path.join(self.folder, engine, name)
+        html_store = create_html_store(output_folder, download_engine=engine)
+        if recrawl_from is not None:
+            html_store.validators.copy_from(os.path.join(recrawl_from, "validators.sqlite"))
+        html_store.download_urls([f"http://localhost:5007/{page}" for page in ["etag", "same", "changed"]])
+        html_store.validators.commit()
+        html_store.close()
+
+        with open(os.path.join(output_folder, "00001.json")) as f:
+            rows = {row["url"].split("/")[-1]: row for row in map(json.loads, f)}
+        return output_folder, rows, html_store
+
+    def test_recrawl(self):
+        for engine in ["threads", "asyncio"]:
+            self.version = 1
+            self.if_none_match.clear()
+            folder, rows, _ = self.crawl(engine, "crawl1")
+            self.assertTrue(all("html" in row for row in rows.values()))
+            self.assertTrue(all("not_modified" not in row for row in rows.values()))
+
+            self.version = 2
+            _, rows, html_store = self.crawl(engine, "crawl2", recrawl_from=folder)
+            self.assertEqual(self.if_none_match, [None, '"AbC"'])
+
+            self.assertEqual(rows["etag"]["status"], 304)
+            self.assertTrue(rows["etag"]["not_modified"])
+            self.assertEqual(rows["same"]["status"], 200)
+            self.assertTrue(rows["same"]["not_modified"])
+            self.assertNotIn("html", rows["same"])
+            self.assertEqual(rows["changed"]["html"], "<html><body>version 2</body></html>")
+            self.assertNotIn("not_modified", rows["changed"])
+            self.assertEqual(html_store.download_stats.not_modified, 2)
+            # the pages that did not change are not counted for the yield of their host again
+            self.assertEqual(sorted(html_store.not_modified_urls), ["http://localhost:5007/etag", "http://localhost:5007/same"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Unit tests for retrying urls that failed temporarily.
+
+Call it like this:
+
+python -m unittest tests.test_retry
+"""
+
+import os
+import time
+import shutil
+import unittest
+from email.utils import formatdate
+from flask import Flask, Response
+from retry import RetryQueue, is_retryable, parse_retry_after
+from tests.util import ServerThread, create_html_store
+
+class TestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/retry"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertAlmostEqual(parse_retry_after(formatdate(time.time() + 60, usegmt=True)), 60, delta=2)
+        self.assertEqual(parse_retry_after(formatdate(time.time() - 60, usegmt=True)), 0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+        self.assertTrue(is_retryable(429))
+        self.assertTrue(is_retryable(-1))
+        self.assertFalse(is_retryable(404))
+
+    def test_retry_queue(self):
+        queue = RetryQueue(os.path.join(self.folder, "retry_queue.json"), max_attempts=3, base_delay=10, max_delay=15)
+        now = time.time()
+
+        # the backoff with jitter is between half and the full delay
+        self.assertTrue(queue.schedule("https://a.com/1"))
+        self.assertTrue(now + 5 <= queue.urls["https://a.com/1"]["next_time"] <= time.time() + 10)
+        self.assertTrue(queue.schedule("https://a.com/1"))
+        self.assertTrue(now + 7.5 <= queue.urls["https://a.com/1"]["next_time"] <= time.time() + 15)
+        self.assertFalse(queue.schedule("https://a.com/1"))
+        self.assertNotIn("https://a.com/1", queue)
+
+        # Retry-After is used instead of the backoff
+        queue.schedule("https://a.com/2", retry_after=0)
+        queue.schedule("https://b.com/1", retry_after=0)
+        queue.schedule("https://c.com/1", retry_after=100)
+        self.assertEqual(queue.due(10), ["https://a.com/2", "https://b.com/1"])
+        self.assertEqual(queue.due(10, is_suspended=lambda host: host == "a.com"), ["https://b.com/1"])
+        self.assertEqual(queue.due(1), ["https://a.com/2"])
+
+        queue.postpone("https://b.com/1", time.time() + 50)
+        self.assertEqual(queue.due(10), ["https://a.com/2"])
+        queue.remove("https://a.com/2")
+        self.assertAlmostEqual(queue.next_due_time() - time.time(), 50, delta=1)
+
+        os.makedirs(self.folder)
+        queue.write2file()
+        queue2 = RetryQueue(queue.file)
+        queue2.read()
+        self.assertEqual(queue2.urls, queue.urls)
+        self.assertEqual(queue2.remove_host("b.com"), 1)
+        self.assertEqual(len(queue2), 1)
+
+    def test_download(self):
+        app = Flask(__name__)
+
+        @app.route("/busy")
+        def busy():
+            return Response("busy", status=503, headers={"Retry-After": "3"})
+
+        @app.route("/ok")
+        def ok():
+            return "<html><body>ok</body></html>"
+
+        server = ServerThread(app, port=5015)
+        server.start()
+        try:
+            for engine in ["threads", "asyncio"]:
+                html_store = create_html_store(os.path.join(self.folder, engine), max_crawl_delay=2, download_engine=engine)
+                html_store.download_urls(["http://localhost:5015/ok", "http://localhost:5015/busy", "http://localhost:1/down"])
+                html_store.close()
+
+                self.assertEqual(sorted(html_store.failed_urls),
+                    [("http://localhost:1/down", None), ("http://localhost:5015/busy", 3)])
+
+                # the host waits for the Retry-After header, but at most max_crawl_delay seconds
+                wait_time = html_store.rate_limiter.wait_time("localhost:5015")
+                self.assertTrue(0 < wait_time <= 2)
+        finally:
+            server.shutdown()
+            server.join()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,15 +5,21 @@ Unit tests for robochecker. Call it like this:
 python -m unittest tests.test_robochecker
 """
 
-from flask import Flask, send_from_directory
+from flask import Flask, Response, send_from_directory, request as flask_request
 import os
 import unittest
+import unittest.mock
+import pickle
+import time
+from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 from extract_text import HTML2Text
 import threading
 from werkzeug.serving import make_server
 import json
 from robochecks import RobotsCache, RobotsChecker
+from tests import util
+from tests.util import remove_sqlite
 
 import logging
 logging.basicConfig(level=logging.WARNING)
@@ -49,9 +55,9 @@ class TestRobochecker(unittest.TestCase):
         self.server.start()
 
 
-        cache_file = "tests/assets/temp/robots_cache.pkl"
-        if os.path.exists(cache_file):
-            os.remove(cache_file)
+        cache_file = "tests/assets/temp/robots_cache.sqlite"
+        remove_sqlite(cache_file)
+        self.addCleanup(remove_sqlite, cache_file)
 
         rc = RobotsChecker(cache_file=cache_file)
 
@@ -82,6 +88,7 @@ class TestRobochecker(unittest.TestCase):
         self.assertIsNotNone(rc.cache.get_robots_txt(cache_key))
 
         # test that the cache is still populated after restart
+        rc.close()
         rc = RobotsChecker(cache_file=cache_file)
         self.assertIsNotNone(rc.cache.get_robots_txt(cache_key))
 
@@ -96,12 +103,160 @@ class TestRobochecker(unittest.TestCase):
         self.server.shutdown()
         self.server.join()
 
+    def test_policy_cache(self):
+        cache_file = "tests/assets/temp/robots_cache_policies.sqlite"
+        remove_sqlite(cache_file)
+        self.addCleanup(remove_sqlite, cache_file)
+
+        rc = RobotsChecker(cache_file=cache_file, max_policies=2)
+        domain = "http://example.com"
+        rc.cache.set_robots_txt(domain, "User-agent: *\nDisallow: /private\nCrawl-delay: 3\n")
+
+        # the robots.txt is parsed once for all urls of the domain
+        self.assertFalse(rc.check_robots(f"{domain}/private/a.html")["can_fetch"])
+        self.assertTrue(rc.check_robots(f"{domain}/public/a.html")["can_fetch"])
+        self.assertEqual(rc.get_crawl_sleep_delay(f"{domain}/public/a.html"), 3)
+        policy = rc.get_policy(f"{domain}/b.html")
+        self.assertIs(rc.get_policy(f"{domain}/c.html"), policy)
+
+        # a new robots.txt replaces the parsed one
+        rc.cache.set_robots_txt(domain, "User-agent: *\nDisallow: /public\n")
+        self.assertTrue(rc.check_robots(f"{domain}/private/a.html")["can_fetch"])
+        self.assertFalse(rc.check_robots(f"{domain}/public/a.html")["can_fetch"])
+        self.assertIsNone(rc.get_crawl_sleep_delay(f"{domain}/public/a.html"))
+        self.assertIsNot(rc.get_policy(f"{domain}/b.html"), policy)
+
+        # an expired robots.txt is fetched and parsed again
+        rc.cache.cache[domain] = (rc.cache.cache[domain][0], time.time() - 1)
+        fetched = []
+        def fetch(robots_url, session_pool=None):
+            fetched.append(robots_url)
+            return "User-agent: *\nDisallow: /\n"
+        with unittest.mock.patch.object(RobotsChecker, "fetch_robots_txt", staticmethod(fetch)):
+            self.assertFalse(rc.check_robots(f"{domain}/public/a.html")["can_fetch"])
+            self.assertFalse(rc.check_robots(f"{domain}/private/a.html")["can_fetch"])
+        self.assertEqual(fetched, [f"{domain}/robots.txt"])
+
+        # only the most recently used policies are kept
+        for i in range(3):
+            rc.cache.set_robots_txt(f"http://host{i}.com", "User-agent: *\nDisallow: /\n")
+            rc.check_robots(f"http://host{i}.com/index.html")
+        self.assertEqual(list(rc.policies.keys()), ["http://host1.com", "http://host2.com"])
+
+    def test_write_behind(self):
+        cache_file = "tests/assets/temp/robots_cache_write_behind.sqlite"
+        remove_sqlite(cache_file)
+        self.addCleanup(remove_sqlite, cache_file)
+
+        cache = RobotsCache(cache_file, flush_size=3, flush_interval=3600)
+        cache.set_robots_txt("http://a.com/index.html", "User-agent: *\nDisallow: /a\n")
+        cache.set_robots_txt("http://b.com", RobotsChecker.RobotsTxtDoesNotExist)
+        self.assertEqual(cache.get_robots_txt("http://a.com/other.html"), "User-agent: *\nDisallow: /a\n")
+
+        # the files are not written before flush_size files changed, a crash loses them
+        crashed = RobotsCache(cache_file)
+        self.assertFalse(crashed.in_cache("http://a.com"))
+        crashed.close()
+
+        # per-entry ttl
+        cache.set_robots_txt("http://c.com", "User-agent: *\nDisallow: /c\n", ttl=-1)
+        self.assertEqual(len(cache.pending), 0)
+        self.assertTrue(cache.in_cache("http://c.com"))
+        self.assertIsNone(cache.get_robots_txt("http://c.com"))
+
+        # the files are read from the cache file when they are used
+        restarted = RobotsCache(cache_file)
+        self.assertEqual(restarted.cache, {})
+        self.assertEqual(restarted.get_robots_txt("http://b.com"), RobotsChecker.RobotsTxtDoesNotExist)
+        self.assertIsNone(restarted.get_robots_txt("http://d.com"))
+        self.assertEqual(list(restarted.cache.keys()), ["http://b.com"])
+        # expired files are deleted when the cache file is opened
+        self.assertEqual(len(restarted), 2)
+        restarted.close()
+
+        # close writes the remaining files
+        cache.set_robots_txt("http://d.com", "User-agent: *\nDisallow: /d\n")
+        cache.close()
+        restarted = RobotsCache(cache_file)
+        self.assertEqual(restarted.get_robots_txt("http://d.com"), "User-agent: *\nDisallow: /d\n")
+        restarted.close()
+
+    def test_import_pickle(self):
+        cache_file = "tests/assets/temp/robots_cache_import.sqlite"
+        pickle_file = "tests/assets/temp/robots_cache_import.pkl"
+        remove_sqlite(cache_file)
+        self.addCleanup(remove_sqlite, cache_file)
+        if os.path.exists(pickle_file + ".imported"):
+            os.remove(pickle_file + ".imported")
+        self.addCleanup(os.remove, pickle_file + ".imported")
+
+        # the cache of a crawl that was started before the cache was stored in SQLite
+        with open(pickle_file, "wb") as f:
+            pickle.dump({
+                "http://a.com": ("User-agent: *\nDisallow: /a\n", datetime.now()),
+                "http://b.com": ("User-agent: *\nDisallow: /b\n", datetime.now() - timedelta(days=2)),
+            }, f)
+
+        cache = RobotsCache(cache_file)
+        self.assertEqual(cache.get_robots_txt("http://a.com"), "User-agent: *\nDisallow: /a\n")
+        self.assertIsNone(cache.get_robots_txt("http://b.com"))
+        self.assertFalse(os.path.exists(pickle_file))
+        cache.close()
+
+    def test_prefetch(self):
+        requests = []
+        app = Flask(__name__)
+
+        @app.route("/robots.txt")
+        def robots_txt():
+            requests.append(flask_request.host)
+            time.sleep(0.5)
+            return Response("User-agent: *\nDisallow: /private\n", content_type="text/plain")
+
+        @app.route("/<path:path>")
+        def page(path):
+            requests.append(flask_request.path)
+            return "page"
+
+        server = util.ServerThread(app, port=5018, threaded=True)
+        server.start()
+        try:
+            cache_file = "tests/assets/temp/robots_cache_prefetch.sqlite"
+            remove_sqlite(cache_file)
+            self.addCleanup(remove_sqlite, cache_file)
+            rc = RobotsChecker(cache_file=cache_file)
+
+            # two origins with many urls each
+            urls = [f"http://{host}:5018/{folder}/{i}.html"
+                for host in ["localhost", "127.0.0.1"] for folder in ["public", "private"] for i in range(10)]
+
+            # the downloads run in the background
+            start_time = time.time()
+            futures = rc.prefetch(urls, max_workers=4)
+            self.assertLess(time.time() - start_time, 0.4)
+            self.assertEqual(len(futures), 2)
+
+            # a robots.txt that is being downloaded is not downloaded again
+            self.assertEqual(rc.get_crawl_sleep_delay(urls[0]), None)
+            can_fetch, cannot_fetch = rc.can_fetch_multiple_urls(urls, max_workers=4)
+            self.assertLess(time.time() - start_time, 0.9)
+            self.assertEqual(can_fetch, [url for url in urls if "/public/" in url])
+            self.assertEqual(cannot_fetch, [url for url in urls if "/private/" in url])
+
+            # one request per origin for robots.txt, and none for the pages
+            self.assertEqual(sorted(requests), ["127.0.0.1:5018", "localhost:5018"])
+            self.assertEqual(rc.prefetch(urls), [])
+            rc.close()
+        finally:
+            server.shutdown()
+            server.join()
+
     @unittest.skip("This test is for debugging only")
     def test_parallel_download(self): 
         
-        cache_file = "tests/assets/temp/robots_cache.pkl"
-        if os.path.exists(cache_file):
-            os.remove(cache_file)
+        cache_file = "tests/assets/temp/robots_cache.sqlite"
+        remove_sqlite(cache_file)
+        self.addCleanup(remove_sqlite, cache_file)
 
         rc = RobotsChecker(cache_file=cache_file)
         urls = ['https://umuryango.rw/imyidagaduro/imikino/article/chelsea-ishobora-gufatirwa-ibihano-bikomeye-na-fifa', 
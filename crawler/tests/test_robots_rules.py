@@ -0,0 +1,150 @@
+"""
+Unit tests for the compiled robots.txt rules. Call it like this:
+
+python -m unittest tests.test_robots_rules
+"""
+
+import os
+import unittest
+import urllib.robotparser
+
+from robochecks import RobotsChecker
+from robots_rules import RobotsRules, url_path
+from tests.util import remove_sqlite
+
+class TestRobotsRules(unittest.TestCase):
+
+    def test_fixture(self):
+        with open(os.path.join(os.path.dirname(__file__), "assets/robochecker/robots.txt")) as f:
+            robots_txt = f.read()
+        rules = RobotsRules(robots_txt)
+        rp = urllib.robotparser.RobotFileParser()
+        rp.parse(robots_txt.splitlines())
+
+        # the same results as urllib.robotparser for rules without wildcards
+        domain = "http://localhost:5000"
+        urls = [f"{domain}/", f"{domain}/index.html", f"{domain}/no-crawl", f"{domain}/no-crawl/test.html",
+            f"{domain}/no-crawling.html", f"{domain}/index.html?page=no-crawl", f"{domain}/a/no-crawl/b.html"]
+        for user_agent in ["Crawlzilla-1.0", "Crawlzilla-0.5", "Crawlzilla-0.5/1.0", "Crawlzilla/1.0", "Mozilla/5.0"]:
+            for url in urls:
+                self.assertEqual(rules.can_fetch(url, user_agent), rp.can_fetch(user_agent, url), (user_agent, url))
+            self.assertEqual(rules.crawl_delay(user_agent), rp.crawl_delay(user_agent))
+
+        # all paths of a host in one call
+        paths = [url_path(url) for url in urls]
+        self.assertEqual(rules.can_fetch_paths(paths, "Crawlzilla-1.0"),
+            [True, True, False, False, False, True, True])
+        self.assertEqual(rules.can_fetch_paths(paths, "Crawlzilla-0.5"), [False] * len(urls))
+
+    def test_wildcards(self):
+        rules = RobotsRules("\n".join([
+            "User-agent: *",
+            "Disallow: /*.pdf$",
+            "Disallow: /search*q=",
+            "Allow: /search/about$",
+            "Disallow: /tmp*",
+            "Disallow: /private$",
+        ]))
+        expected = {
+            "/report.pdf": False,
+            "/files/report.pdf": False,
+            "/report.pdf?download=1": True,
+            "/report.pdfx": True,
+            "/search?q=crawler": False,
+            "/search/advanced?lang=rw&q=crawler": False,
+            "/search/about": True,
+            "/search/about/team": True,
+            "/tmp": False,
+            "/tmp/a.html": False,
+            "/private": False,
+            "/private/a.html": True,
+        }
+        for path, can_fetch in expected.items():
+            self.assertEqual(rules.can_fetch("https://example.com" + path, "Crawlzilla/1.0"), can_fetch, path)
+
+    def test_longest_match(self):
+        # the longest matching rule decides, independent of the order of the rules
+        for lines in [["Disallow: /folder", "Allow: /folder/page"], ["Allow: /folder/page", "Disallow: /folder"]]:
+            rules = RobotsRules("\n".join(["User-agent: *"] + lines))
+            self.assertFalse(rules.can_fetch("https://example.com/folder/other.html", "Crawlzilla"))
+            self.assertTrue(rules.can_fetch("https://example.com/folder/page.html", "Crawlzilla"))
+
+        # allow wins if an allow and a disallow rule are equally long
+        rules = RobotsRules("User-agent: *\nDisallow: /page\nAllow: /page\nDisallow: /*.html\nAllow: /a*.html")
+        self.assertTrue(rules.can_fetch("https://example.com/page", "Crawlzilla"))
+        self.assertTrue(rules.can_fetch("https://example.com/ab.html", "Crawlzilla"))
+        self.assertFalse(rules.can_fetch("https://example.com/b.html", "Crawlzilla"))
+
+        # a longer wildcard rule wins over a shorter prefix
+        rules = RobotsRules("User-agent: *\nAllow: /\nDisallow: /*/edit")
+        self.assertFalse(rules.can_fetch("https://example.com/page/edit", "Crawlzilla"))
+        self.assertTrue(rules.can_fetch("https://example.com/page/view", "Crawlzilla"))
+
+    def test_groups(self):
+        rules = RobotsRules("\n".join([
+            "Disallow: /rules-before-user-agent",
+            "User-agent: Googlebot",
+            "User-agent: crawlzilla",
+            "Disallow: /a",
+            "",
+            "User-agent: *",
+            "Disallow: /",
+            "Crawl-delay: 10",
+            "",
+            "User-agent: Crawlzilla",
+            "Disallow: /b",
+            "Crawl-delay: 2.5",
+            "",
+            "User-agent:",
+            "Disallow: /c",
+        ]))
+        # the groups that name the crawler are merged, the * group does not apply to it
+        self.assertFalse(rules.can_fetch("https://example.com/a", "Crawlzilla/1.0"))
+        self.assertFalse(rules.can_fetch("https://example.com/b", "Crawlzilla/1.0"))
+        self.assertTrue(rules.can_fetch("https://example.com/c", "Crawlzilla/1.0"))
+        self.assertTrue(rules.can_fetch("https://example.com/rules-before-user-agent", "Crawlzilla/1.0"))
+        self.assertEqual(rules.crawl_delay("Crawlzilla/1.0"), 2)
+
+        self.assertTrue(rules.can_fetch("https://example.com/b", "Googlebot/2.1"))
+        self.assertFalse(rules.can_fetch("https://example.com/b", "Otherbot"))
+        self.assertEqual(rules.crawl_delay("Otherbot"), 10)
+
+        # no rules at all
+        rules = RobotsRules("")
+        self.assertTrue(rules.can_fetch("https://example.com/", "Crawlzilla"))
+        self.assertIsNone(rules.crawl_delay("Crawlzilla"))
+
+    def test_percent_encoding(self):
+        rules = RobotsRules("User-agent: *\nDisallow: /%7Ejoe/\nDisallow: /caf%C3%A9\nDisallow: /a%2fb")
+        self.assertFalse(rules.can_fetch("https://example.com/~joe/index.html", "Crawlzilla"))
+        self.assertFalse(rules.can_fetch("https://example.com/%7ejoe/index.html", "Crawlzilla"))
+        self.assertFalse(rules.can_fetch("https://example.com/café/menu.html", "Crawlzilla"))
+        self.assertFalse(rules.can_fetch("https://example.com/a/b", "Crawlzilla"))
+        self.assertTrue(rules.can_fetch("https://example.com/joe/index.html", "Crawlzilla"))
+
+    def test_can_fetch_multiple_urls(self):
+        cache_file = "tests/assets/temp/robots_cache_rules.sqlite"
+        remove_sqlite(cache_file)
+        self.addCleanup(remove_sqlite, cache_file)
+
+        rc = RobotsChecker(cache_file=cache_file)
+        with open(os.path.join(os.path.dirname(__file__), "assets/robochecker/robots.txt")) as f:
+            rc.cache.set_robots_txt("http://a.example.com", f.read())
+        rc.cache.set_robots_txt("http://b.example.com", "User-agent: *\nDisallow: /*.pdf$")
+        rc.cache.set_robots_txt("http://c.example.com", RobotsChecker.RobotsTxtDoesNotExist)
+
+        urls = ["http://a.example.com/index.html", "http://b.example.com/a.pdf", "http://a.example.com/no-crawl/test.html",
+            "http://c.example.com/no-crawl/test.html", "http://b.example.com/a.html"]
+        can_fetch, cannot_fetch = rc.can_fetch_multiple_urls(urls, "Crawlzilla-1.0")
+        self.assertEqual(can_fetch, [urls[0], urls[3], urls[4]])
+        self.assertEqual(cannot_fetch, [urls[1], urls[2]])
+
+        # the same results as checking one url at a time
+        for url in urls:
+            self.assertEqual(rc.check_robots(url, "Crawlzilla-1.0")["can_fetch"], url in can_fetch)
+        can_fetch, cannot_fetch = rc.can_fetch_multiple_urls(urls, "Crawlzilla-0.5")
+        self.assertEqual(can_fetch, [urls[3], urls[4]])
+
+
+if __name__ == '__main__':
+    unittest.main()
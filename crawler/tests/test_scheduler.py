@@ -0,0 +1,237 @@
+"""
+Unit tests for the politeness scheduler.
+
+Call it like this:
+
+python -m unittest tests.test_scheduler
+"""
+
+import os
+import json
+import time
+import shutil
+import unittest
+from crawler import CrawlerConfig, HTMLStore, Crawler, URLs2Download, DownloadedURLs
+from frontier import TextURLBackend, get_host
+from scheduler import HostScheduler, HostYieldTracker, HostRateLimiter, HostCircuitBreaker
+from seeds import SeedLoader
+
+class TestScheduler(unittest.TestCase):
+
+    def create_frontier(self):
+        # one host dominates the frontier, the other hosts have a single url each
+        frontier = TextURLBackend("unused.txt")
+        frontier.add_urls([f"https://big.com/page{i}" for i in range(1000)])
+        frontier.add_urls([f"https://small{i}.com/page" for i in range(50)])
+        return frontier
+
+    def test_all_hosts_in_batch(self):
+        scheduler = HostScheduler(crawl_delay=1)
+        batch = scheduler.get_batch(self.create_frontier(), 51)
+
+        # every host gets a url before any host gets a second one
+        self.assertEqual(len(batch), 51)
+        self.assertEqual(len({get_host(url) for url in batch}), 51)
+
+    def test_batch_is_filled(self):
+        scheduler = HostScheduler(crawl_delay=1)
+        batch = scheduler.get_batch(self.create_frontier(), 500)
+        self.assertEqual(len(batch), 500)
+        self.assertEqual(len(set(batch)), 500)
+
+    def test_crawl_delay(self):
+        frontier = TextURLBackend("unused.txt")
+        frontier.add_urls([f"https://slow.com/page{i}" for i in range(100)])
+        frontier.add_urls([f"https://fast.com/page{i}" for i in range(100)])
+
+        scheduler = HostScheduler(crawl_delay=1, get_crawl_delay=lambda url: 5 if "slow.com" in url else None)
+        batch = scheduler.get_batch(frontier, 60)
+
+        hosts = [get_host(url) for url in batch]
+        self.assertEqual(hosts.count("slow.com"), 10)
+        self.assertEqual(hosts.count("fast.com"), 50)
+
+        # hosts that were scheduled in the previous batch wait for their turn, a new host comes first
+        frontier.add_urls(["https://new.com/page0"])
+        scheduler.add_hosts(["new.com"])
+        batch = scheduler.get_batch(frontier, 5)
+        self.assertEqual(batch[0], "https://new.com/page0")
+
+        # the waiting hosts may be fetched again once their time passed
+        scheduler.waiting = [(time.time() - 1, counter, host) for _, counter, host in scheduler.waiting]
+        scheduler.get_batch(frontier, 0)
+        self.assertEqual(scheduler.waiting, [])
+        self.assertEqual({entry[2] for entry in scheduler.ready}, {"slow.com", "fast.com", "new.com"})
+
+    def test_hosts_between_batches(self):
+        frontier = TextURLBackend("unused.txt")
+        frontier.add_urls(["https://a.com/page1", "https://b.com/page1"])
+        suspended = {"b.com"}
+        scheduler = HostScheduler(crawl_delay=0, is_suspended=lambda host: host in suspended)
+        self.assertEqual(scheduler.get_batch(frontier, 10), ["https://a.com/page1"])
+
+        # a url that was not downloaded is scheduled again
+        self.assertEqual(scheduler.get_batch(frontier, 10), ["https://a.com/page1"])
+
+        # a host without urls is dropped
+        frontier.remove_urls(["https://a.com/page1"])
+        self.assertEqual(scheduler.get_batch(frontier, 10), [])
+        self.assertEqual(scheduler.hosts, {"b.com"})
+
+        # a suspended host is scheduled again after its suspension, a host with new urls comes back
+        suspended.clear()
+        frontier.add_urls(["https://a.com/page2"])
+        scheduler.add_hosts(["a.com"])
+        self.assertEqual(sorted(scheduler.get_batch(frontier, 10)), ["https://a.com/page2", "https://b.com/page1"])
+
+    def test_host_yield(self):
+        tracker = HostYieldTracker("unused.json", min_pages=5)
+
+        # good.com yields many segments, bad.com yields none
+        tracker.add_pages([f"https://good.com/page{i}" for i in range(5)])
+        tracker.add_pages([f"https://www.bad.com/page{i}" for i in range(5)])
+        tracker.add_segments({"good.com": {"kin_Latn": 40, "run_Latn": 2}, "www.bad.com": {}})
+
+        self.assertFalse(tracker.is_blocked("good.com"))
+        self.assertTrue(tracker.is_blocked("bad.com"))
+        self.assertEqual(tracker.blocked_hosts(), ["bad.com"])
+        # blocked hosts are reported as new only once
+        self.assertEqual(tracker.new_blocked_hosts(), ["bad.com"])
+        self.assertEqual(tracker.new_blocked_hosts(), [])
+        self.assertEqual(tracker.priority("good.com"), 43 / 6)
+        self.assertIsNone(tracker.priority("bad.com"))
+
+        # new hosts rank between productive and unproductive hosts
+        self.assertEqual(tracker.priority("new.com"), 1)
+
+        frontier = TextURLBackend("unused.txt")
+        frontier.add_urls([f"https://new.com/page{i}" for i in range(10)])
+        frontier.add_urls([f"https://bad.com/page{i}" for i in range(10, 20)])
+        frontier.add_urls([f"https://good.com/page{i}" for i in range(10, 20)])
+
+        scheduler = HostScheduler(crawl_delay=1, get_priority=tracker.priority)
+        batch = scheduler.get_batch(frontier, 4)
+        self.assertEqual([get_host(url) for url in batch], ["good.com", "new.com", "good.com", "new.com"])
+
+    def test_blocked_hosts_end_crawl(self):
+        folder = "tests/assets/temp/blocked_hosts"
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+        config = CrawlerConfig(output_folder=folder, dont_compress_outputs=True, crawl_delay=0, robots_check=False,
+            focused_crawl=True, focused_crawl_min_pages=2)
+
+        # an earlier run found no text on blocked.example
+        with open(os.path.join(folder, "domain_language_counter.json"), "w") as f:
+            json.dump({"blocked.example": {"pages": 5, "segments": 0}}, f)
+        seed_file = os.path.join(folder, "seeds.txt")
+        with open(seed_file, "w") as f:
+            f.write("http://blocked.example/page1\nhttp://blocked.example/page2\n")
+
+        # the urls of the blocked host are removed when the crawler starts and its seeds are not added
+        html_store = HTMLStore(config)
+        urls2download = URLs2Download(["http://blocked.example/old"], config)
+        seed_loader = SeedLoader(seed_file, os.path.join(folder, "seed_progress.json"))
+        crawler = Crawler(config, html_store, None, urls2download, DownloadedURLs(config), None, seed_loader)
+        self.assertEqual(len(urls2download), 0)
+        crawler.round(1)
+        self.assertEqual(len(urls2download), 0)
+        self.assertFalse(crawler.has_urls() or crawler.has_seeds())
+        html_store.close()
+        shutil.rmtree(folder)
+
+    def test_rate_limiter_slots(self):
+        now = [1000.0]
+        limiter = HostRateLimiter(clock=lambda: now[0])
+        limiter.set_max_slots("a.com", 2)
+
+        # two downloads from a.com may run at the same time, every slot waits for the crawl delay
+        limiter.acquire("a.com")
+        self.assertEqual(limiter.wait_time("a.com"), 0)
+        limiter.acquire("a.com")
+        self.assertEqual(limiter.wait_time("a.com"), float("inf"))
+        limiter.release("a.com", 10)
+        self.assertEqual(limiter.wait_time("a.com"), 10)
+        now[0] += 4
+        self.assertEqual(limiter.wait_time("a.com"), 6)
+        limiter.release("a.com", 0)
+        self.assertEqual(limiter.wait_time("a.com"), 0)
+
+        # the slot of the crawl delay is free again once its time passed
+        limiter.acquire("a.com")
+        self.assertEqual(limiter.wait_time("a.com"), 6)
+        now[0] += 6
+        self.assertEqual(limiter.wait_time("a.com"), 0)
+        self.assertEqual(limiter.next_fetch_times["a.com"], [])
+
+        # other hosts have one slot
+        limiter.acquire("b.com")
+        self.assertEqual(limiter.wait_time("b.com"), float("inf"))
+
+    def test_adaptive_rate_limiter(self):
+        limiter = HostRateLimiter(adaptive=True, clock=lambda: 1000.0)
+        limiter.set_max_slots("a.com", 4)
+        self.assertEqual(limiter.get_slots("a.com"), 1)
+
+        # fast responses add slots up to the maximum
+        for _ in range(5):
+            limiter.acquire("a.com")
+            limiter.release("a.com", 0, 200, 0.1)
+        self.assertEqual(limiter.get_slots("a.com"), 4)
+
+        # 503 halves the slots and doubles the crawl delay
+        limiter.acquire("a.com")
+        limiter.release("a.com", 1, 503, 0.1)
+        self.assertEqual(limiter.get_slots("a.com"), 2)
+        self.assertEqual(limiter.backoff["a.com"], 2)
+
+        # so does a response that is much slower than usual
+        limiter.acquire("a.com")
+        limiter.release("a.com", 1, 200, 1.0)
+        self.assertEqual(limiter.get_slots("a.com"), 1)
+        self.assertEqual(limiter.backoff["a.com"], 4)
+        self.assertEqual(max(limiter.next_fetch_times["a.com"]), 1004)
+
+    def test_circuit_breaker(self):
+        breaker = HostCircuitBreaker("unused.json", threshold=3, base_suspension=10, max_suspension=25)
+
+        # errors that are interrupted by a response do not suspend a host
+        for status in [-1, -1, 404, -1, -1]:
+            breaker.record("a.com", status)
+        self.assertFalse(breaker.is_suspended("a.com"))
+
+        breaker.record("a.com", -1)
+        self.assertTrue(breaker.is_suspended("a.com"))
+        self.assertAlmostEqual(breaker.next_resume_time() - time.time(), 10, delta=1)
+
+        # after the suspension, a single error suspends the host twice as long
+        breaker.hosts["a.com"]["suspended_until"] = 0
+        self.assertFalse(breaker.is_suspended("a.com"))
+        self.assertIsNone(breaker.next_resume_time())
+        breaker.record("a.com", -1)
+        self.assertAlmostEqual(breaker.next_resume_time() - time.time(), 20, delta=1)
+
+        # 40 seconds are longer than max_suspension
+        breaker.hosts["a.com"]["suspended_until"] = 0
+        breaker.record("a.com", -1)
+        self.assertTrue(breaker.is_dead("a.com"))
+        self.assertEqual(breaker.dead_hosts(), ["a.com"])
+
+        # a dead host is reported as new only once
+        self.assertEqual(breaker.new_dead_hosts(), ["a.com"])
+        breaker.record("a.com", -1)
+        self.assertEqual(breaker.new_dead_hosts(), [])
+
+        # a response resets a host
+        breaker.record("b.com", -1)
+        breaker.record("b.com", 200)
+        self.assertNotIn("b.com", breaker.hosts)
+
+        # the scheduler skips suspended hosts
+        frontier = TextURLBackend("unused.txt")
+        frontier.add_urls(["https://a.com/page", "https://b.com/page"])
+        scheduler = HostScheduler(crawl_delay=1, is_suspended=breaker.is_suspended)
+        self.assertEqual(scheduler.get_batch(frontier, 10), ["https://b.com/page"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Unit tests for streaming the seed file into the urls to download.
+
+Call it like this:
+
+python -m unittest tests.test_seeds
+"""
+
+import os
+import gzip
+import shutil
+import unittest
+from crawler import URLStore
+from seeds import SeedLoader
+
+class TestSeeds(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/seeds"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+        os.makedirs(self.folder)
+
+        self.urls = [f"https://host{i % 7}.com/page{i}" for i in range(25)]
+        self.seed_file = os.path.join(self.folder, "seeds.txt.gz")
+        with gzip.open(self.seed_file, "wt") as f:
+            f.write("\n".join(self.urls + ["", "  ", self.urls[0]]) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def create_loader(self, chunk_size = 10):
+        return SeedLoader(self.seed_file, os.path.join(self.folder, "seed_progress.json"), chunk_size=chunk_size)
+
+    def test_chunks(self):
+        loader = self.create_loader()
+        chunks = []
+        while not loader.finished:
+            chunks.append(loader.next_chunk())
+
+        # empty lines are dropped, duplicates in other chunks are dropped by the urls to download
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 6])
+
+        # every chunk is shuffled
+        self.assertNotEqual(chunks[0], self.urls[0:10])
+        self.assertEqual(sorted(set(sum(chunks, []))), sorted(self.urls))
+
+    def test_restart(self):
+        urls2download = URLStore(os.path.join(self.folder, "urls2download.txt"))
+        downloaded_urls = URLStore(os.path.join(self.folder, "downloaded_urls.txt"))
+        downloaded_urls.add_urls(self.urls[0:3])
+
+        loader = self.create_loader()
+        self.assertEqual(loader.load_next(urls2download, downloaded_urls), 7)
+        self.assertEqual(set(urls2download), set(self.urls[3:10]))
+
+        # a new loader continues after the chunk that was committed
+        loader = self.create_loader()
+        loader.read_progress()
+        self.assertEqual(loader.lines, 10)
+        while not loader.finished:
+            loader.load_next(urls2download, downloaded_urls)
+        self.assertEqual(set(urls2download), set(self.urls[3:]))
+
+        loader = self.create_loader()
+        loader.read_progress()
+        self.assertTrue(loader.finished)
+        self.assertEqual(loader.next_chunk(), [])
+
+    def test_filter(self):
+        loader = SeedLoader(self.seed_file, os.path.join(self.folder, "seed_progress.json"),
+            filter_fn=lambda url: url.startswith("https://host1.com"))
+        self.assertEqual(set(loader.next_chunk()), {url for url in self.urls if url.startswith("https://host1.com")})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Unit tests for the Bloom filter of downloaded urls.
+
+Call it like this:
+
+python -m unittest tests.test_seen_filter
+"""
+
+import os
+import shutil
+import unittest
+from seen_filter import BloomURLBackend
+
+class TestSeenFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/seen_filter"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_bloom_filter(self):
+        backend = BloomURLBackend(self.folder, error_rate=0.01, initial_capacity=1000)
+
+        urls = [f"https://example.com/page{i}" for i in range(5000)]
+        self.assertEqual(backend.add_urls(urls[0:2500]), 2500)
+        # urls that are false positives are not added again
+        added = backend.add_urls(urls[2500:])
+        self.assertGreater(added, 2450)
+        self.assertEqual(len(backend), 2500 + added)
+
+        # the filter scaled to more than one bit array
+        self.assertGreater(len(backend.filters), 1)
+
+        # there are no false negatives
+        self.assertEqual(backend.known_urls(urls), set(urls))
+
+        # the false positive rate stays below the configured rate
+        unknown = [f"https://another.com/page{i}" for i in range(10000)]
+        self.assertLess(len(backend.known_urls(unknown)), 100)
+
+        # the snapshot is memory mapped after a restart
+        backend.commit()
+        backend = BloomURLBackend(self.folder)
+        self.assertTrue(backend.exists())
+        backend.read()
+        self.assertEqual(len(backend), 2500 + added)
+        self.assertEqual(backend.error_rate, 0.01)
+        self.assertEqual(backend.known_urls(urls[0:10]), set(urls[0:10]))
+
+        backend.add_urls(["https://another.com/new"])
+        self.assertEqual(backend.known_urls(["https://another.com/new"]), {"https://another.com/new"})
+
+    def test_uncommitted_urls(self):
+        backend = BloomURLBackend(self.folder, initial_capacity=1000)
+        backend.add_urls(["https://example.com/page1"])
+        backend.commit()
+
+        # the added urls are known right away, but only written to the bit arrays by commit
+        backend.add_urls(["https://example.com/page2"])
+        self.assertEqual(backend.known_urls(["https://example.com/page2"]), {"https://example.com/page2"})
+        restarted = BloomURLBackend(self.folder)
+        restarted.read()
+        self.assertEqual(restarted.known_urls(["https://example.com/page1", "https://example.com/page2"]),
+            {"https://example.com/page1"})
+
+        backend.commit()
+        restarted = BloomURLBackend(self.folder)
+        restarted.read()
+        self.assertEqual(restarted.known_urls(["https://example.com/page1", "https://example.com/page2"]),
+            {"https://example.com/page1", "https://example.com/page2"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Unit tests for splitting a crawl over several processes.
+
+Call it like this:
+
+python -m unittest tests.test_sharding
+"""
+
+import os
+import shutil
+import unittest
+from sharding import ShardRouter, shard_of
+
+class TestSharding(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = "tests/assets/temp/sharding"
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_shard_of(self):
+        urls = [f"https://host{i}.com/page" for i in range(1000)]
+        shards = [shard_of(url, 4) for url in urls]
+
+        # all urls of a host belong to the same shard, www. is ignored
+        self.assertEqual(shard_of("https://www.host1.com/a", 4), shard_of("https://host1.com/b", 4))
+
+        # hosts are spread over all shards
+        for shard_id in range(4):
+            self.assertGreater(shards.count(shard_id), 200)
+
+    def test_send_and_receive(self):
+        routers = [ShardRouter(self.folder, 3, shard_id) for shard_id in range(3)]
+        urls = [f"https://host{i}.com/page" for i in range(100)]
+
+        own, foreign = routers[0].split(urls)
+        self.assertEqual(len(own) + len(foreign), len(urls))
+        self.assertTrue(all(routers[0].owns(url) for url in own))
+        routers[0].send(foreign, 1)
+
+        # nothing was sent to the sender itself
+        self.assertEqual(routers[0].receive(), [])
+
+        received = []
+        for router in routers[1:]:
+            router_urls = router.receive()
+            self.assertTrue(all(router.owns(url) for url in router_urls))
+            received.extend(router_urls)
+            router.delete_received()
+            self.assertEqual(router.receive(), [])
+        self.assertEqual(sorted(received), sorted(foreign))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,13 +6,14 @@ from bs4 import BeautifulSoup
 from extract_text import HTML2Text
 import threading
 from werkzeug.serving import make_server
-from crawler import CrawlerConfig, start_crawler
+from crawler import CrawlerConfig, HTMLStore, start_crawler
+from robochecks import RobotsChecker
 import json
 
 class ServerThread(threading.Thread):
-    def __init__(self, app, host="127.0.0.1", port=5000):
+    def __init__(self, app, host="127.0.0.1", port=5000, threaded=False):
         super().__init__()
-        self.server = make_server(host, port, app)
+        self.server = make_server(host, port, app, threaded=threaded)
         self.ctx = app.app_context()
         self.ctx.push()
 
@@ -34,3 +35,20 @@ class ServerThread(threading.Thread):
         server = ServerThread(app, port=port)
         server.start()
         return server, port
+
+
+# delete an SQLite file with its write-ahead log
+def remove_sqlite(file):
+    for f in [file, file + "-wal", file + "-shm"]:
+        if os.path.exists(f):
+            os.remove(f)
+
+
+# an HTMLStore for the first round of a crawl into output_folder, without robots.txt checks and crawl delay
+# unless the config says otherwise. the pages of the round are dumped to output_folder/00001.json
+def create_html_store(output_folder, **config_args):
+    config_args.setdefault("crawl_delay", 0)
+    config = CrawlerConfig(output_folder=output_folder, dont_compress_outputs=True, **config_args)
+    html_store = HTMLStore(config, RobotsChecker(enabled=False))
+    html_store.init_round(os.path.join(output_folder, "00001.json"), 1)
+    return html_store